@@ -0,0 +1,97 @@
+# Opencv Model/head_pose.py
+"""
+Head pose from the 68 dlib face landmarks, for proctor.py.
+
+The first version rebuilt the 3D face model, the camera matrix and the
+distortion coefficients for every face, ran cv2.solvePnPRansac on just six
+point pairs (RANSAC has nothing to reject with six points, it only adds
+rounds of EPnP), and turned the rotation into angles with scalar math calls.
+Here:
+
+- The 3D model points and distortion coefficients are built once, and the
+  camera matrix once per frame size.
+- The pose is found with the iterative solver (Levenberg-Marquardt). In a
+  session it starts from the previous frame's pose, which is close, so it
+  converges in a few steps and can't jump to a mirrored solution from one
+  frame to the next: the angles are steadier too.
+- euler_angles() converts any number of rotation vectors at once with NumPy.
+  The model's y axis points up and the image's down, so a face looking
+  straight at the camera is a half turn about x: its raw pitch is about
+  ±180° and flips sign with the slightest nod. Pitch is reported from that
+  frontal pose instead, 0 when looking straight ahead and positive when
+  looking down, so it can be compared with thresholds and averaged.
+"""
+import cv2
+import numpy as np
+
+# A generic face, in model units: nose tip, chin, eye corners, mouth corners.
+MODEL_POINTS = np.array([
+    (0.0, 0.0, 0.0),
+    (0.0, -330.0, -65.0),
+    (-225.0, 170.0, -135.0),
+    (225.0, 170.0, -135.0),
+    (-150.0, -150.0, -125.0),
+    (150.0, -150.0, -125.0)
+], dtype=np.float64)
+# The matching dlib landmark numbers.
+LANDMARKS = (30, 8, 36, 45, 48, 54)
+DIST_COEFFS = np.zeros((4, 1))
+
+
+def image_points(shape):
+    """The landmarks of a dlib shape that match MODEL_POINTS, as a 6x2 array."""
+    return np.array([(shape.part(i).x, shape.part(i).y) for i in LANDMARKS], dtype=np.float64)
+
+
+class HeadPoseEstimator:
+
+    def __init__(self):
+        self._cameras = {}
+
+    def camera_matrix(self, width, height):
+        """The intrinsics for a frame size (focal length = width, centre of the image), built once per size."""
+        camera = self._cameras.get((width, height))
+        if camera is None:
+            camera = self._cameras[(width, height)] = np.array(
+                [[width, 0, width / 2],
+                 [0, width, height / 2],
+                 [0, 0, 1]], dtype=np.float64
+            )
+        return camera
+
+    def solve(self, points, frame_dims, guess=None):
+        """
+        Returns (rotation vector, translation vector) for the 6x2 image points,
+        or None. `guess` is a previous (rvec, tvec) of the same face to start from.
+        """
+        camera = self.camera_matrix(frame_dims[1], frame_dims[0])
+        if guess is not None:
+            success, rvec, tvec = cv2.solvePnP(
+                MODEL_POINTS, points, camera, DIST_COEFFS, guess[0].copy(), guess[1].copy(),
+                useExtrinsicGuess=True, flags=cv2.SOLVEPNP_ITERATIVE,
+            )
+            # A face behind the camera means the guess led it astray; start over.
+            if success and tvec[2, 0] > 0:
+                return rvec, tvec
+        success, rvec, tvec = cv2.solvePnP(MODEL_POINTS, points, camera, DIST_COEFFS, flags=cv2.SOLVEPNP_ITERATIVE)
+        return (rvec, tvec) if success else None
+
+
+def euler_angles(rvecs):
+    """
+    Pitch and yaw, in degrees, of rotation vectors (an array of shape (n, 3)
+    or a list of 3x1 vectors). Both are 0 for a face looking at the camera;
+    pitch is positive looking down.
+    """
+    r = np.asarray(rvecs, dtype=np.float64).reshape(-1, 3)
+    theta = np.linalg.norm(r, axis=1)
+    # Through the quaternion (w, x, y, z); no rotation gives (1, 0, 0, 0).
+    axis = np.divide(r, theta[:, None], out=np.zeros_like(r), where=theta[:, None] > 0)
+    w = np.cos(theta / 2)
+    x, y, z = (np.sin(theta / 2)[:, None] * axis).T
+
+    pitch = np.arctan2(2.0 * (w * x + y * z), 1.0 - 2.0 * (x * x + y * y))
+    yaw = np.arcsin(np.clip(2.0 * (w * y - z * x), -1.0, 1.0))
+    # From the frontal half turn, in [-180, 180).
+    pitch = np.degrees(pitch) % 360 - 180
+    return pitch, np.degrees(yaw)
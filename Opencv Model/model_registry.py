@@ -0,0 +1,169 @@
+# Opencv Model/model_registry.py
+"""
+The models of the proctoring service, loaded on first use from configurable
+paths (they used to be read from fixed Kaggle paths as soon as the proctor
+was created).
+
+Paths, from the environment:
+
+- PROCTOR_MODEL_DIR: where the files are (default: models/ next to this
+  file). The file names below are looked up there.
+- PROCTOR_SHAPE_PREDICTOR: shape_predictor_68_face_landmarks.dat
+- PROCTOR_CLASS_NAMES: coco.names
+- PROCTOR_DETECTOR: the object detector, one of DETECTORS: "yolov3" (the
+  full model, ~240 MB), "yolov3-tiny" (~34 MB, several times faster, a bit
+  less accurate) or "onnx" (a YOLOv5-style ONNX export read with cv2.dnn).
+- PROCTOR_DETECTOR_WEIGHTS, PROCTOR_DETECTOR_CONFIG, PROCTOR_DETECTOR_INPUT:
+  override the chosen detector's files and input size.
+
+Each model is loaded the first time it is needed, so the service starts in
+seconds; POST /warmup (proctoring_service.py) loads everything ahead of the
+exam. With PROCTOR_PRELOAD=1 the service loads the models once in the main
+process and forks its workers afterwards: the workers then share the
+model's memory pages (copy-on-write) instead of each reading its own copy,
+so memory does not grow with the number of workers.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import dlib
+import numpy as np
+
+MODEL_DIR = Path(os.environ.get("PROCTOR_MODEL_DIR", Path(__file__).resolve().parent / "models"))
+PRELOAD = os.environ.get("PROCTOR_PRELOAD", "") in ("1", "true")
+
+FORBIDDEN_OBJECTS = ["cell phone", "book"]
+
+
+class DetectorSpec:
+    def __init__(self, weights, config, input_size, pixel_boxes=False, objectness_separate=False):
+        self.weights = weights
+        self.config = config
+        self.input_size = input_size
+        self.pixel_boxes = pixel_boxes  # Boxes in input pixels rather than fractions of the image.
+        self.objectness_separate = objectness_separate  # Class scores still to be multiplied by the objectness.
+
+
+DETECTORS = {
+    "yolov3": DetectorSpec("yolov3.weights", "yolov3.cfg", 416),
+    "yolov3-tiny": DetectorSpec("yolov3-tiny.weights", "yolov3-tiny.cfg", 416),
+    # Rows of (cx, cy, w, h, objectness, class scores...), as exported by YOLOv5.
+    "onnx": DetectorSpec("detector.onnx", None, 640, pixel_boxes=True, objectness_separate=True),
+}
+
+
+class ObjectDetector:
+    """A loaded cv2.dnn network with what is needed to read its output."""
+
+    def __init__(self, spec, weights, config, classes):
+        self.spec = spec
+        self.net = cv2.dnn.readNet(str(weights), str(config)) if config else cv2.dnn.readNet(str(weights))
+        layer_names = self.net.getLayerNames()
+        unconnected = self.net.getUnconnectedOutLayers()
+        if isinstance(unconnected, np.ndarray) and unconnected.ndim > 1:
+            unconnected = unconnected.flatten()
+        self.output_layers = [layer_names[i - 1] for i in unconnected]
+        self.classes = classes
+        # Class ids worth reporting, so detections can be filtered on whole arrays.
+        self.forbidden_ids = np.array([i for i, name in enumerate(classes) if name in FORBIDDEN_OBJECTS])
+
+
+def _path(env, name):
+    value = os.environ.get(env)
+    return Path(value) if value else MODEL_DIR / name
+
+
+def _existing(path, what):
+    if not path.exists():
+        raise FileNotFoundError(f"{what} file not found at {path}")
+    return path
+
+
+class ModelRegistry:
+
+    def __init__(self, detector=None):
+        name = detector or os.environ.get("PROCTOR_DETECTOR", "yolov3")
+        if name not in DETECTORS:
+            raise ValueError(f"Unknown detector {name!r}; use one of: {', '.join(DETECTORS)}.")
+        base = DETECTORS[name]
+        self.detector_name = name
+        self.spec = DetectorSpec(
+            base.weights, base.config, int(os.environ.get("PROCTOR_DETECTOR_INPUT", base.input_size)),
+            base.pixel_boxes, base.objectness_separate,
+        )
+        self.paths = {
+            "shape_predictor": _path("PROCTOR_SHAPE_PREDICTOR", "shape_predictor_68_face_landmarks.dat"),
+            "class_names": _path("PROCTOR_CLASS_NAMES", "coco.names"),
+            "detector_weights": _path("PROCTOR_DETECTOR_WEIGHTS", base.weights),
+            "detector_config": _path("PROCTOR_DETECTOR_CONFIG", base.config) if base.config else None,
+        }
+        self._models = {}
+        self._lock = threading.Lock()
+        self.load_ms = {}
+
+    def _get(self, name, load):
+        model = self._models.get(name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(name)
+                if model is None:
+                    started = time.perf_counter()
+                    model = self._models[name] = load()
+                    self.load_ms[name] = round((time.perf_counter() - started) * 1000, 1)
+        return model
+
+    @property
+    def face_detector(self):
+        return self._get("face_detector", dlib.get_frontal_face_detector)
+
+    @property
+    def shape_predictor(self):
+        return self._get("shape_predictor", lambda: dlib.shape_predictor(
+            str(_existing(self.paths["shape_predictor"], "Shape predictor"))
+        ))
+
+    @property
+    def object_detector(self):
+        def load():
+            with open(_existing(self.paths["class_names"], "Class names"), "r") as f:
+                classes = [line.strip() for line in f.readlines()]
+            config = self.paths["detector_config"]
+            return ObjectDetector(
+                self.spec,
+                _existing(self.paths["detector_weights"], "Detector weights"),
+                _existing(config, "Detector config") if config else None,
+                classes,
+            )
+        return self._get("object_detector", load)
+
+    def load(self):
+        """Loads every model now; returns how long each took to load (ms)."""
+        for model in ("face_detector", "shape_predictor", "object_detector"):
+            getattr(self, model)
+        return dict(self.load_ms)
+
+    def status(self):
+        return {
+            "detector": self.detector_name,
+            "input_size": self.spec.input_size,
+            "loaded": sorted(self._models),
+            "load_ms": dict(self.load_ms),
+            "paths": {name: str(path) if path else None for name, path in self.paths.items()},
+        }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Returns the process-wide registry (shared with forked workers), creating it on first use."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
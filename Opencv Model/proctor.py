@@ -0,0 +1,353 @@
+# Opencv Model/proctor.py
+"""
+The proctoring model: dlib face detection and head pose, plus YOLO for
+forbidden objects. Extracted from Proctoring_Model.ipynb so the service
+(proctoring_service.py) can load it in its worker processes; the models
+themselves are loaded on first use by model_registry.py.
+
+analyze_batch() takes the frames of several students at once: faces are
+still found frame by frame (dlib has no batch mode), but the frames go
+through YOLO together, as one blob from cv2.dnn.blobFromImages and one
+forward pass, which costs far less than one pass per frame.
+
+Frames that come with a session id (one per exam-taker) go through a cascade
+of cheaper checks first, against what the session saw before:
+
+1. A 64x48 grayscale thumbnail of the frame is compared with the one of the
+   last analyzed frame (mean and largest absolute difference, and a
+   difference hash).
+   When nothing moved, the previous result is returned as it is.
+2. Faces are looked for on a copy scaled down to FACE_DETECT_WIDTH; only
+   when none is found there is the full-size frame searched too, so an
+   absence is never reported on the small image alone. Landmarks and head
+   pose still use the full-size frame.
+3. YOLO runs when OBJECT_DETECTION_SECONDS (PROCTOR_OBJECT_DETECTION_SECONDS,
+   default 4) have passed since its last run for the session, or sooner
+   when the picture changed a lot since then or the number of faces
+   changed. In between, the last objects found are carried over. At the
+   exam page's one frame every 5 seconds, that is every frame that
+   changed; only faster streams skip YOLO on some frames.
+
+A batch may hold several frames of the same session (a retry, a second tab,
+a backlog); they are analyzed in successive rounds, so each one is compared
+with the one before it.
+
+Every result says how long each stage took ("timings_ms") and which were
+skipped ("stages").
+
+When the object detector can't be loaded or run, the frames get a "Model
+Error" event instead of objects. It is not evidence against the student: it
+doesn't count towards "cheating_detected", and it isn't carried over, so the
+next frame tries the detector again.
+"""
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import cv2
+import dlib    #face point detect
+import numpy as np
+
+from head_pose import HeadPoseEstimator, euler_angles, image_points
+from model_registry import get_registry
+
+HEAD_POSE_THRESHOLD = {
+    "PITCH_DOWN": 60,
+    "YAW_SIDEWAYS": 70,
+}
+
+YOLO_CONFIDENCE_THRESHOLD = 0.5
+YOLO_NMS_THRESHOLD = 0.4  # IoU threshold for NMS
+YOLO_NMS_CONF_THRESHOLD = 0.3  # Minimum confidence for NMS
+
+# --- Cascade (frames with a session id) ---
+THUMB_SIZE = (64, 48)
+# A frame counts as unchanged when its thumbnail differs from the last one by less than
+# UNCHANGED_MOTION on average (0-255) and UNCHANGED_PIXEL anywhere (so a small object
+# showing up is not averaged away), and its difference hash by at most UNCHANGED_HASH_DISTANCE bits.
+UNCHANGED_MOTION = 2.0
+UNCHANGED_PIXEL = 24
+UNCHANGED_HASH_DISTANCE = 2
+OBJECT_TRIGGER_MOTION = 12.0  # Change since the last YOLO run that runs it again right away.
+OBJECT_DETECTION_SECONDS = float(os.environ.get("PROCTOR_OBJECT_DETECTION_SECONDS", 4.0))
+FACE_DETECT_WIDTH = 320
+MAX_SESSIONS = 2000
+
+
+def _dhash(thumb):
+    """A 64-bit difference hash: is each pixel brighter than its right neighbour, on a 9x8 image."""
+    small = cv2.resize(thumb, (9, 8), interpolation=cv2.INTER_AREA)
+    return int.from_bytes(np.packbits(small[:, 1:] > small[:, :-1]).tobytes(), "big")
+
+
+class SessionState:
+    """What the cascade remembers of one session's earlier frames."""
+
+    def __init__(self):
+        self.thumb = None  # Of the last analyzed frame.
+        self.hash = None
+        self.faces = None  # What _analyze_faces() returned for that frame.
+        self.objects = []  # Of the last YOLO run...
+        self.objects_thumb = None  # ...and the thumbnail of its frame.
+        self.objects_at = None  # time.monotonic() of the last YOLO run.
+        self.pose = None  # (rotation, translation) of the last single face, to start the next solve from.
+
+
+class SingleImageProctor:
+
+    def __init__(self, models=None):
+        # The models are loaded by the registry when first used (see model_registry.py).
+        self.models = models or get_registry()
+        self.sessions = OrderedDict()
+        self.head_pose = HeadPoseEstimator()
+
+    @property
+    def detector(self):
+        return self.models.face_detector
+
+    @property
+    def predictor(self):
+        return self.models.shape_predictor
+
+    def _get_head_pose(self, shape, frame_dims, state=None):
+        """(rotation, translation) of a face or None, starting from the session's last pose if any."""
+        pose = self.head_pose.solve(image_points(shape), frame_dims, state.pose if state else None)
+        if state is not None:
+            state.pose = pose
+        return pose
+
+    @staticmethod
+    def _pose_events(pitch, yaw):
+        events = []
+        if pitch > HEAD_POSE_THRESHOLD["PITCH_DOWN"]:
+            excess = (pitch - HEAD_POSE_THRESHOLD["PITCH_DOWN"]) / (90 - HEAD_POSE_THRESHOLD["PITCH_DOWN"])
+            conf = min(0.5 + 0.5 * excess, 1.0)
+            events.append({"type": "Looking Down", "details": f"Head pitch at {pitch:.2f}°, exceeds threshold of {HEAD_POSE_THRESHOLD['PITCH_DOWN']}°.", "confidence": conf})
+        if abs(yaw) > HEAD_POSE_THRESHOLD["YAW_SIDEWAYS"]:
+            direction = "right" if yaw > 0 else "left"
+            excess = (abs(yaw) - HEAD_POSE_THRESHOLD["YAW_SIDEWAYS"]) / (90 - HEAD_POSE_THRESHOLD["YAW_SIDEWAYS"])
+            conf = min(0.5 + 0.5 * excess, 1.0)
+            events.append({"type": "Looking Sideways", "details": f"Head yawed {abs(yaw):.2f}° {direction}, exceeds threshold of {HEAD_POSE_THRESHOLD['YAW_SIDEWAYS']}°.", "confidence": conf})
+        return events
+
+    def _detect_forbidden_objects(self, frame):
+        return self._detect_forbidden_objects_batch([frame])[0]
+
+    def _detect_forbidden_objects_batch(self, frames):
+        """Runs the object detector once over all `frames`; returns a list of detected objects per frame."""
+        detector = self.models.object_detector
+        size = detector.spec.input_size
+        blob = cv2.dnn.blobFromImages(frames, 1/255.0, (size, size), swapRB=True, crop=False)
+        detector.net.setInput(blob)
+        outs = detector.net.forward(detector.output_layers)
+        # Each output layer gives the rows of all frames, frame after frame.
+        outs = [out.reshape(len(frames), -1, out.shape[-1]) for out in outs]
+
+        return [
+            self._objects_in(detector, np.concatenate([out[n] for out in outs]), frame.shape)
+            for n, frame in enumerate(frames)
+        ]
+
+    def _objects_in(self, detector, detections, frame_dims):
+        """Turns the detector's rows for one frame into forbidden-object events."""
+        height, width = frame_dims[:2]
+        scores = detections[:, 5:]
+        if detector.spec.objectness_separate:
+            scores = scores * detections[:, 4:5]
+        if detector.spec.pixel_boxes:
+            detections = detections.copy()
+            detections[:, :4] /= detector.spec.input_size
+        class_ids = np.argmax(scores, axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = (confidences > YOLO_CONFIDENCE_THRESHOLD) & np.isin(class_ids, detector.forbidden_ids)
+        if not keep.any():
+            return []
+
+        detections, class_ids, confidences = detections[keep], class_ids[keep], confidences[keep]
+        w = (detections[:, 2] * width).astype(int)
+        h = (detections[:, 3] * height).astype(int)
+        x = (detections[:, 0] * width - w / 2).astype(int)
+        y = (detections[:, 1] * height - h / 2).astype(int)
+        boxes = np.column_stack([x, y, w, h]).tolist()
+        confidences = confidences.astype(float).tolist()
+
+        indices = cv2.dnn.NMSBoxes(boxes, confidences, YOLO_NMS_CONF_THRESHOLD, YOLO_NMS_THRESHOLD)
+
+        detected_objects = []
+        if len(indices) > 0:
+            for i in np.array(indices).flatten():
+                detected_objects.append({
+                    "type": "Object Detected",
+                    "details": f"Forbidden object detected: {detector.classes[class_ids[i]]}",
+                    "label": detector.classes[class_ids[i]],
+                    "confidence": confidences[i],
+                    "box": boxes[i]
+                })
+        return detected_objects
+
+    def _session(self, session):
+        if session is None:
+            return None
+        state = self.sessions.get(session)
+        if state is None:
+            state = self.sessions[session] = SessionState()
+            if len(self.sessions) > MAX_SESSIONS:
+                self.sessions.popitem(last=False)
+        else:
+            self.sessions.move_to_end(session)
+        return state
+
+    def _detect_faces(self, gray):
+        scale = FACE_DETECT_WIDTH / gray.shape[1]
+        if scale < 1:
+            small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            faces = self.detector(small)
+            if len(faces):
+                return [
+                    dlib.rectangle(int(f.left() / scale), int(f.top() / scale), int(f.right() / scale), int(f.bottom() / scale))
+                    for f in faces
+                ]
+        return list(self.detector(gray))
+
+    def _analyze_faces(self, frame, gray, state=None):
+        """
+        Returns (events, face box, number of faces, head pose) from face detection.
+        The head pose is still a (rotation, translation) pair here, or None;
+        analyze_batch() turns the poses of all its frames into angles at once.
+        """
+        events, pose = [], None
+        faces = self._detect_faces(gray)
+
+        num_faces = len(faces)
+        if num_faces > 1:
+            events.append({"type": "Multiple People", "details": f"{num_faces} faces detected.", "confidence": 1.0})
+        elif num_faces == 0:
+            events.append({"type": "Person Absent", "details": "No person detected in the image.", "confidence": 1.0})
+        else:
+            face = faces[0]
+            shape = self.predictor(gray, face)
+            pose = self._get_head_pose(shape, frame.shape, state)
+        if num_faces != 1 and state is not None:
+            state.pose = None
+
+        face_box = [faces[0].left(), faces[0].top(), faces[0].width(), faces[0].height()] if num_faces == 1 else None
+        return events, face_box, num_faces, pose
+
+    def _prefilter(self, frame, state):
+        """Stages 1 and 2 for one frame. Returns (faces, whether YOLO should run, stages, timings)."""
+        timings = {}
+        started = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        thumb = cv2.resize(gray, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+        frame_hash = _dhash(thumb)
+        unchanged = False
+        if state is not None and state.thumb is not None:
+            diff = cv2.absdiff(thumb, state.thumb)
+            unchanged = (
+                diff.mean() < UNCHANGED_MOTION and diff.max() < UNCHANGED_PIXEL
+                    and (frame_hash ^ state.hash).bit_count() <= UNCHANGED_HASH_DISTANCE
+            )
+        timings["prefilter"] = (time.perf_counter() - started) * 1000
+
+        if unchanged:
+            return [state.faces, False, {"unchanged": True, "faces": False}, timings]
+
+        started = time.perf_counter()
+        faces = self._analyze_faces(frame, gray, state)
+        timings["faces"] = (time.perf_counter() - started) * 1000
+
+        if state is None:
+            run_objects = True
+        else:
+            run_objects = bool(
+                state.objects_thumb is None
+                or time.monotonic() - state.objects_at >= OBJECT_DETECTION_SECONDS
+                or faces[2] != state.faces[2]
+                or cv2.absdiff(thumb, state.objects_thumb).mean() >= OBJECT_TRIGGER_MOTION
+            )
+            state.thumb, state.hash = thumb, frame_hash
+            if run_objects:
+                state.objects_thumb = thumb
+        return [faces, run_objects, {"unchanged": False, "faces": True}, timings]
+
+    def analyze_batch(self, frames, sessions=None):
+        """
+        Analyzes several frames (BGR images, any sizes); returns one result per
+        frame. `sessions` gives each frame's session id (or None) for the cascade.
+        """
+        sessions = sessions or [None] * len(frames)
+        # Each round takes at most one frame of a session, in the order they came.
+        rounds, seen = [], {}
+        for i, session in enumerate(sessions):
+            n = 0
+            if session is not None:
+                n = seen[session] = seen.get(session, -1) + 1
+            if n == len(rounds):
+                rounds.append([])
+            rounds[n].append(i)
+        results = [None] * len(frames)
+        for positions in rounds:
+            for i, result in zip(positions, self._analyze_round([frames[i] for i in positions], [sessions[i] for i in positions])):
+                results[i] = result
+        return results
+
+    def _analyze_round(self, frames, sessions):
+        """analyze_batch() for frames of different sessions."""
+        started = time.perf_counter()
+        states = [self._session(session) for session in sessions]
+        prefiltered = [self._prefilter(frame, state) for frame, state in zip(frames, states)]
+
+        # The head poses found just now, turned into angles all in one go.
+        posed = [i for i, (faces, _, stages, _) in enumerate(prefiltered) if stages["faces"] and faces[3] is not None]
+        if posed:
+            pitches, yaws = euler_angles([prefiltered[i][0][3][0] for i in posed])
+            for i, pitch, yaw in zip(posed, pitches.tolist(), yaws.tolist()):
+                events, face_box, num_faces, _ = prefiltered[i][0]
+                prefiltered[i][0] = (events + self._pose_events(pitch, yaw), face_box, num_faces, (pitch, yaw))
+        for (faces, _, stages, _), state in zip(prefiltered, states):
+            if state is not None and stages["faces"]:
+                state.faces = faces
+
+        # Only the frames that need it go through YOLO, still all in one pass.
+        to_check = [i for i, (_, run_objects, _, _) in enumerate(prefiltered) if run_objects]
+        object_events, objects_ms, model_error = {}, 0.0, False
+        if to_check:
+            objects_started = time.perf_counter()
+            try:
+                found = self._detect_forbidden_objects_batch([frames[i] for i in to_check])
+            except (ValueError, OSError, cv2.error) as e:
+                found = [[{"type": "Model Error", "details": str(e), "confidence": 1.0}]] * len(to_check)
+                model_error = True
+            objects_ms = (time.perf_counter() - objects_started) * 1000
+            object_events = dict(zip(to_check, found))
+
+        results = []
+        for i, ((events, face_box, num_faces, pose), run_objects, stages, timings) in enumerate(prefiltered):
+            state = states[i]
+            if run_objects:
+                objects = object_events[i]
+                timings["objects"] = objects_ms  # The whole batch's pass.
+                if state is not None and model_error:
+                    state.objects, state.objects_thumb = [], None  # Tried again on the next frame.
+                elif state is not None:
+                    state.objects, state.objects_at = objects, time.monotonic()
+            else:
+                objects = state.objects
+            stages["objects"] = run_objects
+            timings["total"] = (time.perf_counter() - started) * 1000
+            events = events + objects
+            results.append({
+                "timestamp": datetime.now().isoformat(),
+                "cheating_detected": any(e["confidence"] > 0.7 for e in events if e["type"] != "Model Error"),
+                "events": events,
+                "face_box": face_box,
+                "num_faces": num_faces,
+                "head_pose": {"pitch": round(pose[0], 2), "yaw": round(pose[1], 2)} if pose else None,
+                "stages": stages,
+                "timings_ms": {stage: round(ms, 2) for stage, ms in timings.items()},
+            })
+        return results
+
+    def analyze_image(self, frame, session=None):
+        return self.analyze_batch([frame], [session])[0]
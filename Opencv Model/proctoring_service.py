@@ -0,0 +1,484 @@
+# Opencv Model/proctoring_service.py
+"""
+The proctoring API (POST /analyze and the /ws/analyze WebSocket), served
+from a pool of worker processes.
+
+The notebook version ran dlib and a full YOLOv3 pass inside the request
+coroutine, so every frame from every exam-taker waited for the one before
+it, on one core. Here:
+
+- Inference runs in PROCTOR_WORKERS processes (default: one per core), each
+  with its own SingleImageProctor. OpenCV is limited to one thread per
+  worker so the workers don't fight over the cores. A worker process that
+  dies is replaced; only the batch it was running fails.
+- The models are loaded when first needed (model_registry.py), or ahead of
+  the exam with POST /warmup (which takes the PROCTOR_INCIDENTS_KEY in the
+  X-Proctoring-Key header, like the backend's ingest endpoint). With PROCTOR_PRELOAD=1 they are loaded once
+  here, before the workers are forked, and the workers share those memory
+  pages instead of each holding a copy.
+- Each worker has a queue. Frames that arrive within PROCTOR_BATCH_WINDOW_MS
+  of each other are sent to the worker together (up to PROCTOR_MAX_BATCH)
+  and go through YOLO as one blob, one forward pass.
+- The frames travel to the workers still JPEG-encoded: it is a fraction of
+  the bytes to copy between processes, and the decoding is spread over the
+  workers too.
+- A frame is sent to the worker with the shortest queue, or, when the
+  client passes a session id (?session=... or the X-Proctor-Session header),
+  always to the same worker, whose proctor keeps that student's previous
+  frames for the cascade of cheap checks in proctor.py.
+- When the queue a frame would go to is full (PROCTOR_MAX_QUEUE frames),
+  /analyze answers 503 with Retry-After instead of letting latency grow without bound; the
+  exam page just sends its next frame on the next tick.
+
+Frames can come three ways:
+
+- POST /analyze with the image itself as the body (Content-Type image/jpeg,
+  image/png or application/octet-stream): no base64 (a third smaller) and
+  no JSON to parse.
+- POST /analyze with {"image_base64": ...}, as before.
+- The /ws/analyze WebSocket: the client keeps one connection open for the
+  whole exam and sends each frame as a binary message (or base64 text), and
+  gets one JSON reply per frame, in order, without paying for a new HTTP
+  request each time.
+
+The received bytes are handed to the workers as they are and wrapped with
+np.frombuffer (no copy) for cv2.imdecode. Frames wider than max_width
+(PROCTOR_MAX_WIDTH, or ?max_width=, 0 for no limit) are scaled down before
+inference. For a JPEG the width is read from its header first, so the
+decoder itself can skip most of the work (IMREAD_REDUCED_COLOR_2/4/8)
+instead of decoding every pixel and then throwing most of them away.
+Results give the analyzed "frame_size", which face_box refers to.
+
+With a session id, results are also followed over time per session and
+summed up as incidents (see proctoring_session.py); the session ends when
+its WebSocket closes, on POST /sessions/{session}/end, or when it goes idle.
+Ending a session takes either its backend-signed name (see session_keys())
+or the key, so nobody can close another student's incidents early.
+
+Run it with `python proctoring_service.py` (or uvicorn proctoring_service:app)
+from this directory.
+"""
+import asyncio
+import base64
+import binascii
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+
+import cv2
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
+
+import model_registry
+from model_registry import get_registry
+from proctor import SingleImageProctor
+from proctoring_session import IncidentWriter, SessionRegistry, key_matches, session_keys
+
+WORKERS = int(os.environ.get("PROCTOR_WORKERS", os.cpu_count() or 1))
+MAX_BATCH = int(os.environ.get("PROCTOR_MAX_BATCH", 8))
+BATCH_WINDOW_MS = float(os.environ.get("PROCTOR_BATCH_WINDOW_MS", 15))
+MAX_QUEUE = int(os.environ.get("PROCTOR_MAX_QUEUE", 32))
+MAX_WIDTH = int(os.environ.get("PROCTOR_MAX_WIDTH", 640))
+
+logger = logging.getLogger(__name__)
+
+
+# --- Worker processes ---
+
+_proctor = None
+
+
+def _init_worker():
+    global _proctor
+    cv2.setNumThreads(1)
+    _proctor = SingleImageProctor()
+
+
+# Reduced decoding factors, largest first.
+_REDUCED = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def _jpeg_size(data):
+    """(width, height) from a JPEG's frame header, or None if `data` isn't a JPEG."""
+    view = memoryview(data)
+    if view[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 9 <= len(view):
+        if view[i] != 0xFF:
+            return None
+        marker = view[i + 1]
+        if marker == 0xFF:  # Fill byte.
+            i += 1
+            continue
+        # SOF0-SOF15, except DHT (C4), JPG (C8) and DAC (CC) which share the range.
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            return int.from_bytes(view[i + 7:i + 9], "big"), int.from_bytes(view[i + 5:i + 7], "big")
+        i += 2 + int.from_bytes(view[i + 2:i + 4], "big")
+    return None
+
+
+def decode_frame(data, max_width=0):
+    """Decodes an encoded image, no wider than `max_width` (0: as it is). None if it can't be decoded."""
+    buffer = np.frombuffer(data, np.uint8)  # A view on the received bytes, not a copy.
+    flag = cv2.IMREAD_COLOR
+    if max_width:
+        size = _jpeg_size(data)
+        if size:
+            for factor, reduced in _REDUCED:
+                if size[0] // factor >= max_width:
+                    flag = reduced
+                    break
+    frame = cv2.imdecode(buffer, flag)
+    if frame is not None and max_width and frame.shape[1] > max_width:
+        height = round(frame.shape[0] * max_width / frame.shape[1])
+        frame = cv2.resize(frame, (max_width, height), interpolation=cv2.INTER_AREA)
+    return frame
+
+
+def _analyze_encoded(items):
+    """Decodes and analyzes a batch of (encoded image, session, max width); a result or an {"error": ...} per image."""
+    frames, sessions, positions, results = [], [], [], [None] * len(items)
+    for i, (data, session, max_width) in enumerate(items):
+        try:
+            frame = decode_frame(data, max_width)
+        except (cv2.error, ValueError) as e:
+            # One bad frame must not fail the other students' frames in the batch.
+            logger.warning("Could not decode a frame: %s", e)
+            frame = None
+        if frame is None:
+            results[i] = {"error": "Could not decode the image. Ensure it's a valid JPEG or PNG."}
+        else:
+            frames.append(frame)
+            sessions.append(session)
+            positions.append(i)
+    if frames:
+        for i, frame, result in zip(positions, frames, _proctor.analyze_batch(frames, sessions)):
+            result["frame_size"] = [frame.shape[1], frame.shape[0]]
+            results[i] = result
+    return results
+
+
+def _ping():
+    return _proctor is not None
+
+
+def _warm_up():
+    """Loads the worker's models and runs one blank frame through every stage; returns how long it took."""
+    load_ms = _proctor.models.load()
+    started = time.perf_counter()
+    _proctor.analyze_batch([np.zeros((480, 640, 3), np.uint8)])
+    return {
+        "load_ms": load_ms,
+        "first_frame_ms": round((time.perf_counter() - started) * 1000, 1),
+        "models": _proctor.models.status(),
+    }
+
+
+# --- Batching and back-pressure ---
+
+class Overloaded(Exception):
+    pass
+
+
+class Worker:
+    """One worker process and the queue of frames waiting for it."""
+
+    def __init__(self, mp_context=None):
+        self.mp_context = mp_context
+        self.executor = self._new_executor()
+        self.restarts = 0
+        self.queue = asyncio.Queue(maxsize=MAX_QUEUE)
+        self.task = None
+        self.batches = 0
+        self.frames = 0
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=1, initializer=_init_worker, mp_context=self.mp_context)
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def _next_batch(self):
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + BATCH_WINDOW_MS / 1000
+        while len(batch) < MAX_BATCH:
+            # Whatever is already waiting is taken right away.
+            while len(batch) < MAX_BATCH and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            remaining = deadline - loop.time()
+            if len(batch) >= MAX_BATCH or remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            batch = [(item, future) for item, future in batch if not future.cancelled()]
+            if not batch:
+                continue
+            try:
+                results = await loop.run_in_executor(self.executor, _analyze_encoded, [item for item, _ in batch])
+            except BrokenProcessPool as e:
+                # The process died (a crash in dlib or OpenCV, the OOM killer...);
+                # this batch is lost, but the sessions pinned here get a new one.
+                logger.error("Proctoring worker died, starting a new one: %s", e)
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = self._new_executor()
+                self.restarts += 1
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.frames += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def submit(self, data, session, max_width):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait(((data, session, max_width), future))
+        except asyncio.QueueFull:
+            raise Overloaded()
+        return future
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ProctoringPool:
+    def __init__(self, size, mp_context=None):
+        self.workers = [Worker(mp_context) for _ in range(size)]
+
+    async def start(self):
+        for worker in self.workers:
+            worker.start()
+        # Start the worker processes now rather than on the first frames.
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(w.executor, _ping) for w in self.workers))
+
+    async def warm_up(self):
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(loop.run_in_executor(w.executor, _warm_up) for w in self.workers))
+
+    async def stop(self):
+        for worker in self.workers:
+            await worker.stop()
+
+    def _pick(self, session):
+        if session:
+            return self.workers[zlib.crc32(session.encode()) % len(self.workers)]
+        return min(self.workers, key=lambda w: w.queue.qsize())
+
+    async def analyze(self, data, session=None, max_width=MAX_WIDTH):
+        """Analyzes one encoded image. Raises Overloaded when its worker's queue is full."""
+        return await self._pick(session).submit(data, session, max_width)
+
+    def stats(self):
+        return [
+            {"queued": w.queue.qsize(), "batches": w.batches, "frames": w.frames, "restarts": w.restarts,
+             "average_batch": round(w.frames / w.batches, 2) if w.batches else 0}
+            for w in self.workers
+        ]
+
+
+pool = None
+sessions = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Created here, not at import: the worker processes import this module too.
+    global pool, sessions
+    mp_context = None
+    if model_registry.PRELOAD:
+        # Forked workers get the loaded models as copy-on-write pages of this process.
+        logger.info("Models loaded in (ms): %s", get_registry().load())
+        mp_context = multiprocessing.get_context("fork")
+    pool = ProctoringPool(WORKERS, mp_context)
+    sessions = SessionRegistry(IncidentWriter())
+    await pool.start()
+    housekeeping = asyncio.create_task(sessions.run())
+    yield
+    housekeeping.cancel()
+    sessions.end_all()
+    await sessions.writer.flush()
+    await pool.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+class ImageRequest(BaseModel):
+    image_base64: str
+
+
+def decode_base64_image(base64_str: str):
+    """Returns the encoded image bytes (decoding to pixels happens in the workers)."""
+    if base64_str.startswith("data:"):
+        base64_str = base64_str.split(",", 1)[1]
+
+    missing_padding = len(base64_str) % 4
+    if missing_padding:
+        base64_str += "=" * (4 - missing_padding)
+
+    return base64.b64decode(base64_str)
+
+
+RAW_CONTENT_TYPES = ("image/", "application/octet-stream")
+
+
+def authorize(request, session=None):
+    """
+    Lets through the backend (the shared key in X-Proctoring-Key) and, for a
+    session's own endpoints, whoever holds the session name the backend signed.
+    """
+    key = sessions.writer.key
+    if key_matches(request.headers.get("X-Proctoring-Key"), key):
+        return
+    if session and session_keys(session, key):
+        return
+    raise HTTPException(status_code=403, detail="A signed session or the proctoring key is required.")
+
+
+@app.post("/analyze")
+async def analyze_image_endpoint(request: Request, session: str = None, max_width: int = MAX_WIDTH):
+    if request.headers.get("content-type", "").startswith(RAW_CONTENT_TYPES):
+        image_data = await request.body()
+    else:
+        try:
+            body = ImageRequest(**await request.json())
+        except (ValueError, TypeError) as e:
+            raise HTTPException(status_code=422, detail=f"Expected an image body or {{\"image_base64\": ...}}: {e}")
+        try:
+            image_data = decode_base64_image(body.image_base64)
+        except binascii.Error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid base64 encoding: {str(e)}")
+    if not image_data:
+        raise HTTPException(status_code=400, detail="No image in the request.")
+
+    session = session or request.headers.get("X-Proctor-Session")
+    try:
+        result = await pool.analyze(image_data, session, max_width)
+    except Overloaded:
+        raise HTTPException(status_code=503, detail="Proctoring is busy, try again.", headers={"Retry-After": "1"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+    if session:
+        sessions.observe(session, result)
+    return result
+
+
+@app.post("/sessions/{session}/end")
+async def end_session_endpoint(session: str, request: Request):
+    """Closes the session's open incidents (for example when the exam is submitted)."""
+    authorize(request, session)
+    closed = sessions.end(session)
+    return {"closed": [incident.to_dict() for incident in closed]}
+
+
+@app.websocket("/ws/analyze")
+async def analyze_stream(websocket: WebSocket, session: str = None, max_width: int = MAX_WIDTH):
+    """
+    One connection per exam-taker: every binary message is an image (a text
+    message may carry base64 instead), answered by one JSON message. Frames are
+    analyzed one at a time per connection; a frame that finds its worker
+    overloaded is answered with an error and skipped.
+    """
+    await websocket.accept()
+    # The connection is the session when the client names none.
+    session = session or uuid.uuid4().hex
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                image_data = message["bytes"]
+            else:
+                try:
+                    image_data = decode_base64_image(message.get("text") or "")
+                except binascii.Error as e:
+                    await websocket.send_json({"error": f"Invalid base64 encoding: {str(e)}"})
+                    continue
+            if not image_data:
+                await websocket.send_json({"error": "Empty message; expected an image."})
+                continue
+            try:
+                result = await pool.analyze(image_data, session, max_width)
+            except Overloaded:
+                result = {"error": "Proctoring is busy, frame skipped.", "retry_after": 1}
+            except Exception as e:
+                result = {"error": str(e)}
+            if "error" not in result:
+                sessions.observe(session, result)
+            await websocket.send_json(result)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sessions.end(session)
+
+
+@app.post("/warmup")
+async def warm_up_endpoint(request: Request):
+    """Loads the models in every worker and runs a frame through them, so the first exam frames don't wait for it."""
+    authorize(request)
+    try:
+        workers = await pool.warm_up()
+    except (OSError, ValueError, cv2.error) as e:
+        raise HTTPException(status_code=500, detail=f"Could not load the proctoring models: {e}")
+    return {"preloaded": model_registry.PRELOAD, "workers": workers}
+
+
+@app.get("/stats")
+async def stats_endpoint():
+    return {
+        "workers": pool.stats(), "max_batch": MAX_BATCH, "batch_window_ms": BATCH_WINDOW_MS, "max_width": MAX_WIDTH,
+        "sessions": len(sessions.sessions), "incidents_pending": len(sessions.writer.pending),
+        "incidents_sent": sessions.writer.sent, "detector": get_registry().detector_name,
+        "models_preloaded": model_registry.PRELOAD,
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if os.environ.get("NGROK_AUTH_TOKEN"):
+        from pyngrok import ngrok
+        ngrok.set_auth_token(os.environ["NGROK_AUTH_TOKEN"])
+        logger.info("Public URL: %s", ngrok.connect(8000).public_url)
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,332 @@
+# Opencv Model/proctoring_session.py
+"""
+Session-aware proctoring for proctoring_service.py: frames that come with a
+session id (one per student per exam) are followed over time, and what they
+show is turned into incidents ("Looking Down from 10:02:15 to 10:03:40, 18
+frames") instead of one flag per frame.
+
+- Each session keeps a bounded history (ring buffers) of its last frames:
+  head pose, number of faces, objects found.
+- Head pose is smoothed with an exponential moving average before it is
+  compared with the thresholds, so one odd frame doesn't tip it. Pitch is
+  an angle, so each step is taken the short way round the circle.
+- Objects only count on frames where the object detector ran: on the
+  others the cascade (proctor.py) repeats the last ones it found, which
+  would otherwise look like new sightings.
+- A condition opens an incident when it shows in OPEN_HITS of the last
+  WINDOW frames, and the incident closes after CLOSE_MISSES frames in a row
+  without it. While open, the incident only gets its end time, frame count
+  and peak confidence updated.
+- Closed incidents are sent to the backend in batches, every FLUSH_SECONDS
+  or BATCH_SIZE incidents: POST PROCTOR_INCIDENTS_URL (the backend's
+  /api/proctoring-incidents/ingest/) with PROCTOR_INCIDENTS_KEY. The backend
+  stores them as ProctoringIncident rows linked to the student's ExamResult.
+  Without a URL they are only returned to the client.
+
+Only the incidents of sessions named by the backend are stored: the exam
+page gets "<enrollment_no>-<exam paper id>.<expiry>.<signature>" from the
+backend's /api/proctoring-session/, signed with the same key, and
+session_keys() checks it (this service is open to anyone, who could
+otherwise get incidents stored against any student). Sessions idle for
+IDLE_SECONDS (or ended by the client) have their open incidents closed.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+from proctor import HEAD_POSE_THRESHOLD
+
+HISTORY = 32
+WINDOW = 4
+OPEN_HITS = 2
+CLOSE_MISSES = 3
+POSE_SMOOTHING = 0.5  # Weight of the newest frame in the moving average.
+CHEATING_CONFIDENCE = 0.7
+MAX_SESSIONS = 5000
+IDLE_SECONDS = 300
+
+INCIDENTS_URL = os.environ.get("PROCTOR_INCIDENTS_URL", "")
+INCIDENTS_KEY = os.environ.get("PROCTOR_INCIDENTS_KEY", "")
+FLUSH_SECONDS = float(os.environ.get("PROCTOR_FLUSH_SECONDS", 10))
+BATCH_SIZE = 200
+MAX_PENDING = 20000
+
+logger = logging.getLogger(__name__)
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+def _wrap(angle):
+    """An angle in degrees, brought into [-180, 180)."""
+    return (angle + 180) % 360 - 180
+
+
+def _excess_confidence(value, threshold):
+    return min(0.5 + 0.5 * (value - threshold) / (90 - threshold), 1.0)
+
+
+class Incident:
+    def __init__(self, session, kind, label, started_at):
+        self.session = session
+        self.type = kind
+        self.label = label
+        self.started_at = started_at
+        self.ended_at = started_at
+        self.frames = 0
+        self.peak_confidence = 0.0
+        self.details = ""
+
+    def extend(self, timestamp, confidence, details):
+        self.ended_at = timestamp
+        self.frames += 1
+        if confidence >= self.peak_confidence:
+            self.peak_confidence, self.details = confidence, details
+
+    def to_dict(self):
+        return {
+            "session": self.session,
+            "type": self.type,
+            "label": self.label,
+            "started_at": _iso(self.started_at),
+            "ended_at": _iso(self.ended_at),
+            "frames": self.frames,
+            "peak_confidence": round(self.peak_confidence, 3),
+            "details": self.details,
+        }
+
+
+class SessionTracker:
+    """The recent frames and the open incidents of one session."""
+
+    def __init__(self, session):
+        self.session = session
+        self.poses = deque(maxlen=HISTORY)  # (time, pitch, yaw), smoothed.
+        self.face_counts = deque(maxlen=HISTORY)  # (time, faces)
+        self.objects = deque(maxlen=HISTORY)  # (time, labels)
+        self.hits = {}  # Condition -> deque of the time of each recent frame it showed in, or None.
+        self.open = {}  # Condition -> Incident
+        self.pitch = self.yaw = None
+        self.last_seen = time.time()
+
+    def _signals(self, result, now):
+        """The conditions this frame shows: {(type, label): (confidence, details)}."""
+        signals = {}
+        faces = result.get("num_faces", 0)
+        self.face_counts.append((now, faces))
+        if faces == 0:
+            signals[("Person Absent", None)] = (1.0, "No person detected in the image.")
+        elif faces > 1:
+            signals[("Multiple People", None)] = (1.0, f"{faces} faces detected.")
+
+        pose = result.get("head_pose")
+        if pose is None:
+            self.pitch = self.yaw = None
+        else:
+            if self.pitch is None:
+                self.pitch, self.yaw = pose["pitch"], pose["yaw"]
+            else:
+                self.pitch = _wrap(self.pitch + POSE_SMOOTHING * _wrap(pose["pitch"] - self.pitch))
+                self.yaw += POSE_SMOOTHING * (pose["yaw"] - self.yaw)
+            self.poses.append((now, self.pitch, self.yaw))
+            pitch_limit, yaw_limit = HEAD_POSE_THRESHOLD["PITCH_DOWN"], HEAD_POSE_THRESHOLD["YAW_SIDEWAYS"]
+            if self.pitch > pitch_limit:
+                signals[("Looking Down", None)] = (
+                    _excess_confidence(self.pitch, pitch_limit), f"Head pitch around {self.pitch:.2f}°."
+                )
+            if abs(self.yaw) > yaw_limit:
+                direction = "right" if self.yaw > 0 else "left"
+                signals[("Looking Sideways", None)] = (
+                    _excess_confidence(abs(self.yaw), yaw_limit), f"Head yawed around {abs(self.yaw):.2f}° {direction}."
+                )
+
+        if self._objects_checked(result):
+            labels = []
+            for event in result.get("events", []):
+                if event.get("label"):
+                    labels.append(event["label"])
+                    key = ("Object Detected", event["label"])
+                    if event["confidence"] >= signals.get(key, (0,))[0]:
+                        signals[key] = (event["confidence"], event["details"])
+            self.objects.append((now, tuple(labels)))
+        return signals
+
+    @staticmethod
+    def _objects_checked(result):
+        """Whether the object detector ran on this frame, rather than its last findings being repeated."""
+        return result.get("stages", {}).get("objects", True)
+
+    def update(self, result, now=None):
+        """Takes one frame's result; returns (open incidents, incidents closed by this frame)."""
+        now = now or time.time()
+        self.last_seen = now
+        signals = self._signals(result, now)
+        objects_checked = self._objects_checked(result)
+        closed = []
+        for key in set(self.hits) | set(signals):
+            if key[0] == "Object Detected" and not objects_checked:
+                continue  # Neither seen nor missed on this frame.
+            hits = self.hits.setdefault(key, deque(maxlen=WINDOW))
+            hits.append(now if key in signals else None)
+            incident = self.open.get(key)
+            if key in signals:
+                seen = [t for t in hits if t is not None]
+                if incident is None and len(seen) >= OPEN_HITS:
+                    incident = self.open[key] = Incident(self.session, key[0], key[1], seen[0])
+                    incident.frames = len(seen) - 1  # The earlier frames of the window; this one is added below.
+                if incident is not None:
+                    incident.extend(now, *signals[key])
+            elif incident is not None and all(t is None for t in list(hits)[-CLOSE_MISSES:]):
+                closed.append(self.open.pop(key))
+            if key not in self.open and not any(hits):
+                del self.hits[key]
+        return list(self.open.values()), closed
+
+    def close(self):
+        closed = list(self.open.values())
+        self.open.clear()
+        self.hits.clear()
+        return closed
+
+
+def session_keys(session, key=INCIDENTS_KEY, now=None):
+    """
+    (enrollment_no, exam_paper_id) from a session name signed by the backend
+    ("<enrollment_no>-<exam paper id>.<expiry>.<signature>"), or None if it
+    isn't one, has expired or its signature doesn't match.
+    """
+    name, _, signature = (session or "").rpartition(".")
+    owner, _, expires = name.rpartition(".")
+    if not key or not expires.isdigit() or int(expires) < (now or time.time()):
+        return None
+    expected = hmac.new(key.encode(), f"proctoring-session:{name}".encode(), hashlib.sha256).hexdigest()[:32]
+    if not hmac.compare_digest(expected, signature):
+        return None
+    enrollment_no, _, paper_id = owner.partition("-")
+    if enrollment_no.isdigit() and paper_id.isdigit():
+        return int(enrollment_no), int(paper_id)
+    return None
+
+
+def key_matches(given, key=INCIDENTS_KEY):
+    """Whether `given` is the shared key (while that is empty, nothing matches)."""
+    return bool(key) and hmac.compare_digest((given or "").encode(), key.encode())
+
+
+class IncidentWriter:
+    """Buffers closed incidents and posts them to the backend in batches."""
+
+    def __init__(self, url=INCIDENTS_URL, key=INCIDENTS_KEY):
+        self.url = url
+        self.key = key
+        self.pending = []
+        self.full = asyncio.Event()
+        self.sent = 0
+
+    def add(self, incidents):
+        if not self.url:
+            return
+        for incident in incidents:
+            keys = session_keys(incident.session, self.key)
+            if keys:
+                self.pending.append(dict(incident.to_dict(), enrollment_no=keys[0], exam_paper_id=keys[1]))
+        if len(self.pending) > MAX_PENDING:
+            # The backend has been away for long; keep the newest.
+            del self.pending[:len(self.pending) - MAX_PENDING]
+        if len(self.pending) >= BATCH_SIZE:
+            self.full.set()
+
+    def _post(self, batch):
+        request = urllib.request.Request(
+            self.url, data=json.dumps({"incidents": batch}).encode(), method="POST",
+            headers={"Content-Type": "application/json", "X-Proctoring-Key": self.key},
+        )
+        with urllib.request.urlopen(request, timeout=10) as response:
+            response.read()
+
+    async def flush(self):
+        while self.pending:
+            batch = self.pending[:BATCH_SIZE]
+            try:
+                await asyncio.to_thread(self._post, batch)
+            except urllib.error.HTTPError as e:
+                if e.code >= 500:
+                    logger.warning("Could not store %d proctoring incidents, will retry: %s", len(batch), e)
+                    return
+                # Sending it again would get the same answer.
+                logger.error("The backend refused %d proctoring incidents: %s", len(batch), e)
+                del self.pending[:len(batch)]
+                continue
+            except Exception as e:
+                logger.warning("Could not store %d proctoring incidents, will retry: %s", len(batch), e)
+                return
+            del self.pending[:len(batch)]
+            self.sent += len(batch)
+
+
+class SessionRegistry:
+    """The trackers of the live sessions, least recently seen first."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.sessions = OrderedDict()
+
+    def observe(self, session, result):
+        """Updates the session with one frame's result and adds the incidents to it."""
+        tracker = self.sessions.get(session)
+        if tracker is None:
+            tracker = self.sessions[session] = SessionTracker(session)
+            if len(self.sessions) > MAX_SESSIONS:
+                self.writer.add(self.sessions.popitem(last=False)[1].close())
+        else:
+            self.sessions.move_to_end(session)
+
+        open_incidents, closed = tracker.update(result)
+        self.writer.add(closed)
+        result["incidents"] = {
+            "open": [incident.to_dict() for incident in open_incidents],
+            "closed": [incident.to_dict() for incident in closed],
+        }
+        # Smoothed: only a condition that lasted long enough to be an incident counts.
+        result["frame_cheating_detected"] = result["cheating_detected"]
+        result["cheating_detected"] = any(i.peak_confidence > CHEATING_CONFIDENCE for i in open_incidents)
+        return result
+
+    def end(self, session):
+        tracker = self.sessions.pop(session, None)
+        closed = tracker.close() if tracker else []
+        self.writer.add(closed)
+        return closed
+
+    def sweep(self, now=None):
+        """Ends the sessions not seen for IDLE_SECONDS."""
+        limit = (now or time.time()) - IDLE_SECONDS
+        while self.sessions:
+            session, tracker = next(iter(self.sessions.items()))
+            if tracker.last_seen > limit:
+                break
+            self.end(session)
+
+    def end_all(self):
+        for session in list(self.sessions):
+            self.end(session)
+
+    async def run(self):
+        """Sweeps idle sessions and flushes incidents, every FLUSH_SECONDS or when a batch is full."""
+        while True:
+            try:
+                await asyncio.wait_for(self.writer.full.wait(), FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self.writer.full.clear()
+            self.sweep()
+            await self.writer.flush()
@@ -0,0 +1,51 @@
+# Opencv Model/test_head_pose.py
+"""
+Tests of head_pose.py. Run from this directory with
+`python -m unittest test_head_pose`.
+"""
+import math
+import unittest
+
+import cv2
+import numpy as np
+
+from head_pose import DIST_COEFFS, MODEL_POINTS, HeadPoseEstimator, euler_angles
+
+TVEC = np.array([[0.0], [0.0], [1500.0]])
+
+
+def turned(pitch=0.0, yaw=0.0):
+    """The rotation vector of a face looking at the camera, then nodding down by `pitch` and turning by `yaw` (radians)."""
+    frontal = cv2.Rodrigues(np.array([math.pi, 0.0, 0.0]))[0]
+    nod = cv2.Rodrigues(np.array([pitch, 0.0, 0.0]))[0]
+    turn = cv2.Rodrigues(np.array([0.0, yaw, 0.0]))[0]
+    return cv2.Rodrigues(turn @ nod @ frontal)[0]
+
+
+class HeadPoseTests(unittest.TestCase):
+    def setUp(self):
+        self.estimator = HeadPoseEstimator()
+
+    def test_angles_from_a_frontal_face(self):
+        pitch, yaw = euler_angles([turned(), turned(pitch=0.4), turned(pitch=-0.4), turned(yaw=0.4)])
+        np.testing.assert_allclose(pitch, [0, 22.92, -22.92, 0], atol=0.01)
+        np.testing.assert_allclose(np.abs(yaw), [0, 0, 0, 22.92], atol=0.01)
+        # Either side of the half turn reads the same.
+        np.testing.assert_allclose(euler_angles(np.array([[math.pi - 1e-3, 0, 0], [-math.pi + 1e-3, 0, 0]]))[0], [0, 0], atol=0.1)
+
+    def test_solve_recovers_the_pose(self):
+        camera = self.estimator.camera_matrix(640, 480)
+        self.assertIs(self.estimator.camera_matrix(640, 480), camera)
+        rvec = turned(pitch=0.3, yaw=-0.2)
+        points = cv2.projectPoints(MODEL_POINTS, rvec, TVEC, camera, DIST_COEFFS)[0].reshape(-1, 2)
+
+        pose = self.estimator.solve(points, (480, 640, 3))
+        np.testing.assert_allclose(euler_angles([pose[0]]), euler_angles([rvec]), atol=0.5)
+        # Starting from the previous pose lands on the same one.
+        seeded = self.estimator.solve(points, (480, 640, 3), guess=pose)
+        np.testing.assert_allclose(seeded[0], pose[0], atol=1e-3)
+        np.testing.assert_allclose(seeded[1], pose[1], atol=1e-1)
+
+
+if __name__ == "__main__":
+    unittest.main()
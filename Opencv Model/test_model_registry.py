@@ -0,0 +1,51 @@
+# Opencv Model/test_model_registry.py
+"""
+Tests of model_registry.py; no model file is needed. Run from this
+directory with `python -m unittest test_model_registry`.
+"""
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from model_registry import ModelRegistry
+
+
+class ModelRegistryTests(unittest.TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = Path(root.name)
+        (self.root / "coco.names").write_text("person\ncell phone\n")
+        patcher = mock.patch.dict(os.environ, {
+            "PROCTOR_CLASS_NAMES": str(self.root / "coco.names"),
+            "PROCTOR_DETECTOR_WEIGHTS": str(self.root / "missing.weights"),
+            "PROCTOR_DETECTOR_INPUT": "320",
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_detector_choice(self):
+        with self.assertRaises(ValueError):
+            ModelRegistry("yolov9")
+        registry = ModelRegistry("yolov3-tiny")
+        self.assertEqual(registry.spec.input_size, 320)
+        self.assertEqual(registry.paths["detector_weights"], self.root / "missing.weights")
+        self.assertTrue(str(registry.paths["detector_config"]).endswith("yolov3-tiny.cfg"))
+        self.assertIsNone(ModelRegistry("onnx").paths["detector_config"])
+
+    def test_models_are_loaded_on_first_use(self):
+        registry = ModelRegistry("onnx")
+        self.assertEqual(registry.status()["loaded"], [])
+        with self.assertRaisesRegex(FileNotFoundError, "Detector weights"):
+            registry.object_detector
+        self.assertEqual(registry.status()["loaded"], [])
+
+        self.assertIs(registry.face_detector, registry.face_detector)
+        self.assertEqual(registry.status()["loaded"], ["face_detector"])
+        self.assertEqual(list(registry.load_ms), ["face_detector"])
+
+
+if __name__ == "__main__":
+    unittest.main()
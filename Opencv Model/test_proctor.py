@@ -0,0 +1,167 @@
+# Opencv Model/test_proctor.py
+"""
+Tests of the proctoring cascade, with fake models standing in for dlib and
+YOLO so they run without the model files. Run from this directory with
+`python -m unittest test_proctor`.
+"""
+import unittest
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+import proctor
+from head_pose import DIST_COEFFS, LANDMARKS, MODEL_POINTS, HeadPoseEstimator
+from model_registry import DETECTORS
+
+WIDTH, HEIGHT = 320, 240  # No wider than FACE_DETECT_WIDTH, so faces are looked for on the frame itself.
+PHONE = 67
+
+
+class FakeFace:
+    def __init__(self, left=120, top=60, size=80):
+        self._left, self._top, self._size = left, top, size
+
+    def left(self):
+        return self._left
+
+    def top(self):
+        return self._top
+
+    def right(self):
+        return self._left + self._size
+
+    def bottom(self):
+        return self._top + self._size
+
+    def width(self):
+        return self._size
+
+    def height(self):
+        return self._size
+
+
+class FakeShape:
+    """The landmarks of a face turned by `rvec`, seen from the camera proctor.py assumes."""
+
+    def __init__(self, rvec):
+        camera = HeadPoseEstimator().camera_matrix(WIDTH, HEIGHT)
+        points = cv2.projectPoints(MODEL_POINTS, rvec, np.array([[0.0], [0.0], [1500.0]]), camera, DIST_COEFFS)[0]
+        self.points = dict(zip(LANDMARKS, points.reshape(-1, 2)))
+
+    def part(self, i):
+        x, y = self.points[i]
+        return SimpleNamespace(x=int(x), y=int(y))
+
+
+class FakeNet:
+    """Finds a phone in every frame brighter than mid-grey."""
+
+    def __init__(self):
+        self.passes = []
+
+    def setInput(self, blob):
+        self.blob = blob
+
+    def forward(self, layers):
+        self.passes.append(len(self.blob))
+        rows = np.zeros((len(self.blob), 3, 5 + PHONE + 1), np.float32)
+        for n, image in enumerate(self.blob):
+            if image.mean() > 0.5:
+                rows[n, 0, :5] = [0.5, 0.5, 0.2, 0.2, 0.9]
+                rows[n, 0, 5 + PHONE] = 0.9
+        return [rows.reshape(-1, rows.shape[-1])]
+
+
+def fake_models(faces=1):
+    net = FakeNet()
+    return SimpleNamespace(
+        face_detector=lambda gray: [FakeFace(40 + 100 * i) for i in range(faces)],
+        shape_predictor=lambda gray, face: FakeShape(np.array([[3.1], [0.0], [0.0]])),
+        object_detector=SimpleNamespace(
+            net=net, output_layers=["out"], spec=DETECTORS["yolov3"],
+            classes=["object"] * PHONE + ["cell phone"], forbidden_ids=np.array([PHONE]),
+        ),
+    )
+
+
+def frame(value=60, square=None):
+    """A textured frame; `square` = (x, y, brightness) adds a 40x40 patch."""
+    image = np.full((HEIGHT, WIDTH, 3), value, np.uint8)
+    image[::16] = value + 40
+    if square:
+        x, y, brightness = square
+        image[y:y + 40, x:x + 40] = brightness
+    return image
+
+
+class CascadeTests(unittest.TestCase):
+    def setUp(self):
+        self.models = fake_models()
+        self.proctor = proctor.SingleImageProctor(self.models)
+        self.net = self.models.object_detector.net
+
+    def test_frames_without_session(self):
+        results = self.proctor.analyze_batch([frame(), frame(200)])
+        self.assertEqual([r["stages"]["objects"] for r in results], [True, True])
+        self.assertEqual(self.net.passes, [2])
+        self.assertEqual([e["label"] for e in results[1]["events"] if "label" in e], ["cell phone"])
+        self.assertEqual(results[0]["num_faces"], 1)
+        self.assertIsNotNone(results[0]["head_pose"])
+
+    def test_head_pose_is_measured_from_a_frontal_face(self):
+        # The fake landmarks are of a face turned a few degrees short of a half turn: nearly frontal.
+        result = self.proctor.analyze_batch([frame()])[0]
+        self.assertAlmostEqual(result["head_pose"]["pitch"], 0, delta=5)
+        self.assertAlmostEqual(result["head_pose"]["yaw"], 0, delta=1)
+        self.assertNotIn("Looking Down", [e["type"] for e in result["events"]])
+
+    def test_unchanged_frame_is_not_analyzed_again(self):
+        first = self.proctor.analyze_image(frame(), "s")
+        second = self.proctor.analyze_image(frame(), "s")
+        self.assertEqual(second["stages"], {"unchanged": True, "faces": False, "objects": False})
+        self.assertEqual(second["head_pose"], first["head_pose"])
+        self.assertEqual(self.net.passes, [1])
+
+    def test_same_session_twice_in_one_batch(self):
+        results = self.proctor.analyze_batch([frame(), frame(), frame()], ["s", "s", "t"])
+        self.assertEqual([r["stages"]["unchanged"] for r in results], [False, True, False])
+        # The later frame of "s" goes through a second round.
+        self.assertEqual(self.net.passes, [2])
+
+    def test_objects_checked_again_after_the_interval(self):
+        self.proctor.analyze_image(frame(), "s")
+        moved = self.proctor.analyze_image(frame(square=(10, 10, 90)), "s")
+        self.assertEqual(moved["stages"], {"unchanged": False, "faces": True, "objects": False})
+
+        self.proctor.sessions["s"].objects_at -= proctor.OBJECT_DETECTION_SECONDS
+        later = self.proctor.analyze_image(frame(square=(60, 10, 90)), "s")
+        self.assertTrue(later["stages"]["objects"])
+        self.assertEqual(self.net.passes, [1, 1])
+
+    def test_new_face_triggers_object_detection(self):
+        self.proctor.analyze_image(frame(), "s")
+        self.models.face_detector = lambda gray: [FakeFace(20), FakeFace(200)]
+        result = self.proctor.analyze_image(frame(square=(10, 10, 90)), "s")
+        self.assertTrue(result["stages"]["objects"])
+        self.assertEqual(result["num_faces"], 2)
+
+    def test_model_error_is_not_cheating(self):
+        def missing(blob):
+            raise FileNotFoundError("yolov3.weights not found")
+
+        self.net.setInput = missing
+        first = self.proctor.analyze_image(frame(), "s")
+        self.assertEqual([e["type"] for e in first["events"]], ["Model Error"])
+        self.assertFalse(first["cheating_detected"])
+
+        # Not carried over: the detector is tried again on the next frame.
+        del self.net.setInput
+        second = self.proctor.analyze_image(frame(square=(10, 10, 90)), "s")
+        self.assertTrue(second["stages"]["objects"])
+        self.assertEqual(second["events"], [])
+        self.assertEqual(self.net.passes, [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+# Opencv Model/test_proctoring_service.py
+"""
+Tests of the frame decoding and the workers in proctoring_service.py. Run
+from this directory with `python -m unittest test_proctoring_service`.
+"""
+import asyncio
+import unittest
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+
+import proctoring_service
+from proctoring_session import IncidentWriter, SessionRegistry
+from test_proctoring_session import signed
+
+
+class FakeProctor:
+    def analyze_batch(self, frames, sessions):
+        return [{"events": [], "session": session} for session in sessions]
+
+
+class DecodeTests(unittest.TestCase):
+    def setUp(self):
+        self.jpeg = cv2.imencode(".jpg", np.full((480, 1280, 3), 90, np.uint8))[1].tobytes()
+
+    def test_jpeg_size_and_reduced_decode(self):
+        self.assertEqual(proctoring_service._jpeg_size(self.jpeg), (1280, 480))
+        self.assertIsNone(proctoring_service._jpeg_size(b"not a jpeg"))
+        self.assertEqual(proctoring_service.decode_frame(self.jpeg, 640).shape, (240, 640, 3))
+        self.assertEqual(proctoring_service.decode_frame(self.jpeg).shape, (480, 1280, 3))
+
+    def test_bad_frames_do_not_fail_the_batch(self):
+        proctoring_service._proctor = FakeProctor()
+        self.addCleanup(setattr, proctoring_service, "_proctor", None)
+        results = proctoring_service._analyze_encoded([
+            (b"", "a", 640), (b"\xff\xd8garbage", "b", 640), (self.jpeg, "c", 640),
+        ])
+        self.assertIn("error", results[0])
+        self.assertIn("error", results[1])
+        self.assertEqual((results[2]["session"], results[2]["frame_size"]), ("c", [640, 240]))
+
+
+class FakeExecutor:
+    """Runs jobs in the calling thread; a `broken` one fails them the way a dead worker process does."""
+
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.closed = False
+
+    def submit(self, fn, *args):
+        future = Future()
+        if self.broken:
+            future.set_exception(BrokenProcessPool("A child process terminated abruptly."))
+        else:
+            future.set_result([{"session": session} for _, session, _ in args[0]])
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.closed = True
+
+
+class WorkerTests(unittest.TestCase):
+    def test_dead_worker_process_is_replaced(self):
+        async def scenario():
+            worker = proctoring_service.Worker()
+            worker.executor.shutdown()
+            broken = worker.executor = FakeExecutor(broken=True)
+            worker._new_executor = FakeExecutor
+            worker.start()
+            # Not assertRaises: it clears the frames of the traceback, which would close the worker's loop.
+            lost = worker.submit(b"jpeg", "a", 640)
+            await asyncio.wait([lost])
+            self.assertIsInstance(lost.exception(), BrokenProcessPool)
+            result = await worker.submit(b"jpeg", "b", 640)
+            await worker.stop()
+            return worker, broken, result
+
+        worker, broken, result = asyncio.run(scenario())
+        self.assertTrue(broken.closed)
+        self.assertEqual((worker.restarts, worker.batches), (1, 1))
+        self.assertEqual(result, {"session": "b"})
+
+
+class FakeRequest:
+    def __init__(self, **headers):
+        self.headers = headers
+
+
+class AuthorizationTests(unittest.TestCase):
+    def setUp(self):
+        proctoring_service.sessions = SessionRegistry(IncidentWriter(url="", key="secret"))
+        self.addCleanup(setattr, proctoring_service, "sessions", None)
+
+    def assertForbidden(self, endpoint, *args):
+        with self.assertRaises(proctoring_service.HTTPException) as raised:
+            asyncio.run(endpoint(*args))
+        self.assertEqual(raised.exception.status_code, 403)
+
+    def test_ending_a_session_takes_its_signature_or_the_key(self):
+        end = proctoring_service.end_session_endpoint
+        self.assertForbidden(end, "1-2", FakeRequest())
+        self.assertForbidden(end, signed("1-2", key="other"), FakeRequest())
+        self.assertForbidden(end, "1-2", FakeRequest(**{"X-Proctoring-Key": "wrong"}))
+        self.assertEqual(asyncio.run(end(signed("1-2"), FakeRequest())), {"closed": []})
+        self.assertEqual(asyncio.run(end("1-2", FakeRequest(**{"X-Proctoring-Key": "secret"}))), {"closed": []})
+
+    def test_warm_up_takes_the_key(self):
+        self.assertForbidden(proctoring_service.warm_up_endpoint, FakeRequest())
+        # A signed session is not enough for the whole service.
+        self.assertForbidden(proctoring_service.warm_up_endpoint, FakeRequest(**{"X-Proctoring-Key": signed("1-2")}))
+
+    def test_no_key_lets_nothing_through(self):
+        proctoring_service.sessions.writer.key = ""
+        self.assertForbidden(proctoring_service.end_session_endpoint, "1-2", FakeRequest(**{"X-Proctoring-Key": ""}))
+
+
+if __name__ == "__main__":
+    unittest.main()
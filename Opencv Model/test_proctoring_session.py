@@ -0,0 +1,84 @@
+# Opencv Model/test_proctoring_session.py
+"""
+Tests of the session tracking in proctoring_session.py. Run from this
+directory with `python -m unittest test_proctoring_session`.
+"""
+import hashlib
+import hmac
+import time
+import unittest
+
+from proctoring_session import IncidentWriter, SessionTracker, session_keys
+
+
+def signed(name, key="secret", expires=None):
+    """A session name signed the way the backend's api/proctoring.py does it."""
+    name = f"{name}.{expires or int(time.time()) + 3600}"
+    signature = hmac.new(key.encode(), f"proctoring-session:{name}".encode(), hashlib.sha256).hexdigest()[:32]
+    return f"{name}.{signature}"
+
+
+class SessionKeyTests(unittest.TestCase):
+    def test_only_signed_sessions_name_a_student(self):
+        self.assertEqual(session_keys(signed("12-3"), "secret"), (12, 3))
+        self.assertIsNone(session_keys("12-3", "secret"))
+        self.assertIsNone(session_keys(signed("12-3", key="guess"), "secret"))
+        self.assertIsNone(session_keys(signed("12-3").replace("12-3", "13-3"), "secret"))
+        self.assertIsNone(session_keys(signed("12-3", expires=int(time.time()) - 1), "secret"))
+        self.assertIsNone(session_keys(signed("12-3"), ""))
+
+    def test_writer_skips_unsigned_sessions(self):
+        class Closed:
+            def __init__(self, session):
+                self.session = session
+
+            def to_dict(self):
+                return {"session": self.session}
+
+        writer = IncidentWriter(url="http://backend/ingest", key="secret")
+        writer.add([Closed("12-3"), Closed(signed("12-3"))])
+        self.assertEqual([(i["enrollment_no"], i["exam_paper_id"]) for i in writer.pending], [(12, 3)])
+
+
+def result(pitch=0.0, yaw=0.0, phone=False, objects_checked=True):
+    """A frame's result as proctor.py returns it: one face, at the given head pose."""
+    events = [{"label": "cell phone", "confidence": 0.9, "details": "cell phone detected."}] if phone else []
+    return {
+        "num_faces": 1, "head_pose": {"pitch": pitch, "yaw": yaw}, "events": events,
+        "stages": {"unchanged": False, "faces": True, "objects": objects_checked},
+    }
+
+
+class SessionTrackerTests(unittest.TestCase):
+    def kinds(self, results):
+        tracker = SessionTracker("s")
+        opened = set()
+        for t, frame_result in enumerate(results):
+            incidents, _ = tracker.update(frame_result, now=1000.0 + t)
+            opened |= {incident.type for incident in incidents}
+        return opened, tracker
+
+    def test_pose_is_smoothed_the_short_way_round(self):
+        opened, _ = self.kinds(result(pitch) for pitch in (-0.2, 0.4, 0.1, -0.3, 0.2))
+        self.assertEqual(opened, set())
+
+        # Pitches either side of ±180 average to 180, not to 0.
+        _, tracker = self.kinds(result(pitch) for pitch in (-179.8, 179.6, 179.9, -179.7, 179.8))
+        self.assertGreater(abs(tracker.pitch), 179)
+
+        opened, _ = self.kinds(result(pitch=80.0) for _ in range(3))
+        self.assertEqual(opened, {"Looking Down"})
+
+    def test_repeated_objects_are_not_new_sightings(self):
+        # One false positive, then frames on which the cascade repeats it.
+        frames = [result(phone=True)] + [result(phone=True, objects_checked=False)] * 4
+        opened, tracker = self.kinds(frames)
+        self.assertEqual(opened, set())
+        self.assertEqual(len(tracker.objects), 1)
+
+        opened, _ = self.kinds([result(phone=True), result(phone=True, objects_checked=False), result(phone=True)])
+        self.assertEqual(opened, {"Object Detected"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,47 @@
 # api/authentication.py
 
+import time
+
 import jwt
 from django.conf import settings
 from rest_framework import authentication, exceptions
 from .models import StudentData, Faculty
+from .principal_cache import get_principal_cache
+
+def decode_token(token):
+    """
+    Returns the payload of a signed token, raising jwt errors like jwt.decode.
+    A token we have already verified is not decoded again; only its expiry
+    needs checking.
+    """
+    cache = get_principal_cache()
+    payload = cache.get_payload(token)
+    if payload is None:
+        # Decode the token using the same secret key from your login view.
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+        cache.set_payload(token, payload)
+    elif payload.get('exp') is not None and payload['exp'] < time.time():
+        raise jwt.ExpiredSignatureError()
+    return payload
+
+def load_principal(role, user_id, issued_at):
+    """
+    The StudentData or Faculty row of a token's user, from the principal
+    cache when it was loaded recently. Raises DoesNotExist if the user is
+    gone, or AuthenticationFailed for an unknown role.
+    """
+    cache = get_principal_cache()
+    user = cache.get_user(role, user_id, issued_at)
+    if user is None:
+        # Based on the role in the token, fetch the correct user object.
+        if role == 'student':
+            user = StudentData.objects.get(enrollment_no=user_id)
+        elif role == 'faculty':
+            user = Faculty.objects.get(fac_id=user_id)
+        else:
+            raise exceptions.AuthenticationFailed('Invalid role in token.')
+        cache.set_user(role, user_id, issued_at, user)
+    return user
 
 # This is our custom authenticator that understands your token.
 class CustomJWTAuthentication(authentication.BaseAuthentication):
@@ -16,8 +54,7 @@ class CustomJWTAuthentication(authentication.BaseAuthentication):
         token = auth_header.split(' ')[1]
 
         try:
-            # Decode the token using the same secret key from your login view.
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+            payload = decode_token(token)
             
             user_id = payload.get('id')
             role = payload.get('role')
@@ -25,13 +62,8 @@ class CustomJWTAuthentication(authentication.BaseAuthentication):
             if not user_id or not role:
                 raise exceptions.AuthenticationFailed('Invalid token payload.')
 
-            # Based on the role in the token, fetch the correct user object.
-            if role == 'student':
-                user = StudentData.objects.get(enrollment_no=user_id)
-            elif role == 'faculty':
-                user = Faculty.objects.get(fac_id=user_id)
-            else:
-                raise exceptions.AuthenticationFailed('Invalid role in token.')
+            # Users seen recently are served from memory (see principal_cache.py).
+            user = load_principal(role, user_id, payload.get('iat'))
 
             # --- FIX: Add the is_authenticated property that DRF expects ---
             # This tells the permission checker that the user is valid.
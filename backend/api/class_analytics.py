@@ -0,0 +1,235 @@
+# api/class_analytics.py
+"""
+Class analytics for the faculty: how a semester (optionally one subject, or
+one online test) is doing, and which students are at risk.
+
+Each table is read once with values_list() into NumPy arrays, one column
+per field, and every statistic is computed on whole columns: distributions
+and percentiles, z-scores, the T1 -> T2 -> T3 progression and the at-risk
+flags. Rows are matched to students with a binary search over the sorted
+enrollment numbers (np.searchsorted) and summed per student with
+np.bincount, so nothing loops over rows in Python.
+
+Results are cached per (semester, filters, data version). Writes to marks,
+exam results or students bump the version from signals.py after commit.
+"""
+import threading
+import time
+
+import numpy as np
+from django.db import connections
+
+from .models import CurrentSemMarks, ExamResult, PastMarks, PracticalMarks, StudentData
+
+PERCENTILES = (10, 25, 50, 75, 90)
+HISTOGRAM_BINS = 10
+# A student is flagged when a score is this many standard deviations below the class mean.
+AT_RISK_Z = -1.0
+
+
+def columns(queryset, *fields):
+    """
+    Reads numeric `fields` of a queryset into a float array with one column per
+    field. The rows go from the cursor straight into NumPy: plain numbers need
+    none of the per-row conversions the ORM would apply.
+    """
+    sql, params = queryset.values_list(*fields).query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return np.array(rows, dtype=float).reshape(len(rows), len(fields))
+
+
+def distribution(values):
+    """Summary statistics and a histogram of a 1-d array (NaNs ignored)."""
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return {'count': 0}
+    percentiles = np.percentile(values, PERCENTILES)
+    counts, edges = np.histogram(values, bins=HISTOGRAM_BINS)
+    return {
+        'count': int(values.size),
+        'mean': round(float(values.mean()), 2),
+        'std': round(float(values.std()), 2),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'percentiles': {f'p{p}': round(float(v), 2) for p, v in zip(PERCENTILES, percentiles)},
+        'histogram': {'counts': counts.tolist(), 'edges': np.round(edges, 2).tolist()},
+    }
+
+
+def zscores(values):
+    """Z-scores of a 1-d array; NaN where the value is missing or everyone scored the same."""
+    present = ~np.isnan(values)
+    if not present.any():
+        return np.full(values.shape, np.nan)
+    mean, std = values[present].mean(), values[present].std()
+    if std == 0:
+        return np.where(present, 0.0, np.nan)
+    return (values - mean) / std
+
+
+def per_student_mean(index, values, size):
+    """The mean of `values` per student (`index` gives each value's student); NaN for students with none."""
+    sums = np.bincount(index, weights=values, minlength=size)
+    counts = np.bincount(index, minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def compute(semester, subject_id=None, test_name=None):
+    started = time.perf_counter()
+
+    students = StudentData.objects.filter(semester=semester).order_by('enrollment_no')
+    student_rows = list(students.values_list('enrollment_no', 'name'))
+    enrollment = np.array([row[0] for row in student_rows], dtype=np.int64)
+    names = np.array([row[1] for row in student_rows], dtype=object)
+    size = enrollment.size
+    in_semester = students.values('enrollment_no')
+
+    def filtered(queryset):
+        return queryset.filter(subject_id=subject_id) if subject_id is not None else queryset
+
+    def student_index(column):
+        return np.searchsorted(enrollment, column.astype(np.int64))
+
+    # --- Current semester T1/T2/T3 ---
+    marks = columns(
+        filtered(CurrentSemMarks.objects.filter(enrollment_number__in=in_semester)),
+        'enrollment_number', 't1_marks', 't2_marks', 't3_marks',
+    )
+    marks_index = student_index(marks[:, 0])
+    t1, t2, t3 = marks[:, 1], marks[:, 2], marks[:, 3]
+    total = t1 + t2 + t3
+    student_total = per_student_mean(marks_index, total, size)
+    t1_to_t2, t2_to_t3 = t2 - t1, t3 - t2
+    # Per student: the average change between tests over their subjects.
+    student_t1_to_t2 = per_student_mean(marks_index, t1_to_t2, size)
+    student_t2_to_t3 = per_student_mean(marks_index, t2_to_t3, size)
+
+    # --- Online exams ---
+    exams = ExamResult.objects.filter(enrollment_no__in=in_semester)
+    if test_name:
+        exams = exams.filter(test_name=test_name)
+    exams = columns(filtered(exams), 'enrollment_no', 'code_marks', 'mcq_marks')
+    exam_total = exams[:, 1] + exams[:, 2]
+    student_exam = per_student_mean(student_index(exams[:, 0]), exam_total, size)
+
+    # --- Previous semesters ---
+    past = columns(filtered(PastMarks.objects.filter(enrollment_no__in=in_semester)), 'enrollment_no', 'marks')
+    student_past = per_student_mean(student_index(past[:, 0]), past[:, 1], size)
+    practical = columns(filtered(PracticalMarks.objects.filter(enrollment_no__in=in_semester)), 'enrollment_no', 'marks')
+    student_practical = per_student_mean(student_index(practical[:, 0]), practical[:, 1], size)
+
+    # --- At-risk flags, one boolean column per reason ---
+    z_total = zscores(student_total)
+    z_exam = zscores(student_exam)
+    z_past = zscores(student_past)
+    reasons = {
+        'low_current_marks': z_total < AT_RISK_Z,
+        'declining': (student_t1_to_t2 < 0) & (student_t2_to_t3 < 0),
+        'low_exam_marks': z_exam < AT_RISK_Z,
+        'low_past_marks': z_past < AT_RISK_Z,
+    }
+    flags = np.column_stack(list(reasons.values())) if size else np.zeros((0, len(reasons)), dtype=bool)
+    at_risk = np.flatnonzero(flags.any(axis=1))
+    reason_names = np.array(list(reasons))
+
+    def rounded(value):
+        return None if np.isnan(value) else round(float(value), 2)
+
+    return {
+        'semester': semester,
+        'subject_id': subject_id,
+        'test_name': test_name,
+        'students': int(size),
+        'current_marks': {
+            't1': distribution(t1),
+            't2': distribution(t2),
+            't3': distribution(t3),
+            'total': distribution(total),
+            'student_average_total': distribution(student_total),
+        },
+        'progression': {
+            't1_to_t2': distribution(t1_to_t2),
+            't2_to_t3': distribution(t2_to_t3),
+            'improving_rows': int(((t1_to_t2 > 0) & (t2_to_t3 > 0)).sum()),
+            'declining_rows': int(((t1_to_t2 < 0) & (t2_to_t3 < 0)).sum()),
+        },
+        'exam_results': distribution(exam_total),
+        'past_marks': distribution(student_past),
+        'practical_marks': distribution(student_practical),
+        'at_risk': [
+            {
+                'enrollment_no': int(enrollment[i]),
+                'name': names[i],
+                'average_total': rounded(student_total[i]),
+                'z_total': rounded(z_total[i]),
+                'z_exam': rounded(z_exam[i]),
+                'z_past': rounded(z_past[i]),
+                'reasons': reason_names[flags[i]].tolist(),
+            }
+            for i in at_risk
+        ],
+        'computed_in_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+class ClassAnalytics:
+    """Computed analytics in a Django cache, keyed by a per-semester and a global data version."""
+
+    def __init__(self, cache, timeout=3600):
+        self.cache = cache
+        self.timeout = timeout
+
+    def _version(self, key):
+        version = self.cache.get(key)
+        if version is None:
+            # Start from the clock, so an evicted version never matches old entries.
+            self.cache.add(key, time.time_ns(), None)
+            version = self.cache.get(key)
+        return version
+
+    def get(self, semester, subject_id=None, test_name=None):
+        versions = f"{self._version(f'analytics:v:sem:{semester}')}.{self._version('analytics:v:all')}"
+        key = f"analytics:{semester}:{subject_id}:{test_name}:{versions}"
+        data = self.cache.get(key)
+        if data is None:
+            data = compute(semester, subject_id, test_name)
+            self.cache.set(key, data, self.timeout)
+            data = dict(data, cached=False)
+        else:
+            data = dict(data, cached=True)
+        return data
+
+    def _bump(self, key):
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            pass
+
+    def invalidate_semester(self, semester):
+        self._bump(f'analytics:v:sem:{semester}')
+
+    def invalidate_all(self):
+        self._bump('analytics:v:all')
+
+
+_analytics = None
+_analytics_lock = threading.Lock()
+
+
+def get_class_analytics():
+    """Returns the process-wide class analytics, creating them from settings on first use."""
+    global _analytics
+    if _analytics is None:
+        with _analytics_lock:
+            if _analytics is None:
+                from django.conf import settings
+                from django.core.cache import caches
+                config = getattr(settings, 'CLASS_ANALYTICS', {})
+                _analytics = ClassAnalytics(
+                    caches[config.get('BACKEND', 'default')],
+                    timeout=config.get('TIMEOUT', 3600),
+                )
+    return _analytics
@@ -0,0 +1,404 @@
+# api/code_runner.py
+"""
+A pool of warm Python interpreters used to run student code.
+
+Starting a new `sys.executable` for every test case means paying for a full
+interpreter boot each time. Instead we keep a few runner processes alive and
+send them jobs over a pipe. A job is one submission plus the stdin of every
+test case: the code is compiled once, and each case runs in a fork of the
+runner, so a whole "Run" costs milliseconds.
+
+The runner itself never runs student code: it is a clean template with the
+usual modules already imported. Whatever a case does (patching a module,
+starting threads, changing the recursion limit, crashing the interpreter)
+dies with its fork, so nothing carries over to the next case, which may be
+another student's. In the fork, file descriptors 0, 1 and 2 are temporary
+files holding the case's input and collecting its output, and sys.stdin,
+sys.stdout and sys.stderr are ordinary text files over them, so
+`sys.stdin.buffer`, `open(0)`, `os.read(0, ...)` and friends behave as they
+do in a standalone program.
+
+Runners are recycled after a number of jobs or when their memory grows past
+a limit, and a runner that stops answering or dies is killed and replaced.
+Where os.fork is not available (Windows), each case runs in a new
+interpreter instead.
+"""
+import atexit
+import builtins
+import multiprocessing
+import os
+import queue
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+# The filename shown in tracebacks of student code.
+CODE_FILENAME = 'main.py'
+
+# Extra seconds the parent waits for a case before it kills the runner. Within
+# this window the runner is expected to have killed the case itself.
+KILL_GRACE = 1.0
+
+# Output kept of each stream of a case; a case writing more gets an error.
+MAX_OUTPUT_BYTES = 8 * 1024 * 1024
+
+# Possible verdicts of a test case.
+PASS = 'pass'
+FAIL = 'fail'
+TIMEOUT = 'timeout'
+CRASH = 'crash'
+
+_HAS_FORK = hasattr(os, 'fork')
+
+# Modules student code often imports, loaded when a runner starts so that
+# every case's fork has them ready.
+PRELOADED_MODULES = ('math', 'collections', 'itertools', 'functools', 'heapq', 'bisect', 're', 'string')
+
+
+def _current_rss_kb():
+    """Returns the peak resident memory of this process in KB (0 if unknown)."""
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _exit_code(code):
+    """Maps a SystemExit code to a process return code, like the interpreter does."""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _result(stdout='', stderr='', returncode=0, timed_out=False, elapsed=0.0):
+    return {
+        'stdout': stdout,
+        'stderr': stderr,
+        'returncode': returncode,
+        'timed_out': timed_out,
+        'elapsed': elapsed,
+    }
+
+
+def _timeout_result(timeout):
+    return _result(stderr=f'Time limit exceeded ({timeout}s).', returncode=None, timed_out=True, elapsed=float(timeout))
+
+
+def _crash_result():
+    return _result(stderr='The program terminated unexpectedly.', returncode=-1)
+
+
+def _decode(data):
+    return data.decode('utf-8', errors='replace')
+
+
+def _case_main(code_obj, stdin_file, stdout_file, stderr_file):
+    """Runs one case in a freshly forked runner, as a standalone program would run. Never returns."""
+    returncode = 1
+    try:
+        os.setpgid(0, 0)  # So that the case and whatever it starts can be killed together.
+        for fd, file_obj in enumerate((stdin_file, stdout_file, stderr_file)):
+            os.dup2(file_obj.fileno(), fd)
+        # Nothing else of the runner (its pipe to the server included) stays open.
+        os.closerange(3, os.sysconf('SC_OPEN_MAX') if hasattr(os, 'sysconf') else 1024)
+        if resource is not None:
+            signal.signal(signal.SIGXFSZ, signal.SIG_IGN)  # Writing past the limit raises OSError instead.
+            resource.setrlimit(resource.RLIMIT_FSIZE, (MAX_OUTPUT_BYTES, MAX_OUTPUT_BYTES))
+        sys.stdin = sys.__stdin__ = open(0, 'r', encoding='utf-8', closefd=False)
+        sys.stdout = sys.__stdout__ = open(1, 'w', encoding='utf-8', closefd=False)
+        sys.stderr = sys.__stderr__ = open(2, 'w', encoding='utf-8', errors='backslashreplace', closefd=False)
+
+        try:
+            exec(code_obj, {'__name__': '__main__', '__builtins__': builtins})
+            returncode = 0
+        except SystemExit as e:
+            returncode = _exit_code(e.code)
+        except BaseException as e:
+            # Skip our own frame so the traceback starts at the student's code.
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        # Like the interpreter, wait for the threads the program left running.
+        for thread in threading.enumerate():
+            if thread is not threading.current_thread() and not thread.daemon:
+                thread.join()
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(returncode & 0xFF)
+
+
+def _wait(pid, timeout):
+    """Waits for a case's fork; returns its wait status, or None if it ran past `timeout` and was killed."""
+    deadline = time.monotonic() + timeout if timeout else None
+    delay = 0.0005
+    status = None
+    while True:
+        waited, wait_status = os.waitpid(pid, os.WNOHANG)
+        if waited:
+            status = wait_status
+            break
+        if deadline is not None and time.monotonic() >= deadline:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            break
+        time.sleep(delay)
+        delay = min(delay * 2, 0.005)
+    # Whatever the case started and left behind.
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    return status
+
+
+def _read_output(file_obj):
+    file_obj.seek(0)
+    return _decode(file_obj.read(MAX_OUTPUT_BYTES))
+
+
+def _run_forked(code_obj, stdin_text, timeout):
+    """Runs compiled student code in a fork of this process and captures its output."""
+    with tempfile.TemporaryFile() as stdin_file, tempfile.TemporaryFile() as stdout_file, \
+            tempfile.TemporaryFile() as stderr_file:
+        stdin_file.write((stdin_text or '').encode('utf-8'))
+        stdin_file.seek(0)
+        start = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            _case_main(code_obj, stdin_file, stdout_file, stderr_file)
+        try:
+            os.setpgid(pid, pid)  # Also done by the fork; whichever comes first.
+        except OSError:
+            pass
+        status = _wait(pid, timeout)
+        elapsed = time.perf_counter() - start
+        if status is None:
+            return _timeout_result(timeout)
+
+        stderr = _read_output(stderr_file)
+        returncode = os.waitstatus_to_exitcode(status)
+        if returncode < 0:
+            stderr += _crash_result()['stderr']  # Killed by a signal, e.g. a segfault.
+        return _result(_read_output(stdout_file), stderr, returncode, False, elapsed)
+
+
+def _run_subprocess(code, stdin_text, timeout):
+    """Runs student code in a new interpreter, where os.fork is not available."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, CODE_FILENAME)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(code)
+        start = time.perf_counter()
+        try:
+            run = subprocess.run(
+                [sys.executable, path], input=(stdin_text or '').encode('utf-8'), capture_output=True,
+                timeout=timeout or None, env={**os.environ, 'PYTHONIOENCODING': 'utf-8'},
+            )
+        except subprocess.TimeoutExpired:
+            return _timeout_result(timeout)
+        elapsed = time.perf_counter() - start
+    return _result(
+        _decode(run.stdout[:MAX_OUTPUT_BYTES]), _decode(run.stderr[:MAX_OUTPUT_BYTES]), run.returncode, False, elapsed,
+    )
+
+
+def run_batch_source(code, inputs, timeout=None):
+    """
+    Compiles `code` once and runs it against every stdin in `inputs`.
+    Yields one result per input. Used inside a runner process.
+    """
+    try:
+        code_obj = compile(code, CODE_FILENAME, 'exec')
+    except (SyntaxError, ValueError) as e:
+        error = ''.join(traceback.format_exception_only(type(e), e))
+        for _ in inputs:
+            yield _result(stderr=error, returncode=1)
+        return
+
+    for stdin_text in inputs:
+        if _HAS_FORK:
+            yield _run_forked(code_obj, stdin_text, timeout)
+        else:
+            yield _run_subprocess(code, stdin_text, timeout)
+
+
+def _runner_main(conn):
+    """The loop of a runner process: receive a job, run it, send the results back."""
+    # Nothing may read from or write to the server's real stdio.
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+    for name in PRELOADED_MODULES:
+        __import__(name)
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message is None:
+            break
+        code, inputs, timeout = message
+        # Results are sent one by one, so the parent knows which case was
+        # running if this process dies half-way through a batch.
+        for result in run_batch_source(code, inputs, timeout):
+            result['rss_kb'] = _current_rss_kb()
+            conn.send(result)
+
+
+def verdict(result, expected_output):
+    """Classifies a run result against the expected output of a test case."""
+    if result['timed_out']:
+        return TIMEOUT
+    if result['returncode'] != 0:
+        return CRASH
+    if result['stdout'].strip() != (expected_output or '').strip():
+        return FAIL
+    return PASS
+
+
+class _Runner:
+    """The parent-side handle of one runner process."""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_runner_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs_done = 0
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class RunnerPool:
+    """
+    A fixed-size pool of warm runner processes.
+
+    `run_batch()` borrows an idle runner (waiting if all are busy), sends it
+    the submission with all its inputs and collects one result per input.
+    """
+
+    def __init__(self, size=4, timeout=5, max_jobs_per_runner=200, max_rss_mb=256, start_method='spawn'):
+        self.size = size
+        self.timeout = timeout
+        self.max_jobs_per_runner = max_jobs_per_runner
+        self.max_rss_kb = max_rss_mb * 1024 if max_rss_mb else None
+        self._context = multiprocessing.get_context(start_method)
+        self._idle = queue.Queue()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(_Runner(self._context))
+
+    def _needs_recycling(self, runner, result):
+        if self.max_jobs_per_runner and runner.jobs_done >= self.max_jobs_per_runner:
+            return True
+        return bool(self.max_rss_kb and result.get('rss_kb', 0) > self.max_rss_kb)
+
+    def run(self, code, stdin_text='', timeout=None):
+        """
+        Runs `code` with `stdin_text` as its input and returns a dict with
+        stdout, stderr, returncode, timed_out and elapsed (seconds).
+        """
+        return self.run_batch(code, [stdin_text], timeout)[0]
+
+    def run_batch(self, code, inputs, timeout=None, on_result=None):
+        """
+        Runs `code` once per stdin in `inputs` and returns the list of results.
+        `timeout` applies to each case. `on_result(index, result)` is called as
+        soon as each case finishes.
+        """
+        if self._closed:
+            raise RuntimeError('The runner pool has been shut down.')
+
+        timeout = self.timeout if timeout is None else timeout
+        inputs = list(inputs)
+        results = []
+
+        def record(result):
+            result.pop('rss_kb', None)
+            if on_result is not None:
+                on_result(len(results), result)
+            results.append(result)
+
+        while len(results) < len(inputs):
+            runner = self._idle.get()
+            try:
+                runner.conn.send((code, inputs[len(results):], timeout))
+                last = None
+                while len(results) < len(inputs):
+                    if not runner.conn.poll(timeout + KILL_GRACE):
+                        # The runner did not stop the case in time; kill it and
+                        # carry on with the remaining cases on a fresh runner.
+                        runner.kill()
+                        runner = _Runner(self._context)
+                        record(_timeout_result(timeout))
+                        break
+                    last = runner.conn.recv()
+                    record(dict(last))
+                else:
+                    runner.jobs_done += 1
+                    if self._needs_recycling(runner, last):
+                        runner.stop()
+                        runner = _Runner(self._context)
+            except (EOFError, OSError):
+                # The runner itself died (e.g. killed for using too much memory).
+                runner.kill()
+                runner = _Runner(self._context)
+                record(_crash_result())
+            finally:
+                self._idle.put(runner)
+
+        return results
+
+    def shutdown(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_runner_pool():
+    """Returns the process-wide runner pool, creating it from settings on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from django.conf import settings
+                config = getattr(settings, 'CODE_RUNNER', {})
+                _pool = RunnerPool(
+                    size=config.get('POOL_SIZE', 4),
+                    timeout=config.get('TIMEOUT', 5),
+                    max_jobs_per_runner=config.get('MAX_JOBS_PER_RUNNER', 200),
+                    max_rss_mb=config.get('MAX_RUNNER_RSS_MB', 256),
+                    start_method=config.get('START_METHOD', 'spawn'),
+                )
+                atexit.register(_pool.shutdown)
+    return _pool
@@ -0,0 +1,153 @@
+# api/exports.py
+"""
+Whole-semester exports of exam results, T1/T2/T3 marks and attendance, as
+CSV (optionally gzipped) or XLSX, for ExportView.
+
+Rows are read in batches of CHUNK_SIZE in primary-key order ("id > last id
+seen"), with student and subject names looked up by the database (see
+results_query.py), and written out batch by batch. Only one batch is ever
+in memory, whatever the size of the export. Batching on the key rather than
+with a server-side cursor keeps that true on MySQL too, where the driver
+would otherwise buffer the whole result on the client.
+
+CSV is streamed as it is produced. An XLSX file is a zip archive, so it is
+written to a temporary file first (openpyxl's write-only mode, which does
+not keep rows in memory either) and then streamed from there.
+"""
+import collections
+import csv
+import tempfile
+import zlib
+
+from django.db.models import ExpressionWrapper, F, FloatField
+from django.db.models.functions import NullIf
+
+from .models import Attendance, CurrentSemMarks, ExamResult, StudentData
+from .results_query import student_name, subject_name
+
+CHUNK_SIZE = 2000
+
+Dataset = collections.namedtuple('Dataset', 'build columns')
+
+
+def _students(semester, branch):
+    students = StudentData.objects.filter(semester=semester)
+    if branch:
+        students = students.filter(branch=branch)
+    return students.values('enrollment_no')
+
+
+def _exam_results(semester, branch=None, subject_id=None, test_name=None):
+    queryset = ExamResult.objects.filter(enrollment_no__in=_students(semester, branch))
+    if subject_id is not None:
+        queryset = queryset.filter(subject_id=subject_id)
+    if test_name:
+        queryset = queryset.filter(test_name=test_name)
+    return queryset.annotate(
+        student_name=student_name('enrollment_no'),
+        subject_name=subject_name(),
+        total_marks=F('code_marks') + F('mcq_marks'),
+    )
+
+
+def _current_marks(semester, branch=None, subject_id=None, test_name=None):
+    queryset = CurrentSemMarks.objects.filter(enrollment_number__in=_students(semester, branch))
+    if subject_id is not None:
+        queryset = queryset.filter(subject_id=subject_id)
+    return queryset.annotate(
+        student_name=student_name('enrollment_number'),
+        subject_name=subject_name(),
+        total_marks=F('t1_marks') + F('t2_marks') + F('t3_marks'),
+    )
+
+
+def _attendance(semester, branch=None, subject_id=None, test_name=None):
+    queryset = Attendance.objects.filter(enrollment_no__in=_students(semester, branch))
+    if subject_id is not None:
+        queryset = queryset.filter(subject_id=subject_id)
+    return queryset.annotate(
+        student_name=student_name('enrollment_no'),
+        percentage=ExpressionWrapper(
+            F('total_attended') * 100.0 / NullIf(F('total_lectures'), 0), output_field=FloatField()
+        ),
+    )
+
+
+# Each dataset: a queryset builder and its (field, column title) pairs.
+DATASETS = {
+    'exam-results': Dataset(_exam_results, [
+        ('enrollment_no', 'Enrollment No'), ('student_name', 'Student'), ('subject_id', 'Subject ID'),
+        ('subject_name', 'Subject'), ('test_name', 'Test'), ('code_marks', 'Code Marks'),
+        ('mcq_marks', 'MCQ Marks'), ('total_marks', 'Total'),
+    ]),
+    'current-marks': Dataset(_current_marks, [
+        ('enrollment_number', 'Enrollment No'), ('student_name', 'Student'), ('subject_id', 'Subject ID'),
+        ('subject_name', 'Subject'), ('t1_marks', 'T1'), ('t2_marks', 'T2'), ('t3_marks', 'T3'),
+        ('total_marks', 'Total'),
+    ]),
+    'attendance': Dataset(_attendance, [
+        ('enrollment_no', 'Enrollment No'), ('student_name', 'Student'), ('subject_id', 'Subject ID'),
+        ('subject_name', 'Subject'), ('total_lectures', 'Lectures'), ('total_attended', 'Attended'),
+        ('percentage', 'Percentage'), ('attd_date', 'Last Marked'),
+    ]),
+}
+
+
+def iter_chunks(queryset, fields, chunk_size=CHUNK_SIZE):
+    """Yields lists of value tuples, `chunk_size` rows at a time, in primary-key order."""
+    last = None
+    while True:
+        page = queryset.order_by('pk')
+        if last is not None:
+            page = page.filter(pk__gt=last)
+        rows = list(page.values_list('pk', *fields)[:chunk_size])
+        if not rows:
+            return
+        last = rows[-1][0]
+        yield [row[1:] for row in rows]
+
+
+class _Echo:
+    """A file-like object whose write() returns what it was given, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    if isinstance(value, float):
+        return round(value, 2)
+    return value
+
+
+def csv_stream(columns, chunks):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([title for _, title in columns])
+    for chunk in chunks:
+        yield ''.join(writer.writerow([_cell(value) for value in row]) for row in chunk)
+
+
+def gzip_stream(stream):
+    """Gzips a stream of text chunks on the fly."""
+    compressor = zlib.compressobj(wbits=31)  # 31: with a gzip header.
+    for text in stream:
+        data = compressor.compress(text.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def xlsx_file(columns, chunks, title):
+    """Writes an XLSX workbook to a temporary file and returns it, rewound. Needs openpyxl."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title[:31])  # Sheet titles are capped at 31 characters.
+    sheet.append([title for _, title in columns])
+    for chunk in chunks:
+        for row in chunk:
+            sheet.append([_cell(value) for value in row])
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
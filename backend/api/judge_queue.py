@@ -0,0 +1,285 @@
+# api/judge_queue.py
+"""
+An in-process queue that judges student code in the background.
+
+RunCodeView used to run the code inside the request thread, so a few slow
+submissions could tie up every server worker. Now the view only enqueues a
+job and returns its id. A small pool of worker threads takes jobs off the
+queue and runs them on the runner pool (see code_runner.py), and clients poll
+the job or follow it as a server-sent-events stream.
+
+Final submissions are taken before practice runs, and every student can only
+have a limited number of jobs queued and running at the same time. Whether a
+run is final is decided here, not by the client: a student gets one final run
+per paper, before the exam is submitted (see claim_final_run).
+
+Jobs live in the memory of the server process that accepted them, so polling
+requests must reach that same process (a single threaded process, or sticky
+routing when there are several).
+"""
+import collections
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+
+from .code_runner import PASS, get_runner_pool, verdict
+
+logger = logging.getLogger(__name__)
+
+# Job priorities. Lower numbers are taken off the queue first.
+PRIORITY_FINAL = 0
+PRIORITY_PRACTICE = 1
+
+# Job states.
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class TooManyJobs(Exception):
+    """Raised when a student already has the maximum number of unfinished jobs."""
+
+
+def build_case(index, case, run):
+    """Turns the raw result of one test case into what we send to the client."""
+    return {
+        'case': index,
+        'verdict': verdict(run, case.get("Output", "")),
+        'output': run['stdout'].strip(),
+        'error': run['stderr'].strip(),
+        'elapsed': round(run['elapsed'], 4),
+    }
+
+
+def summarize(cases):
+    """
+    Builds the overall result of a run from its case verdicts. The output and
+    error shown to the user are those of the first case, or the error of the
+    first failing case if the first one had none.
+    """
+    failed_cases = [c for c in cases if c['verdict'] != PASS]
+    first_output = cases[0]['output'] if cases else ""
+    first_error = cases[0]['error'] if cases else ""
+    if not first_error and failed_cases:
+        first_error = failed_cases[0]['error']
+    return {
+        'output': first_output,
+        'error': first_error,
+        'passed': not failed_cases,
+        'cases': cases,
+    }
+
+
+class JudgeJob:
+    """One submission waiting for, or going through, the judge."""
+
+    def __init__(self, owner, code, test_cases, priority, on_finish=None):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.code = code
+        self.test_cases = test_cases
+        self.priority = priority
+        self.on_finish = on_finish
+        self.status = QUEUED
+        self.cases = []
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._changed = threading.Condition()
+
+    def start(self):
+        with self._changed:
+            self.status = RUNNING
+            self._changed.notify_all()
+
+    def add_case(self, index, run):
+        with self._changed:
+            self.cases.append(build_case(index, self.test_cases[index], run))
+            self._changed.notify_all()
+
+    def finish(self, error=None):
+        with self._changed:
+            self.status = FAILED if error else DONE
+            self.error = error
+            self.finished = time.time()
+            self._changed.notify_all()
+
+    def is_finished(self):
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self):
+        with self._changed:
+            data = {'job_id': self.id, 'status': self.status, 'cases': list(self.cases)}
+            if self.status == DONE:
+                data.update(summarize(data['cases']))
+            elif self.status == FAILED:
+                data['error'] = self.error
+            return data
+
+    def wait_for_cases(self, seen, timeout):
+        """
+        Waits until the job has more than `seen` case results or is finished.
+        Returns (new cases, finished).
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: len(self.cases) > seen or self.is_finished(), timeout)
+            return self.cases[seen:], self.is_finished()
+
+
+def iter_events(job, keep_alive=15):
+    """Yields the progress of a job as server-sent events."""
+    seen = 0
+    while True:
+        new_cases, finished = job.wait_for_cases(seen, keep_alive)
+        for case in new_cases:
+            yield f"event: case\ndata: {json.dumps(case)}\n\n"
+        seen += len(new_cases)
+        if finished:
+            yield f"event: done\ndata: {json.dumps(job.to_dict())}\n\n"
+            return
+        if not new_cases:
+            # A comment line keeps proxies from closing an idle connection.
+            yield ": keep-alive\n\n"
+
+
+class JudgeQueue:
+    """
+    A priority queue of judge jobs served by a fixed number of worker threads.
+    The heavy lifting happens in the runner processes, so threads are enough.
+    """
+
+    def __init__(self, workers=4, max_running_per_owner=1, max_pending_per_owner=3, result_ttl=600):
+        self.max_running_per_owner = max_running_per_owner
+        self.max_pending_per_owner = max_pending_per_owner
+        self.result_ttl = result_ttl
+        self._lock = threading.Condition()
+        self._heap = []
+        self._sequence = itertools.count()
+        self._jobs = {}
+        self._running = collections.Counter()
+        self._pending = collections.Counter()  # Queued plus running, per owner.
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f'judge-worker-{i}', daemon=True).start()
+
+    def submit(self, owner, code, test_cases, final=False, on_finish=None):
+        """
+        Queues a submission and returns its job. Raises TooManyJobs if the owner
+        is over the cap. `on_finish(job)` is called once the job has run.
+        """
+        with self._lock:
+            self._purge_finished()
+            if self._pending[owner] >= self.max_pending_per_owner:
+                raise TooManyJobs()
+
+            priority = PRIORITY_FINAL if final else PRIORITY_PRACTICE
+            job = JudgeJob(owner, code, test_cases, priority, on_finish)
+            self._jobs[job.id] = job
+            self._pending[owner] += 1
+            heapq.heappush(self._heap, (priority, next(self._sequence), job))
+            self._lock.notify_all()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _purge_finished(self):
+        """Forgets finished jobs whose results have been kept long enough. Called with the lock held."""
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.finished < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _next_job(self):
+        """
+        Pops the most urgent job whose owner is under the running cap.
+        Called with the lock held; returns None if there is no such job.
+        """
+        held_back = []
+        job = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if self._running[entry[2].owner] < self.max_running_per_owner:
+                job = entry[2]
+                break
+            held_back.append(entry)
+        for entry in held_back:
+            heapq.heappush(self._heap, entry)
+        return job
+
+    def _release(self, owner):
+        """Updates the per-owner counters after a job ends. Called with the lock held."""
+        for counter in (self._running, self._pending):
+            counter[owner] -= 1
+            if counter[owner] <= 0:
+                del counter[owner]
+
+    def _work(self):
+        while True:
+            with self._lock:
+                job = self._next_job()
+                while job is None:
+                    self._lock.wait()
+                    job = self._next_job()
+                self._running[job.owner] += 1
+
+            job.start()
+            try:
+                get_runner_pool().run_batch(
+                    job.code,
+                    [case.get("Input") for case in job.test_cases],
+                    on_result=job.add_case,
+                )
+            except Exception as e:
+                job.finish(error=f'An unexpected error occurred: {str(e)}')
+            else:
+                job.finish()
+                if job.on_finish is not None:
+                    try:
+                        job.on_finish(job)
+                    except Exception:
+                        logger.exception('on_finish callback failed for judge job %s', job.id)
+            finally:
+                with self._lock:
+                    self._release(job.owner)
+                    # A job held back by the per-student cap may be able to run now.
+                    self._lock.notify_all()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def claim_final_run(owner, exam_paper_id):
+    """
+    True the first time `owner` claims the final run of a paper; every later
+    claim is False and the run is judged as a practice run. Claims are kept in
+    JUDGE_QUEUE['FINAL_RUNS_BACKEND'] (an entry of settings.CACHES).
+    """
+    from django.conf import settings
+    from django.core.cache import caches
+    config = getattr(settings, 'JUDGE_QUEUE', {})
+    cache = caches[config.get('FINAL_RUNS_BACKEND', 'default')]
+    return cache.add(f'judge-final:{owner}:{exam_paper_id}', True, config.get('FINAL_RUN_TTL', 86400))
+
+
+def get_judge_queue():
+    """Returns the process-wide judge queue, creating it from settings on first use."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                from django.conf import settings
+                config = getattr(settings, 'JUDGE_QUEUE', {})
+                _queue = JudgeQueue(
+                    workers=config.get('WORKERS', 4),
+                    max_running_per_owner=config.get('MAX_RUNNING_PER_STUDENT', 1),
+                    max_pending_per_owner=config.get('MAX_PENDING_PER_STUDENT', 3),
+                    result_ttl=config.get('RESULT_TTL', 600),
+                )
+    return _queue
@@ -0,0 +1,147 @@
+# api/leaderboard.py
+"""
+Precomputed semester rankings for the student dashboard.
+
+The dashboard used to load every student of the semester and all of their
+CurrentSemMarks rows, sum t1+t2+t3 in Python and sort everything, just to
+find the rank of one student.
+
+Now each semester gets a SemesterLeaderboard the first time it is asked for:
+one grouped query gives every student's total, and the totals are kept in a
+sorted list. A rank is then a binary search. When a CurrentSemMarks row (or
+a student) is saved or deleted, only that student's total is recomputed and
+moved in the list (see signals.py).
+
+Ties are ranked the same way as before: equal totals share a rank and the
+next total skips ahead ("1, 1, 3"). Students without marks count as 0.
+
+Boards live in the memory of each server process. Changes made in another
+process, or through queryset.update(), are picked up when a board is older
+than LEADERBOARD['MAX_AGE'] seconds and gets rebuilt.
+"""
+import bisect
+import threading
+import time
+
+from django.db.models import F, Sum
+
+from .models import CurrentSemMarks, StudentData
+
+
+def semester_students(semester):
+    return StudentData.objects.filter(semester=semester).values_list('enrollment_no', flat=True)
+
+
+def totals_query(enrollment_numbers):
+    return (
+        CurrentSemMarks.objects
+        .filter(enrollment_number__in=enrollment_numbers)
+        .values('enrollment_number')
+        .annotate(total=Sum(F('t1_marks') + F('t2_marks') + F('t3_marks')))
+    )
+
+
+def student_totals(enrollment_numbers):
+    """Returns {enrollment_no: t1+t2+t3 summed over all subjects} for the given students."""
+    return {row['enrollment_number']: row['total'] or 0 for row in totals_query(enrollment_numbers)}
+
+
+class SemesterLeaderboard:
+    """The totals of every student in one semester, kept in a sorted list."""
+
+    def __init__(self, semester, totals):
+        self.semester = semester
+        self.totals = dict(totals)
+        self._sorted = sorted(self.totals.values())
+        self.built = time.monotonic()
+
+    @classmethod
+    def build(cls, semester):
+        students = list(semester_students(semester))
+        totals = dict.fromkeys(students, 0)
+        totals.update(student_totals(students))
+        return cls(semester, totals)
+
+    def __contains__(self, enrollment_no):
+        return enrollment_no in self.totals
+
+    def __len__(self):
+        return len(self.totals)
+
+    def rank(self, enrollment_no):
+        """1 + the number of students with a strictly higher total, or None if the student is not on the board."""
+        total = self.totals.get(enrollment_no)
+        if total is None:
+            return None
+        return len(self._sorted) - bisect.bisect_right(self._sorted, total) + 1
+
+    def set_total(self, enrollment_no, total):
+        self.remove(enrollment_no)
+        self.totals[enrollment_no] = total
+        bisect.insort(self._sorted, total)
+
+    def remove(self, enrollment_no):
+        total = self.totals.pop(enrollment_no, None)
+        if total is not None:
+            del self._sorted[bisect.bisect_left(self._sorted, total)]
+
+
+class Leaderboards:
+    """The boards of all semesters, built lazily and refreshed one student at a time."""
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._boards = {}
+        self._lock = threading.Lock()
+
+    def _board(self, semester):
+        """Returns the board of a semester, (re)building it if missing or too old. Called with the lock held."""
+        board = self._boards.get(semester)
+        if board is None or (self.max_age and time.monotonic() - board.built > self.max_age):
+            board = self._boards[semester] = SemesterLeaderboard.build(semester)
+        return board
+
+    def rank(self, semester, enrollment_no):
+        with self._lock:
+            return self._board(semester).rank(enrollment_no)
+
+    def refresh_student(self, enrollment_no):
+        """
+        Recomputes the total of one student and moves them on the boards that are
+        already built, including moving them between boards if their semester changed.
+        """
+        semester = (
+            StudentData.objects.filter(enrollment_no=enrollment_no)
+            .values_list('semester', flat=True).first()
+        )
+        total = student_totals([enrollment_no]).get(enrollment_no, 0) if semester is not None else None
+        with self._lock:
+            for board in self._boards.values():
+                if board.semester != semester:
+                    board.remove(enrollment_no)
+                elif total is not None:
+                    board.set_total(enrollment_no, total)
+
+    def invalidate(self, semester=None):
+        """Drops the board of one semester, or all of them, so the next lookup rebuilds it."""
+        with self._lock:
+            if semester is None:
+                self._boards.clear()
+            else:
+                self._boards.pop(semester, None)
+
+
+_leaderboards = None
+_leaderboards_lock = threading.Lock()
+
+
+def get_leaderboards():
+    """Returns the process-wide leaderboards, creating them from settings on first use."""
+    global _leaderboards
+    if _leaderboards is None:
+        with _leaderboards_lock:
+            if _leaderboards is None:
+                from django.conf import settings
+                config = getattr(settings, 'LEADERBOARD', {})
+                _leaderboards = Leaderboards(max_age=config.get('MAX_AGE', 300))
+    return _leaderboards
@@ -0,0 +1,77 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+
+from api.models import NoteBlob, Notes
+from api.note_storage import get_note_storage, storage_savings
+
+
+class Command(BaseCommand):
+    help = (
+        "Deduplicates the note storage: moves legacy Notes.doc blobs into it, "
+        "rebuilds the reference count of every stored document, removes documents "
+        "no note uses any more and reports the space saved."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--compress', action='store_true',
+                            help='Also compress stored documents that were kept uncompressed.')
+
+    def handle(self, *args, **options):
+        storage = get_note_storage()
+
+        # 1. Legacy blobs still in the database go through the content-addressed store.
+        if Notes.objects.filter(doc_hash='').exclude(doc__isnull=True).exists():
+            call_command('migrate_note_blobs', stdout=self.stdout)
+
+        # 2. Recount references from the notes themselves.
+        usage = Notes.objects.exclude(doc_hash='').values('doc_hash').annotate(
+            refs=Count('id'), size=Max('doc_size')
+        )
+        used = set()
+        fixed = 0
+        missing = 0
+        for row in usage:
+            digest = row['doc_hash']
+            used.add(digest)
+            if not storage.exists(digest):
+                missing += 1
+                self.stderr.write(f"Document {digest} is referenced by {row['refs']} note(s) but missing from storage.")
+                continue
+            stored_size, compressed = storage.stat(digest)
+            if options['compress'] and not compressed:
+                stored_size, compressed = storage.compress_existing(digest)
+            with transaction.atomic():
+                blob, created = NoteBlob.objects.select_for_update().get_or_create(
+                    digest=digest,
+                    defaults={'size': row['size'], 'stored_size': stored_size,
+                              'compressed': compressed, 'ref_count': row['refs']},
+                )
+                if not created and (blob.ref_count, blob.stored_size, blob.compressed) != (row['refs'], stored_size, compressed):
+                    blob.ref_count = row['refs']
+                    blob.stored_size = stored_size
+                    blob.compressed = compressed
+                    blob.save(update_fields=['ref_count', 'stored_size', 'compressed'])
+                    fixed += 1
+                elif created:
+                    fixed += 1
+
+        # 3. Documents nobody references any more.
+        orphans = NoteBlob.objects.exclude(digest__in=used)
+        removed = 0
+        for digest in list(orphans.values_list('digest', flat=True)):
+            with transaction.atomic():
+                if not Notes.objects.filter(doc_hash=digest).exists():
+                    NoteBlob.objects.filter(digest=digest).delete()
+                    transaction.on_commit(lambda digest=digest: storage.delete(digest))
+                    removed += 1
+
+        self.stdout.write(f"{fixed} reference count(s) fixed, {removed} orphaned document(s) removed, {missing} missing.")
+
+        savings = storage_savings()
+        self.stdout.write(self.style.SUCCESS(
+            f"{savings['notes']} note(s) use {savings['blobs']} stored document(s): "
+            f"{savings['logical_bytes']} bytes referenced, {savings['stored_bytes']} bytes stored, "
+            f"{savings['saved_bytes']} bytes ({savings['saved_ratio']:.1%}) saved."
+        ))
@@ -0,0 +1,133 @@
+import json
+import re
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api import leaderboard, results_query
+from api.models import (
+    Attendance, AttendanceEvent, CurrentSemMarks, ExamPaper, ExamResult, Faculty, Notes, PastMarks,
+    PracticalMarks, StudentData, SubjectDetails,
+)
+from api.views import AttendanceReportView, StudentDashboardSummaryView
+
+
+def sample_values():
+    """Parameters for the replayed queries, taken from the data when there is some."""
+    student = StudentData.objects.first()
+    faculty = Faculty.objects.first()
+    subject = SubjectDetails.objects.first()
+    result = ExamResult.objects.first()
+    return {
+        'enrollment_no': student.enrollment_no if student else 1,
+        'email_id': student.email_id if student else '',
+        'semester': student.semester if student else 1,
+        'branch': student.branch if student else '',
+        'fac_id': faculty.fac_id if faculty else 1,
+        'fac_mail': faculty.fac_mail if faculty else '',
+        'subject_id': subject.subject_id if subject else 1,
+        'test_name': result.test_name if result else 'T1',
+    }
+
+
+def view_querysets(v):
+    """
+    The querysets the API views and helpers run, by name, with sample values.
+    The dashboard, leaderboard, attendance report and faculty results come
+    from the functions those views call; the one-line lookups of the other
+    views are repeated here and need keeping in step with views.py.
+    """
+    dashboard = StudentDashboardSummaryView
+    today = date.today()
+    return [
+        ('login.student', StudentData.objects.filter(email_id=v['email_id'])),
+        ('login.faculty', Faculty.objects.filter(fac_mail=v['fac_mail'])),
+        ('dashboard.attendance', dashboard.attendance_rows(v['enrollment_no'])),
+        ('dashboard.subjects', dashboard.current_subjects(v['semester'])),
+        # The view aggregates; grouped by the filtered column, it runs the same scan and can be explained.
+        ('dashboard.exam_counts', dashboard.unsubmitted_papers(v['semester'], v['enrollment_no'])
+            .values('sem').annotate(**dashboard.EXAM_COUNTS)),
+        ('leaderboard.students', leaderboard.semester_students(v['semester'])),
+        ('leaderboard.totals', leaderboard.totals_query(leaderboard.semester_students(v['semester']))),
+        ('results.current', CurrentSemMarks.objects.filter(enrollment_number=v['enrollment_no'])),
+        ('results.past', PastMarks.objects.filter(enrollment_no=v['enrollment_no'])),
+        ('results.practical', PracticalMarks.objects.filter(enrollment_no=v['enrollment_no'])),
+        ('notes.student', Notes.objects.filter(sem=v['semester']).defer('doc')),
+        ('notes.faculty', Notes.objects.filter(uploader_id=v['fac_id']).defer('doc')),
+        ('exam_papers.page', ExamPaper.objects.filter(sem=v['semester'], subject_id=v['subject_id']).order_by('id')[:50]),
+        ('exam_results.student', ExamResult.objects.filter(enrollment_no=v['enrollment_no']).order_by('id')[:50]),
+        ('exam_results.test', ExamResult.objects.filter(subject_id=v['subject_id'], test_name=v['test_name']).order_by('id')[:50]),
+        ('mark_attendance.today', AttendanceEvent.objects.filter(
+            subject_id=v['subject_id'], date=today, enrollment_no__in=[v['enrollment_no']])),
+        ('mark_attendance.existing', Attendance.objects.filter(
+            subject_id=v['subject_id'], enrollment_no__in=[v['enrollment_no']])),
+        ('attendance_report', AttendanceReportView.totals(v['subject_id'], today - timedelta(days=6), today)),
+        ('faculty.branches', StudentData.objects.filter(semester=v['semester']).order_by('branch')
+            .values_list('branch', flat=True).distinct()),
+        ('faculty.students_by_branch', StudentData.objects.filter(branch=v['branch'], semester=v['semester'])),
+        ('faculty_results.exam_names', results_query.exam_names(v['semester'])),
+        ('faculty_results.test', results_query.exam_results(v['semester'], v['test_name'])
+            .order_by('-total_marks', 'id').values(*results_query.EXAM_RESULT_FIELDS)[:50]),
+        ('faculty_results.current_marks', results_query.current_marks(v['semester'])
+            .order_by('id').values(*results_query.CURRENT_MARKS_FIELDS)),
+        ('faculty_results.past_marks', results_query.past_marks(v['enrollment_no'])),
+    ]
+
+
+def full_scans(queryset):
+    """Returns (tables read with a full scan, plan text) for a queryset on the current database."""
+    vendor = connection.vendor
+    if vendor == 'mysql':
+        plan = queryset.explain(format='JSON')
+        tables = []
+
+        def walk(node):
+            if isinstance(node, dict):
+                if node.get('access_type') == 'ALL':
+                    tables.append(node.get('table_name', '?'))
+                for value in node.values():
+                    walk(value)
+            elif isinstance(node, list):
+                for value in node:
+                    walk(value)
+
+        walk(json.loads(plan))
+        return tables, plan
+
+    plan = queryset.explain()
+    if vendor == 'postgresql':
+        return re.findall(r'Seq Scan on (\w+)', plan), plan
+    if vendor == 'sqlite':
+        # "SCAN table" reads every row; "SCAN table USING INDEX" walks an index instead.
+        return re.findall(r'\bSCAN (\w+)(?! USING)\s*$', plan, re.MULTILINE), plan
+    return [], plan
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays the querysets of the API views with EXPLAIN and flags the ones that "
+        "scan whole tables. Run it against a database with realistic data: on tiny "
+        "tables a full scan can be the cheapest plan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every query plan.')
+        parser.add_argument('--fail', action='store_true', help='Exit with an error if any full scan is found.')
+
+    def handle(self, *args, **options):
+        flagged = 0
+        for name, queryset in view_querysets(sample_values()):
+            tables, plan = full_scans(queryset)
+            if tables:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(f"FULL SCAN  {name}: {', '.join(sorted(set(tables)))}"))
+            else:
+                self.stdout.write(f"ok         {name}")
+            if options['verbose_plans'] or tables:
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+        if flagged and options['fail']:
+            raise CommandError(f"{flagged} query(s) scan whole tables.")
+        self.stdout.write(self.style.SUCCESS(f"{flagged} query(s) with full scans."))
@@ -0,0 +1,37 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.marks_import import CHUNK_SIZE, SPECS, ImportFormatError, import_marks, parse_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-imports marks from a CSV (with a header line) or JSON file. "
+        "Existing marks for the same student and subject (and semester) are updated."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(SPECS), help='Which marks the file holds.')
+        parser.add_argument('path', help='The CSV or JSON file.')
+        parser.add_argument('--format', choices=['csv', 'json'], help='Default: from the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the rows.')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        fmt = options['format'] or ('json' if path.suffix.lower() == '.json' else 'csv')
+        try:
+            rows = parse_rows(path.read_bytes(), fmt)
+        except (OSError, ImportFormatError) as e:
+            raise CommandError(str(e))
+
+        report = import_marks(options['kind'], rows, dry_run=options['dry_run'], chunk_size=options['chunk_size'])
+
+        for error in report['errors']:
+            self.stderr.write(f"row {error['row']}: {' '.join(error['errors'])}")
+        if report['errors_truncated']:
+            self.stderr.write(f"... only the first {len(report['errors'])} bad rows are listed.")
+        summary = {k: v for k, v in report.items() if k not in ('errors',)}
+        self.stdout.write(self.style.SUCCESS(json.dumps(summary)))
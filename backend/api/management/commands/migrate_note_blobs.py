@@ -0,0 +1,42 @@
+import io
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Notes
+from api.note_storage import acquire_blob, get_note_storage
+
+
+class Command(BaseCommand):
+    help = "Moves note documents still stored in Notes.doc into the note storage."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Number of notes loaded from the database at a time.')
+        parser.add_argument('--keep-blobs', action='store_true',
+                            help='Leave the old copy in Notes.doc instead of clearing it.')
+
+    def handle(self, *args, **options):
+        storage = get_note_storage()
+        pending = Notes.objects.filter(doc_hash='').exclude(doc__isnull=True)
+        ids = list(pending.values_list('id', flat=True))
+        self.stdout.write(f"{len(ids)} note(s) to migrate.")
+
+        migrated = 0
+        batch_size = options['batch_size']
+        for i in range(0, len(ids), batch_size):
+            # Only load the blobs of one batch at a time.
+            for note in Notes.objects.filter(id__in=ids[i:i + batch_size]).only('id', 'doc'):
+                # Identical documents end up as one stored file shared by all their notes.
+                doc = io.BytesIO(bytes(note.doc))
+                stored = storage.save(doc)
+                fields = {'doc_hash': stored.digest, 'doc_size': stored.size}
+                if not options['keep_blobs']:
+                    fields['doc'] = None
+                with transaction.atomic():
+                    acquire_blob(stored, doc)
+                    Notes.objects.filter(id=note.id).update(**fields)
+                migrated += 1
+            self.stdout.write(f"Migrated {migrated}/{len(ids)}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. {migrated} note(s) moved to the note storage."))
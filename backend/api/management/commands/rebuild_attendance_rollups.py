@@ -0,0 +1,82 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from api.models import Attendance, AttendanceEvent, SubjectDetails
+from api.summary_cache import invalidate_on_commit
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the running totals in Attendance from the AttendanceEvent log "
+        "(plus the counts carried over from before the log existed)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subject-id', type=int, help='Only rebuild the rollups of this subject.')
+        parser.add_argument('--enrollment-no', type=int, help='Only rebuild the rollups of this student.')
+
+    def handle(self, *args, **options):
+        filters = {}
+        if options['subject_id'] is not None:
+            filters['subject_id'] = options['subject_id']
+        if options['enrollment_no'] is not None:
+            filters['enrollment_no'] = options['enrollment_no']
+
+        totals = {
+            (row['enrollment_no'], row['subject_id']): row
+            for row in AttendanceEvent.objects.filter(**filters).values('enrollment_no', 'subject_id').annotate(
+                lectures=Count('id'),
+                attended=Count('id', filter=Q(present=True)),
+                last_date=Max('date'),
+                semester=Max('semester'),
+            )
+        }
+
+        with transaction.atomic():
+            changed = []
+            for record in Attendance.objects.select_for_update().filter(**filters):
+                row = totals.pop((record.enrollment_no, record.subject_id), None)
+                lectures = record.base_lectures + (row['lectures'] if row else 0)
+                attended = record.base_attended + (row['attended'] if row else 0)
+                last_date = row['last_date'] if row else record.attd_date
+                if (record.total_lectures, record.total_attended, record.attd_date) != (lectures, attended, last_date):
+                    record.total_lectures = lectures
+                    record.total_attended = attended
+                    record.attd_date = last_date
+                    changed.append(record)
+            Attendance.objects.bulk_update(changed, ['total_lectures', 'total_attended', 'attd_date'], batch_size=1000)
+
+            # Events without a rollup row at all.
+            subject_names = dict(SubjectDetails.objects.values_list('subject_id', 'subject_name'))
+            created = Attendance.objects.bulk_create([
+                Attendance(
+                    enrollment_no=enrollment_no,
+                    subject_id=subject_id,
+                    semester=row['semester'],
+                    subject_name=subject_names.get(subject_id, ''),
+                    total_lectures=row['lectures'],
+                    total_attended=row['attended'],
+                )
+                for (enrollment_no, subject_id), row in totals.items()
+            ], batch_size=1000)
+            # attd_date is auto_now, so bulk_create() stamps today on every new
+            # row; set the real last dates with update(), which leaves it alone.
+            by_date = defaultdict(list)
+            for (enrollment_no, subject_id), row in totals.items():
+                by_date[(subject_id, row['last_date'])].append(enrollment_no)
+            for (subject_id, last_date), enrollment_numbers in by_date.items():
+                Attendance.objects.filter(
+                    subject_id=subject_id, enrollment_no__in=enrollment_numbers
+                ).update(attd_date=last_date)
+
+            # The cached dashboards and attendance lists of these students are now out of date.
+            invalidate_on_commit(students={record.enrollment_no for record in changed} | {
+                enrollment_no for enrollment_no, _ in totals
+            })
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(changed)} rollup(s) corrected, {len(created)} rollup(s) created."
+        ))
@@ -0,0 +1,185 @@
+# api/marks_import.py
+"""
+Bulk import of CurrentSemMarks, PastMarks and PracticalMarks from CSV or
+JSON, used by MarksImportView and the import_marks command.
+
+- The enrollment numbers of all students and the ids of all subjects are
+  loaded once, so checking a row is two set lookups instead of two queries.
+- Rows are checked one batch at a time and every bad row is reported with
+  its line number and what is wrong with it; the good rows are still loaded.
+  Marks must be finite numbers between 0 and the most the column allows.
+- Good rows are upserted with bulk_create(update_conflicts=True) on the
+  (student, subject[, semester]) unique constraint, one short transaction
+  per batch, so a full-term load never holds locks for long.
+
+bulk_create() sends no signals, so the rankings and the caches built from
+marks are invalidated once at the end of an import.
+"""
+import csv
+import io
+import json
+import math
+import time
+
+from django.db import connection, transaction
+
+from .class_analytics import get_class_analytics
+from .leaderboard import get_leaderboards
+from .models import CurrentSemMarks, PastMarks, PracticalMarks, StudentData, SubjectDetails
+from .summary_cache import invalidate_on_commit
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 500
+
+
+class ImportSpec:
+    """How the rows of one kind of marks are read and stored."""
+
+    def __init__(self, model, student_field, key_fields, number_fields, int_fields):
+        self.model = model
+        self.student_field = student_field
+        self.key_fields = key_fields        # The unique constraint upserts go through.
+        self.number_fields = number_fields  # Marks: {field: most marks allowed}.
+        self.int_fields = int_fields        # Other required whole numbers.
+
+    @property
+    def update_fields(self):
+        return [f for f in list(self.number_fields) + self.int_fields if f not in self.key_fields]
+
+
+SPECS = {
+    'current': ImportSpec(
+        CurrentSemMarks, 'enrollment_number', ['enrollment_number', 'subject_id'],
+        {'t1_marks': 25, 't2_marks': 25, 't3_marks': 25}, ['current_sem'],
+    ),
+    # Out of 100 (a grade point is marks / 10).
+    'past': ImportSpec(PastMarks, 'enrollment_no', ['enrollment_no', 'semester', 'subject_id'], {'marks': 100}, ['semester']),
+    'practical': ImportSpec(
+        PracticalMarks, 'enrollment_no', ['enrollment_no', 'semester', 'subject_id'], {'marks': 100}, ['semester'],
+    ),
+}
+
+
+class ImportFormatError(ValueError):
+    """Raised when the uploaded data can't be read as CSV or JSON rows at all."""
+
+
+def parse_rows(data, fmt):
+    """
+    Returns a list of row dicts from CSV text (with a header line) or JSON
+    (a list of objects, or {"rows": [...]}).
+    """
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    if fmt == 'json':
+        try:
+            rows = json.loads(data) if isinstance(data, str) else data
+        except ValueError as e:
+            raise ImportFormatError(f'Invalid JSON: {e}')
+        if isinstance(rows, dict):
+            rows = rows.get('rows')
+        if not isinstance(rows, list):
+            raise ImportFormatError('JSON must be a list of rows or {"rows": [...]}.')
+        return rows
+    if fmt == 'csv':
+        return list(csv.DictReader(io.StringIO(data)))
+    raise ImportFormatError('Format must be csv or json.')
+
+
+def _clean(row, spec, students, subjects):
+    """Returns (model field values, list of errors) for one raw row."""
+    if not isinstance(row, dict):
+        return None, ['Row is not an object.']
+    # Either spelling of the enrollment number column is accepted.
+    row = dict(row)
+    for alias in ('enrollment_no', 'enrollment_number'):
+        if alias in row and spec.student_field not in row:
+            row[spec.student_field] = row[alias]
+
+    values, errors = {}, []
+    for field in [spec.student_field, 'subject_id'] + spec.int_fields:
+        raw = row.get(field)
+        try:
+            values[field] = int(str(raw).strip())
+        except (TypeError, ValueError):
+            errors.append(f'{field} must be a whole number (got {raw!r}).')
+    for field, maximum in spec.number_fields.items():
+        raw = row.get(field)
+        try:
+            values[field] = float(str(raw).strip())
+        except (TypeError, ValueError):
+            errors.append(f'{field} must be a number (got {raw!r}).')
+            continue
+        # float() also reads "nan", "inf" and "1e999".
+        if not math.isfinite(values[field]) or not 0 <= values[field] <= maximum:
+            errors.append(f'{field} must be between 0 and {maximum} (got {raw!r}).')
+
+    if spec.student_field in values and values[spec.student_field] not in students:
+        errors.append(f'Unknown student {values[spec.student_field]}.')
+    if 'subject_id' in values and values['subject_id'] not in subjects:
+        errors.append(f"Unknown subject {values['subject_id']}.")
+    return values, errors
+
+
+def _chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield start, rows[start:start + size]
+
+
+def import_marks(kind, rows, dry_run=False, chunk_size=CHUNK_SIZE):
+    """
+    Validates and upserts `rows` (dicts) as marks of `kind` ('current', 'past'
+    or 'practical'). Returns a report with per-row errors; row numbers count
+    from 1 for the first data row.
+    """
+    started = time.perf_counter()
+    spec = SPECS[kind]
+    students = set(StudentData.objects.values_list('enrollment_no', flat=True))
+    subjects = set(SubjectDetails.objects.values_list('subject_id', flat=True))
+
+    errors, imported, failed, duplicates = [], 0, 0, 0
+    upsert_options = {'update_conflicts': True, 'update_fields': spec.update_fields}
+    if connection.features.supports_update_conflicts_with_target:
+        # MySQL picks the conflicting unique key by itself and refuses a target.
+        upsert_options['unique_fields'] = spec.key_fields
+
+    for start, chunk in _chunks(rows, chunk_size):
+        # Within a batch the last row for a key wins; one INSERT can't touch a row twice.
+        objects = {}
+        for offset, row in enumerate(chunk):
+            values, row_errors = _clean(row, spec, students, subjects)
+            if row_errors:
+                failed += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'row': start + offset + 1, 'errors': row_errors})
+                continue
+            key = tuple(values[f] for f in spec.key_fields)
+            if key in objects:
+                duplicates += 1
+            objects[key] = spec.model(**values)
+
+        if objects and not dry_run:
+            with transaction.atomic():
+                spec.model.objects.bulk_create(list(objects.values()), **upsert_options)
+        imported += len(objects)
+
+    if imported and not dry_run:
+        _invalidate_after_import()
+
+    return {
+        'kind': kind,
+        'dry_run': dry_run,
+        'received': len(rows),
+        'imported': imported,
+        'failed': failed,
+        'duplicates_replaced': duplicates,
+        'errors': errors,
+        'errors_truncated': failed > len(errors),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def _invalidate_after_import():
+    get_leaderboards().invalidate()
+    get_class_analytics().invalidate_all()
+    invalidate_on_commit(everything=True)
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_alter_exampaper_code_question_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notes',
+            name='doc_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='notes',
+            name='doc_size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='notes',
+            name='doc',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
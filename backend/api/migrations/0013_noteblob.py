@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_notes_doc_hash_notes_doc_size_alter_notes_doc'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('size', models.BigIntegerField()),
+                ('stored_size', models.BigIntegerField()),
+                ('compressed', models.BooleanField(default=False)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
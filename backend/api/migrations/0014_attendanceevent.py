@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:01
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def carry_over_totals(apps, schema_editor):
+    # Lectures marked before the event log existed have no events, so their
+    # counts become the base that the event-based rollups start from.
+    Attendance = apps.get_model('api', 'Attendance')
+    Attendance.objects.update(base_lectures=F('total_lectures'), base_attended=F('total_attended'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_noteblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='base_attended',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='base_lectures',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='AttendanceEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('enrollment_no', models.IntegerField()),
+                ('subject_id', models.IntegerField()),
+                ('semester', models.IntegerField()),
+                ('date', models.DateField()),
+                ('present', models.BooleanField()),
+                ('marked_by', models.IntegerField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['subject_id', 'date'], name='attd_event_subject_date_idx'), models.Index(fields=['enrollment_no', 'date'], name='attd_event_student_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('enrollment_no', 'subject_id', 'date'), name='unique_attd_event_per_day')],
+            },
+        ),
+        migrations.RunPython(carry_over_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_attendanceevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exampaper',
+            index=models.Index(fields=['sem', 'subject_id', 'id'], name='exampaper_sem_subject_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examresult',
+            index=models.Index(fields=['enrollment_no', 'id'], name='examresult_student_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examresult',
+            index=models.Index(fields=['subject_id', 'test_name', 'id'], name='examresult_subject_test_idx'),
+        ),
+    ]
@@ -0,0 +1,117 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:08
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicates(apps, schema_editor):
+    # The unique constraints below fail on existing duplicates, so fold them first.
+    Attendance = apps.get_model('api', 'Attendance')
+    CurrentSemMarks = apps.get_model('api', 'CurrentSemMarks')
+
+    # Attendance: the oldest row keeps the sum of all the counts.
+    duplicates = Attendance.objects.values('enrollment_no', 'subject_id').annotate(n=Count('id')).filter(n__gt=1)
+    for key in duplicates:
+        rows = list(Attendance.objects.filter(enrollment_no=key['enrollment_no'], subject_id=key['subject_id']).order_by('id'))
+        keep = rows[0]
+        for row in rows[1:]:
+            keep.total_lectures += row.total_lectures
+            keep.total_attended += row.total_attended
+            keep.base_lectures += row.base_lectures
+            keep.base_attended += row.base_attended
+            keep.attd_date = max(keep.attd_date, row.attd_date)
+        Attendance.objects.filter(pk=keep.pk).update(
+            total_lectures=keep.total_lectures, total_attended=keep.total_attended,
+            base_lectures=keep.base_lectures, base_attended=keep.base_attended, attd_date=keep.attd_date,
+        )
+        Attendance.objects.filter(pk__in=[row.pk for row in rows[1:]]).delete()
+
+    # Marks are never picked for anyone: see drop_identical_duplicates.
+    drop_identical_duplicates(
+        CurrentSemMarks, ('enrollment_number', 'subject_id'), ('t1_marks', 't2_marks', 't3_marks', 'current_sem'),
+    )
+
+
+def drop_identical_duplicates(model, keys, fields):
+    """
+    Deletes the rows of `model` that repeat another row's `keys` with the same
+    `fields`. If two rows with the same keys differ, nothing is deleted and the
+    migration stops, listing them: which marks are right is for a person to
+    decide. Delete the wrong rows (Django admin or shell) and migrate again.
+    """
+    redundant, conflicts = [], []
+    for key in model.objects.values(*keys).annotate(n=Count('id')).filter(n__gt=1):
+        rows = list(model.objects.filter(**{k: key[k] for k in keys}).order_by('id').values('id', *fields))
+        if all(all(row[f] == rows[0][f] for f in fields) for row in rows[1:]):
+            redundant += [row['id'] for row in rows[1:]]
+        else:
+            conflicts.append(f"{', '.join(f'{k}={key[k]}' for k in keys)}: rows {[row['id'] for row in rows]}")
+    if conflicts:
+        raise RuntimeError(
+            f'{model.__name__} has rows that conflict with each other; delete the wrong ones and run migrate again.\n'
+            + '\n'.join(conflicts)
+        )
+    model.objects.filter(pk__in=redundant).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_exam_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['subject_id', 'attd_date'], name='attendance_subject_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examresult',
+            index=models.Index(fields=['test_name', 'enrollment_no'], name='examresult_test_student_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='faculty',
+            index=models.Index(fields=['fac_mail'], name='faculty_mail_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notes',
+            index=models.Index(fields=['sem'], name='notes_sem_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notes',
+            index=models.Index(fields=['uploader_id'], name='notes_uploader_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notes',
+            index=models.Index(fields=['doc_hash'], name='notes_doc_hash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pastmarks',
+            index=models.Index(fields=['enrollment_no', 'semester'], name='pastmarks_student_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='practicalmarks',
+            index=models.Index(fields=['enrollment_no', 'semester'], name='practicalmarks_student_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentdata',
+            index=models.Index(fields=['semester', 'branch'], name='student_sem_branch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentdata',
+            index=models.Index(fields=['email_id'], name='student_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subjectdetails',
+            index=models.Index(fields=['sem'], name='subject_sem_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(fields=('enrollment_no', 'subject_id'), name='unique_attendance_per_subject'),
+        ),
+        migrations.AddConstraint(
+            model_name='currentsemmarks',
+            constraint=models.UniqueConstraint(fields=('enrollment_number', 'subject_id'), name='unique_current_marks_per_subject'),
+        ),
+    ]
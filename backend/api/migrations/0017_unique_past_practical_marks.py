@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:13
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# Module names starting with a digit can't be imported with `import`.
+drop_identical_duplicates = import_module('api.migrations.0016_composite_indexes').drop_identical_duplicates
+
+
+def drop_duplicates(apps, schema_editor):
+    # The constraints below fail on existing duplicates; conflicting marks stop the migration.
+    for name in ('PastMarks', 'PracticalMarks'):
+        drop_identical_duplicates(apps.get_model('api', name), ('enrollment_no', 'semester', 'subject_id'), ('marks',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicates, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='pastmarks',
+            name='pastmarks_student_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='practicalmarks',
+            name='practicalmarks_student_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='pastmarks',
+            constraint=models.UniqueConstraint(fields=('enrollment_no', 'semester', 'subject_id'), name='unique_past_marks'),
+        ),
+        migrations.AddConstraint(
+            model_name='practicalmarks',
+            constraint=models.UniqueConstraint(fields=('enrollment_no', 'semester', 'subject_id'), name='unique_practical_marks'),
+        ),
+    ]
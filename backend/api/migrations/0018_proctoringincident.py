@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_unique_past_practical_marks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProctoringIncident',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('enrollment_no', models.IntegerField()),
+                ('exam_paper_id', models.IntegerField()),
+                ('type', models.CharField(max_length=50)),
+                ('label', models.CharField(blank=True, default='', max_length=50)),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField()),
+                ('frames', models.IntegerField()),
+                ('peak_confidence', models.FloatField()),
+                ('details', models.CharField(blank=True, default='', max_length=250)),
+                ('exam_result', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='proctoring_incidents', to='api.examresult')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['enrollment_no', 'exam_paper_id'], name='incident_student_paper_idx')],
+            },
+        ),
+    ]
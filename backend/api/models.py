@@ -9,6 +9,12 @@ class CurrentSemMarks(models.Model):
     t3_marks = models.FloatField()
     current_sem = models.IntegerField()
 
+    class Meta:
+        constraints = [
+            # One row of T1/T2/T3 marks per student per subject.
+            models.UniqueConstraint(fields=['enrollment_number', 'subject_id'], name='unique_current_marks_per_subject'),
+        ]
+
 class ExamPaper(models.Model):
     id = models.AutoField(primary_key=True)
     subject_id = models.IntegerField()
@@ -19,6 +25,12 @@ class ExamPaper(models.Model):
     mcq_ques = models.JSONField()
     sem = models.IntegerField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Exam list filters, walked in id order by the cursor pagination.
+            models.Index(fields=['sem', 'subject_id', 'id'], name='exampaper_sem_subject_idx'),
+        ]
+
 class ExamResult(models.Model):
     id = models.AutoField(primary_key=True)
     enrollment_no = models.IntegerField()
@@ -27,6 +39,14 @@ class ExamResult(models.Model):
     mcq_marks = models.IntegerField()
     test_name = models.CharField(max_length=50)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['enrollment_no', 'id'], name='examresult_student_idx'),
+            models.Index(fields=['subject_id', 'test_name', 'id'], name='examresult_subject_test_idx'),
+            # FacultyResultsView: results of one test for the students of a semester.
+            models.Index(fields=['test_name', 'enrollment_no'], name='examresult_test_student_idx'),
+        ]
+
 class Faculty(models.Model):
     fac_id = models.IntegerField(primary_key=True)
     fac_name = models.CharField(max_length=250)
@@ -34,6 +54,11 @@ class Faculty(models.Model):
     sem=models.IntegerField()
     pin = models.IntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['fac_mail'], name='faculty_mail_idx'),  # Login.
+        ]
+
 class PastMarks(models.Model):
     id = models.AutoField(primary_key=True)
     enrollment_no = models.IntegerField()
@@ -41,6 +66,12 @@ class PastMarks(models.Model):
     semester = models.IntegerField()
     marks = models.FloatField()
 
+    class Meta:
+        constraints = [
+            # One mark per student, subject and semester, so imports can upsert on it.
+            models.UniqueConstraint(fields=['enrollment_no', 'semester', 'subject_id'], name='unique_past_marks'),
+        ]
+
 class PracticalMarks(models.Model):
     id = models.AutoField(primary_key=True)
     enrollment_no = models.IntegerField()
@@ -48,6 +79,12 @@ class PracticalMarks(models.Model):
     semester = models.IntegerField()
     marks = models.FloatField()
 
+    class Meta:
+        constraints = [
+            # One mark per student, subject and semester, so imports can upsert on it.
+            models.UniqueConstraint(fields=['enrollment_no', 'semester', 'subject_id'], name='unique_practical_marks'),
+        ]
+
 class StudentData(models.Model):
     enrollment_no = models.IntegerField(primary_key=True)
     name = models.CharField(max_length=500)
@@ -59,11 +96,23 @@ class StudentData(models.Model):
     parents_contact = models.BigIntegerField()
     pin = models.IntegerField()
 
+    class Meta:
+        indexes = [
+            # Semester lists, and branch lists / students of a branch within a semester.
+            models.Index(fields=['semester', 'branch'], name='student_sem_branch_idx'),
+            models.Index(fields=['email_id'], name='student_email_idx'),  # Login.
+        ]
+
 class SubjectDetails(models.Model):
     subject_id = models.IntegerField(primary_key=True)
     subject_name = models.CharField(max_length=250)
     sem = models.IntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['sem'], name='subject_sem_idx'),
+        ]
+
 class Attendance(models.Model):
     id = models.AutoField(primary_key=True)
     enrollment_no=models.IntegerField()
@@ -73,6 +122,20 @@ class Attendance(models.Model):
     total_lectures=models.IntegerField()
     total_attended=models.IntegerField()
     attd_date=models.DateField(auto_now=True)
+    # Counts carried over from before lectures were logged as AttendanceEvent
+    # rows. The totals above are these plus the events, kept up to date as
+    # attendance is marked (see the rebuild_attendance_rollups command).
+    base_lectures=models.IntegerField(default=0)
+    base_attended=models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['subject_id', 'attd_date'], name='attendance_subject_date_idx'),
+        ]
+        constraints = [
+            # One running total per student per subject; it also serves the per-student lookups.
+            models.UniqueConstraint(fields=['enrollment_no', 'subject_id'], name='unique_attendance_per_subject'),
+        ]
     
 class Notes(models.Model):
     id = models.AutoField(primary_key=True)
@@ -80,6 +143,72 @@ class Notes(models.Model):
     uploader_name=models.CharField(max_length=250)
     subject_name=models.CharField(max_length=250)
     desc=models.CharField(max_length=250)
-    doc=models.BinaryField()
+    # Legacy copy of the document. New uploads go to the note storage
+    # (api/note_storage.py) and only keep its SHA-256 and size here.
+    doc=models.BinaryField(null=True, blank=True)
+    doc_hash=models.CharField(max_length=64, blank=True, default='')
+    doc_size=models.BigIntegerField(default=0)
     sem=models.IntegerField()
-    upload_date=models.DateField(auto_now=True)
\ No newline at end of file
+    upload_date=models.DateField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sem'], name='notes_sem_idx'),
+            models.Index(fields=['uploader_id'], name='notes_uploader_idx'),
+            models.Index(fields=['doc_hash'], name='notes_doc_hash_idx'),
+        ]
+
+class NoteBlob(models.Model):
+    # One row per document in the note storage, shared by every note with the same content.
+    digest=models.CharField(max_length=64, primary_key=True)
+    size=models.BigIntegerField()
+    stored_size=models.BigIntegerField()
+    compressed=models.BooleanField(default=False)
+    ref_count=models.IntegerField(default=0)
+    created=models.DateTimeField(auto_now_add=True)
+
+
+class AttendanceEvent(models.Model):
+    # One row per student per lecture. Rows are only ever added, never changed.
+    id = models.BigAutoField(primary_key=True)
+    enrollment_no=models.IntegerField()
+    subject_id=models.IntegerField()
+    semester=models.IntegerField()
+    date=models.DateField()
+    present=models.BooleanField()
+    marked_by=models.IntegerField(null=True, blank=True)
+    created=models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['subject_id', 'date'], name='attd_event_subject_date_idx'),
+            models.Index(fields=['enrollment_no', 'date'], name='attd_event_student_date_idx'),
+        ]
+        constraints = [
+            # Attendance can only be marked once per day per subject.
+            models.UniqueConstraint(fields=['enrollment_no', 'subject_id', 'date'], name='unique_attd_event_per_day'),
+        ]
+
+
+class ProctoringIncident(models.Model):
+    # One row per incident the proctoring service reports: a condition (looking
+    # down, a phone, ...) with when it started and ended, not one row per frame.
+    id = models.BigAutoField(primary_key=True)
+    enrollment_no=models.IntegerField()
+    exam_paper_id=models.IntegerField()
+    # Set when the exam is submitted, or right away if it already was (see api/proctoring.py).
+    exam_result=models.ForeignKey(
+        ExamResult, null=True, blank=True, on_delete=models.CASCADE, related_name='proctoring_incidents'
+    )
+    type=models.CharField(max_length=50)
+    label=models.CharField(max_length=50, blank=True, default='')
+    started_at=models.DateTimeField()
+    ended_at=models.DateTimeField()
+    frames=models.IntegerField()
+    peak_confidence=models.FloatField()
+    details=models.CharField(max_length=250, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['enrollment_no', 'exam_paper_id'], name='incident_student_paper_idx'),
+        ]
@@ -0,0 +1,387 @@
+# api/note_storage.py
+"""
+Storage for the documents attached to Notes.
+
+Documents used to live in `Notes.doc`, a BinaryField, so every upload and
+download pulled the whole file through the database. Now the bytes live in a
+content-addressed store and a note only keeps the SHA-256 of its document
+(`doc_hash`) and its size (`doc_size`).
+
+Because documents are addressed by content, the same PDF uploaded for several
+semesters is stored once. Every stored document has a `NoteBlob` row counting
+the notes that use it, and its bytes are only removed when the last of those
+notes is deleted. Documents that compress well are stored gzip-compressed and
+decompressed transparently on download.
+
+`NoteStorage` is the interface the views use. `LocalContentStore` keeps files
+on the local filesystem; other backends (e.g. object storage) can be plugged
+in through settings.NOTES_STORAGE.
+"""
+import collections
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import zlib
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+
+from .models import NoteBlob, Notes
+
+CHUNK_SIZE = 64 * 1024
+
+# What `save()` returns. `size` is the size of the document itself and
+# `stored_size` what it takes on disk (smaller if compressed).
+StoredDocument = collections.namedtuple('StoredDocument', 'digest size stored_size compressed')
+
+
+def iter_chunks(file_obj, chunk_size=CHUNK_SIZE):
+    """Yields the content of an uploaded file or any binary file object in chunks."""
+    if hasattr(file_obj, 'chunks'):
+        yield from file_obj.chunks(chunk_size)
+        return
+    while True:
+        chunk = file_obj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+class NoteStorage:
+    """The interface of a document store. Documents are addressed by their SHA-256."""
+
+    def save(self, file_obj):
+        """Stores the content of `file_obj` and returns a StoredDocument."""
+        raise NotImplementedError
+
+    def open(self, digest):
+        """Returns a binary file object with the (uncompressed) document, positioned at the start."""
+        raise NotImplementedError
+
+    def stat(self, digest):
+        """Returns (stored size in bytes, compressed) of a stored document."""
+        raise NotImplementedError
+
+    def exists(self, digest):
+        raise NotImplementedError
+
+    def delete(self, digest):
+        raise NotImplementedError
+
+    def compress_existing(self, digest):
+        """Compresses an already stored document if worthwhile. Returns (stored size, compressed)."""
+        return self.stat(digest)
+
+
+class LocalContentStore(NoteStorage):
+    """
+    Keeps every document in `root/<first 2 hex>/<next 2 hex>/<digest>`, or
+    `<digest>.gz` when it is stored compressed. Uploads are written to a
+    temporary file while being hashed and then moved into place, so a
+    half-written upload is never visible.
+
+    With `compress` on, a document is gzipped if a sample of its first chunk
+    shrinks below `min_compression_ratio` and the whole file does too.
+    Already-compressed formats (most images, archives, office files) fail the
+    sample check and are stored as they are.
+    """
+
+    def __init__(self, root, compress=True, min_compression_ratio=0.9):
+        self.root = os.fspath(root)
+        self.tmp_dir = os.path.join(self.root, 'tmp')
+        self.compress = compress
+        self.min_compression_ratio = min_compression_ratio
+
+    def path(self, digest):
+        if not re.fullmatch(r'[0-9a-f]{64}', digest or ''):
+            raise ValueError(f'Invalid document digest: {digest!r}')
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def _compressed_path(self, digest):
+        return self.path(digest) + '.gz'
+
+    def _looks_compressible(self, sample):
+        if not sample:
+            return False
+        return len(zlib.compress(sample, 1)) < len(sample) * self.min_compression_ratio
+
+    def _place(self, tmp_path, digest, size, try_compress):
+        """Moves a finished temporary file into place, compressed if worthwhile."""
+        final_path = self.path(digest)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        if try_compress:
+            gz_tmp_path = tmp_path + '.gz'
+            with open(tmp_path, 'rb') as src, gzip.open(gz_tmp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            stored_size = os.path.getsize(gz_tmp_path)
+            if stored_size < size * self.min_compression_ratio:
+                os.replace(gz_tmp_path, self._compressed_path(digest))
+                os.remove(tmp_path)
+                return stored_size, True
+            os.remove(gz_tmp_path)
+        os.replace(tmp_path, final_path)
+        return size, False
+
+    def save(self, file_obj):
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        sha256 = hashlib.sha256()
+        size = 0
+        sample = b''
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in iter_chunks(file_obj):
+                    if not sample:
+                        sample = chunk[:CHUNK_SIZE]
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    tmp.write(chunk)
+
+            digest = sha256.hexdigest()
+            if self.exists(digest):
+                # Same content already stored; keep the existing copy.
+                os.remove(tmp_path)
+                return StoredDocument(digest, size, *self.stat(digest))
+
+            stored_size, compressed = self._place(
+                tmp_path, digest, size, self.compress and self._looks_compressible(sample)
+            )
+        except BaseException:
+            for leftover in (tmp_path, tmp_path + '.gz'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            raise
+        return StoredDocument(digest, size, stored_size, compressed)
+
+    def open(self, digest):
+        compressed_path = self._compressed_path(digest)
+        if os.path.exists(compressed_path):
+            return gzip.open(compressed_path, 'rb')
+        return open(self.path(digest), 'rb')
+
+    def stat(self, digest):
+        compressed_path = self._compressed_path(digest)
+        if os.path.exists(compressed_path):
+            return os.path.getsize(compressed_path), True
+        return os.path.getsize(self.path(digest)), False
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest)) or os.path.exists(self._compressed_path(digest))
+
+    def delete(self, digest):
+        for path in (self.path(digest), self._compressed_path(digest)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def compress_existing(self, digest):
+        raw_path = self.path(digest)
+        if not os.path.exists(raw_path):
+            return self.stat(digest)
+        with open(raw_path, 'rb') as f:
+            sample = f.read(CHUNK_SIZE)
+        if not self._looks_compressible(sample):
+            return self.stat(digest)
+
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        os.close(fd)
+        shutil.copyfile(raw_path, tmp_path)
+        stored_size, compressed = self._place(tmp_path, digest, os.path.getsize(raw_path), True)
+        if compressed:
+            os.remove(raw_path)
+        return stored_size, compressed
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_note_storage():
+    """Returns the configured note storage backend."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                from django.conf import settings
+                config = getattr(settings, 'NOTES_STORAGE', {})
+                backend = import_string(config.get('BACKEND', 'api.note_storage.LocalContentStore'))
+                options = config.get('OPTIONS', {'root': os.path.join(settings.BASE_DIR, 'note_files')})
+                _storage = backend(**options)
+    return _storage
+
+
+def acquire_blob(stored, file_obj=None):
+    """
+    Records one more note using a stored document. Must run in the same
+    transaction that creates the note.
+    """
+    blob, created = NoteBlob.objects.select_for_update().get_or_create(
+        digest=stored.digest,
+        defaults={
+            'size': stored.size,
+            'stored_size': stored.stored_size,
+            'compressed': stored.compressed,
+            'ref_count': 0,
+        },
+    )
+    if created and file_obj is not None and not get_note_storage().exists(stored.digest):
+        # The last note using this content was deleted between our upload
+        # finding the file on disk and now, so the file is gone. Store it again.
+        file_obj.seek(0)
+        get_note_storage().save(file_obj)
+    NoteBlob.objects.filter(digest=stored.digest).update(ref_count=F('ref_count') + 1)
+    return blob
+
+
+def release_blob(digest):
+    """
+    Records one note less using a stored document, and removes the document
+    once no note uses it. Must run in the same transaction that deletes the note.
+    """
+    blob = NoteBlob.objects.select_for_update().filter(digest=digest).first()
+    if blob is None:
+        return
+    if blob.ref_count <= 1:
+        blob.delete()
+        transaction.on_commit(lambda: delete_if_unused(digest))
+    else:
+        NoteBlob.objects.filter(digest=digest).update(ref_count=F('ref_count') - 1)
+
+
+def delete_if_unused(digest):
+    """
+    Removes a released document, or one stored for a note that was then not
+    created, unless a NoteBlob refers to it: another note uses it, or an
+    upload of the same content has created the NoteBlob again since the
+    release committed (that upload found the file still on disk and did not
+    store it again).
+    """
+    with transaction.atomic():
+        # Locks the row, or the gap where it would go, so such an upload
+        # either commits first and is seen here, or waits and stores the file again.
+        if not NoteBlob.objects.select_for_update().filter(digest=digest).exists():
+            get_note_storage().delete(digest)
+
+
+def storage_savings():
+    """
+    Compares the bytes the notes reference (what storing every upload as-is
+    would take) with the bytes actually stored after deduplication and compression.
+    """
+    notes = Notes.objects.exclude(doc_hash='').aggregate(count=Count('pk'), total=Sum('doc_size'))
+    blobs = NoteBlob.objects.aggregate(count=Count('pk'), total=Sum('stored_size'))
+    logical = notes['total'] or 0
+    stored = blobs['total'] or 0
+    return {
+        'notes': notes['count'],
+        'blobs': blobs['count'],
+        'logical_bytes': logical,
+        'stored_bytes': stored,
+        'saved_bytes': logical - stored,
+        'saved_ratio': round((logical - stored) / logical, 4) if logical else 0.0,
+    }
+
+
+def _parse_range(header, size):
+    """
+    Parses a single-range `Range: bytes=...` header. Returns (start, end)
+    inclusive, None if the header should be ignored, or raises ValueError if
+    the range cannot be satisfied.
+    """
+    match = re.fullmatch(r'\s*bytes=(\d*)-(\d*)\s*', header or '')
+    if not match or match.group(1) == match.group(2) == '':
+        return None  # Missing, malformed or multi-range: send the whole file.
+
+    first, last = match.groups()
+    if first == '':
+        # A suffix range: the last N bytes.
+        length = int(last)
+        if length == 0:
+            raise ValueError('Empty suffix range.')
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError('Range not satisfiable.')
+    return start, min(end, size - 1)
+
+
+def _iter_range(file_obj, start, end, chunk_size=CHUNK_SIZE):
+    try:
+        file_obj.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file_obj.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file_obj.close()
+
+
+def etag_matches(header, etag):
+    """True if an If-None-Match header lists `etag` (or is '*')."""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    tags = [tag.strip() for tag in header.split(',')]
+    return etag in tags or f'W/{etag}' in tags
+
+
+def document_response(request, digest, size, filename, storage=None):
+    """
+    Builds a streaming download response for a stored document, with ETag /
+    If-None-Match (304) and single byte-range (206) support.
+    """
+    storage = storage or get_note_storage()
+    etag = f'"{digest}"'
+    disposition = f'attachment; filename="{filename}"'
+
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+
+    try:
+        byte_range = _parse_range(request.headers.get('Range'), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    # A Range request only applies if the client still has the same version.
+    if_range = request.headers.get('If-Range')
+    if byte_range is not None and if_range and if_range.strip() != etag:
+        byte_range = None
+
+    file_obj = storage.open(digest)
+    if byte_range is None and not isinstance(file_obj, gzip.GzipFile):
+        response = FileResponse(file_obj, content_type='application/octet-stream')
+        response['Content-Length'] = str(size)
+    elif byte_range is None:
+        # Compressed documents are decompressed on the fly.
+        response = StreamingHttpResponse(_iter_range(file_obj, 0, size - 1), content_type='application/octet-stream')
+        response['Content-Length'] = str(size)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _iter_range(file_obj, start, end), status=206, content_type='application/octet-stream'
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+
+    response['Content-Disposition'] = disposition
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    return response
@@ -0,0 +1,111 @@
+# api/principal_cache.py
+"""
+Caches for CustomJWTAuthentication, so an API call by an already-seen user
+costs no database query.
+
+- Decoded tokens: verifying the signature of the same token on every call
+  is wasted work, so the payload of a valid token is remembered (its expiry
+  is still checked on every use).
+- Principals: the StudentData/Faculty row of a user, keyed by
+  (role, id, token iat), so a new login starts from a fresh row.
+
+Both are bounded LRUs with a TTL. Saving or deleting a student or faculty
+row drops that user's entries (see signals.py). That only reaches the
+process where the write happened, so other processes can use an old row for
+at most AUTH_CACHE['TTL'] seconds.
+"""
+import collections
+import copy
+import threading
+import time
+
+
+class TTLCache:
+    """A thread-safe LRU whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, max_entries=10000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, match):
+        """Drops every entry whose key satisfies `match(key)`."""
+        with self._lock:
+            for key in [k for k in self._entries if match(k)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class PrincipalCache:
+    """The decoded-token and principal caches used by CustomJWTAuthentication."""
+
+    def __init__(self, max_entries=10000, ttl=60):
+        self.tokens = TTLCache(max_entries, ttl)
+        self.principals = TTLCache(max_entries, ttl)
+
+    def get_payload(self, token):
+        return self.tokens.get(token)
+
+    def set_payload(self, token, payload):
+        self.tokens.set(token, payload)
+
+    def get_user(self, role, user_id, issued_at):
+        user = self.principals.get((role, user_id, issued_at))
+        # Each request gets its own copy, so nothing a view sets on it leaks into the next one.
+        return copy.copy(user) if user is not None else None
+
+    def set_user(self, role, user_id, issued_at, user):
+        self.principals.set((role, user_id, issued_at), copy.copy(user))
+
+    def invalidate_user(self, role, user_id):
+        """Drops the cached rows of one user, whatever token they were loaded for."""
+        self.principals.discard(lambda key: key[0] == role and str(key[1]) == str(user_id))
+
+    def clear(self):
+        self.tokens.clear()
+        self.principals.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_principal_cache():
+    """Returns the process-wide principal cache, creating it from settings on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from django.conf import settings
+                config = getattr(settings, 'AUTH_CACHE', {})
+                _cache = PrincipalCache(
+                    max_entries=config.get('MAX_ENTRIES', 10000),
+                    ttl=config.get('TTL', 60),
+                )
+    return _cache
@@ -0,0 +1,80 @@
+# api/proctoring.py
+"""
+Incidents from the proctoring service ("Opencv Model/proctoring_session.py").
+
+The service follows each exam session over time and only reports incidents,
+a condition with its start and end ("Looking Down, 10:02:15 - 10:03:40, 18
+frames"), in batches. They are stored as ProctoringIncident rows, one INSERT
+per batch.
+
+Incidents come in while the exam is still being taken, before its
+ExamResult exists, so they are linked to it in two places: when a batch is
+stored (the exam was already submitted) and when the exam is submitted
+(SubmitExamView). ExamResult has no exam paper id, so the result of a paper
+is the student's result for the paper's subject.
+
+The service itself is open to anyone, so it only stores the incidents of a
+session whose name the backend signed: the exam page gets it from
+ProctoringSessionView ("<enrollment_no>-<exam paper id>.<expiry>.<signature>",
+see sign_session) and the service checks the signature with the ingest key
+before it sends any incident of that student.
+"""
+import hashlib
+import hmac
+import time
+
+from django.conf import settings
+
+from .models import ExamPaper, ExamResult, ProctoringIncident
+
+
+def ingest_key_matches(key):
+    """Whether `key` is the ingest key shared with the proctoring service. Never true when none is set."""
+    expected = getattr(settings, 'PROCTORING', {}).get('INGEST_KEY', '')
+    return bool(expected) and hmac.compare_digest(expected.encode(), (key or '').encode())
+
+
+def sign_session(enrollment_no, exam_paper_id, now=None):
+    """A proctoring session name for a student's exam, signed with the ingest key (None while no key is set)."""
+    config = getattr(settings, 'PROCTORING', {})
+    key = config.get('INGEST_KEY', '')
+    if not key:
+        return None
+    expires = int((now or time.time()) + config.get('SESSION_TTL', 6 * 3600))
+    name = f'{enrollment_no}-{exam_paper_id}.{expires}'
+    signature = hmac.new(key.encode(), f'proctoring-session:{name}'.encode(), hashlib.sha256).hexdigest()[:32]
+    return f'{name}.{signature}'
+
+
+def store_incidents(rows):
+    """Saves validated incident dicts in one query, linked to their ExamResult when there is one."""
+    paper_subjects = dict(
+        ExamPaper.objects.filter(id__in={row['exam_paper_id'] for row in rows}).values_list('id', 'subject_id')
+    )
+    results = {}
+    for result_id, enrollment_no, subject_id in (
+        ExamResult.objects
+        .filter(enrollment_no__in={row['enrollment_no'] for row in rows}, subject_id__in=set(paper_subjects.values()))
+        .order_by('id')
+        .values_list('id', 'enrollment_no', 'subject_id')
+    ):
+        results[(enrollment_no, subject_id)] = result_id  # The latest one wins.
+
+    incidents = [
+        ProctoringIncident(
+            **dict(row, label=row.get('label') or ''),
+            exam_result_id=results.get((row['enrollment_no'], paper_subjects.get(row['exam_paper_id']))),
+        )
+        for row in rows
+    ]
+    ProctoringIncident.objects.bulk_create(incidents)
+    return len(incidents)
+
+
+def link_incidents(result):
+    """Links the student's not yet linked incidents on papers of the result's subject to `result`."""
+    return ProctoringIncident.objects.filter(
+        enrollment_no=result.enrollment_no,
+        exam_paper_id__in=ExamPaper.objects.filter(subject_id=result.subject_id).values('id'),
+        exam_result__isnull=True,
+    ).update(exam_result=result)
@@ -0,0 +1,134 @@
+# api/results_query.py
+"""
+The queries behind the faculty results page (FacultyResultsView).
+
+The view used to load every subject and every student of the semester into
+Python dicts and stitch names into each result row by row. Here the names
+are looked up by the database (a correlated subquery on the primary key of
+StudentData / SubjectDetails, which is a join in all but name since the
+models have no foreign keys), and rows come out of values() as plain dicts
+that go straight to the JSON renderer.
+
+Every function returns a queryset, so the view can still sort and page it
+in SQL. The per-group statistics of aggregate() are those of the class
+analytics (class_analytics.distribution), so both pages agree.
+"""
+import numpy as np
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .class_analytics import distribution
+from .models import CurrentSemMarks, ExamResult, PastMarks, PracticalMarks, StudentData, SubjectDetails
+
+
+def student_name(field):
+    return Coalesce(
+        Subquery(StudentData.objects.filter(enrollment_no=OuterRef(field)).values('name')[:1]),
+        Value('Unknown'),
+    )
+
+
+def subject_name(field='subject_id'):
+    return Coalesce(
+        Subquery(SubjectDetails.objects.filter(subject_id=OuterRef(field)).values('subject_name')[:1]),
+        Value('Unknown'),
+    )
+
+
+def students_in_semester(semester):
+    return StudentData.objects.filter(semester=semester).values('enrollment_no')
+
+
+def exam_names(semester):
+    """The distinct test names taken by students of a semester (walks the test_name/enrollment_no index)."""
+    return (
+        ExamResult.objects
+        .filter(enrollment_no__in=students_in_semester(semester))
+        .order_by('test_name')
+        .values_list('test_name', flat=True)
+        .distinct()
+    )
+
+
+def exam_results(semester, test_name=None, subject_id=None):
+    queryset = ExamResult.objects.filter(enrollment_no__in=students_in_semester(semester))
+    if test_name:
+        queryset = queryset.filter(test_name=test_name)
+    if subject_id is not None:
+        queryset = queryset.filter(subject_id=subject_id)
+    return queryset.annotate(
+        student_name=student_name('enrollment_no'),
+        subject_name=subject_name(),
+        total_marks=F('code_marks') + F('mcq_marks'),
+    )
+
+
+EXAM_RESULT_FIELDS = ('id', 'enrollment_no', 'student_name', 'subject_name', 'code_marks', 'mcq_marks', 'total_marks')
+
+
+def current_marks(semester, subject_id=None):
+    queryset = CurrentSemMarks.objects.filter(enrollment_number__in=students_in_semester(semester))
+    if subject_id is not None:
+        queryset = queryset.filter(subject_id=subject_id)
+    return queryset.annotate(
+        student_name=student_name('enrollment_number'),
+        subject_name=subject_name(),
+        total_marks=F('t1_marks') + F('t2_marks') + F('t3_marks'),
+    )
+
+
+CURRENT_MARKS_FIELDS = ('id', 'enrollment_number', 'student_name', 'subject_name', 't1_marks', 't2_marks', 't3_marks', 'total_marks')
+
+
+def past_marks(enrollment_no):
+    return PastMarks.objects.filter(enrollment_no=enrollment_no).annotate(subject_name=subject_name()).values()
+
+
+def practical_marks(enrollment_no):
+    return PracticalMarks.objects.filter(enrollment_no=enrollment_no).annotate(subject_name=subject_name()).values()
+
+
+def describe(values):
+    stats = distribution(np.array(values, dtype=float))
+    if not stats['count']:
+        return stats
+    percentiles = stats['percentiles']
+    return {
+        'count': stats['count'],
+        'mean': stats['mean'],
+        'min': stats['min'],
+        'p25': percentiles['p25'],
+        'median': percentiles['p50'],
+        'p75': percentiles['p75'],
+        'p90': percentiles['p90'],
+        'max': stats['max'],
+    }
+
+
+def aggregate(queryset, group_by, measures):
+    """
+    Summary statistics of `measures` per group. The database only sends the
+    group keys and the numbers (MySQL has no percentile functions), and the
+    rows come ordered by group so each one is summarized as soon as it ends.
+    """
+    rows = queryset.order_by(*group_by).values_list(*group_by, 'subject_name', *measures)
+    groups = []
+    current_key, columns, name = None, None, None
+
+    def close():
+        if current_key is not None:
+            entry = dict(zip(group_by, current_key))
+            entry['subject_name'] = name
+            entry.update({measure: describe(column) for measure, column in zip(measures, columns)})
+            groups.append(entry)
+
+    for row in rows.iterator(chunk_size=2000):
+        key = row[:len(group_by)]
+        if key != current_key:
+            close()
+            current_key, columns, name = key, [[] for _ in measures], row[len(group_by)]
+        for column, value in zip(columns, row[len(group_by) + 1:]):
+            if value is not None:
+                column.append(value)
+    close()
+    return groups
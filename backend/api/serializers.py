@@ -2,7 +2,7 @@
 
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import StudentData, Faculty, ExamPaper,ExamResult, Attendance, CurrentSemMarks, PastMarks, PracticalMarks ,SubjectDetails, Notes
+from .models import StudentData, Faculty, ExamPaper,ExamResult, Attendance, CurrentSemMarks, PastMarks, PracticalMarks ,SubjectDetails, Notes, ProctoringIncident
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -25,16 +25,39 @@ class CustomLoginSerializer(serializers.Serializer):
     pin = serializers.CharField(style={'input_type': 'password'})
     role = serializers.ChoiceField(choices=['student', 'faculty'])
 
-class ExamPaperSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Lets the client pick the fields it needs with ?fields=a,b,c.
+    Unknown names are ignored; without the parameter every field is sent.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        wanted = request.query_params.get('fields') if request is not None else None
+        if wanted:
+            keep = {name.strip() for name in wanted.split(',')}
+            for name in set(self.fields) - keep:
+                self.fields.pop(name)
+
+class ExamPaperSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ExamPaper
-        fields = '__all__' # This will include all fields from your ExamPaper model
-class ExamResultSerializer(serializers.ModelSerializer):
+        # test_output_2 holds the hidden test cases the judge runs; it never leaves the server.
+        fields = ['id', 'subject_id', 'sem', 'code_question', 'test_output_1', 'mcq_ques']
+class ExamResultSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ExamResult
         # These fields match the columns in your api_examresult table
         fields = ['enrollment_no', 'subject_id', 'code_marks', 'mcq_marks', 'test_name']
         
+class ProctoringIncidentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProctoringIncident
+        fields = ['id', 'enrollment_no', 'exam_paper_id', 'exam_result', 'type', 'label', 'started_at', 'ended_at',
+                  'frames', 'peak_confidence', 'details']
+        read_only_fields = ['id', 'exam_result']
+        extra_kwargs = {'label': {'allow_null': True}}
+
 class AttendanceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Attendance
@@ -0,0 +1,123 @@
+# api/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .class_analytics import get_class_analytics
+from .leaderboard import get_leaderboards
+from .models import (
+    Attendance, CurrentSemMarks, ExamPaper, ExamResult, Faculty, Notes, PastMarks, PracticalMarks,
+    StudentData, SubjectDetails,
+)
+from .principal_cache import get_principal_cache
+from .summary_cache import invalidate_on_commit
+from .verdict_cache import get_verdict_cache
+
+
+# Cached verdicts of a paper are dropped whenever the paper is saved or deleted,
+# whether that happens through ExamPaperCreateView, the admin or the shell.
+@receiver(post_save, sender=ExamPaper)
+@receiver(post_delete, sender=ExamPaper)
+def invalidate_exam_paper_verdicts(sender, instance, **kwargs):
+    get_verdict_cache().invalidate_paper(instance.id)
+
+
+# Keep the semester rankings in step with marks and students. The total is
+# recomputed after the commit, so a rolled back change never reaches a board.
+@receiver(post_save, sender=CurrentSemMarks)
+@receiver(post_delete, sender=CurrentSemMarks)
+def refresh_leaderboard_for_marks(sender, instance, **kwargs):
+    enrollment_no = instance.enrollment_number
+    transaction.on_commit(lambda: get_leaderboards().refresh_student(enrollment_no))
+
+
+@receiver(post_save, sender=StudentData)
+@receiver(post_delete, sender=StudentData)
+def refresh_leaderboard_for_student(sender, instance, **kwargs):
+    enrollment_no = instance.enrollment_no
+    transaction.on_commit(lambda: get_leaderboards().refresh_student(enrollment_no))
+
+
+# Writes that change the cached per-student payloads (see summary_cache.py).
+@receiver(post_save, sender=ExamResult)
+@receiver(post_delete, sender=ExamResult)
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+@receiver(post_save, sender=PastMarks)
+@receiver(post_delete, sender=PastMarks)
+@receiver(post_save, sender=PracticalMarks)
+@receiver(post_delete, sender=PracticalMarks)
+@receiver(post_save, sender=StudentData)
+@receiver(post_delete, sender=StudentData)
+def invalidate_student_summaries(sender, instance, **kwargs):
+    invalidate_on_commit(students=[instance.enrollment_no])
+
+
+def student_semesters(enrollment_no):
+    """
+    The semester a student's marks count towards, as a list (empty once the
+    student is gone). The leaderboards, summaries and analytics all group
+    students by StudentData.semester, which CurrentSemMarks.current_sem need
+    not agree with.
+    """
+    return list(StudentData.objects.filter(enrollment_no=enrollment_no).values_list('semester', flat=True))
+
+
+@receiver(post_save, sender=CurrentSemMarks)
+@receiver(post_delete, sender=CurrentSemMarks)
+def invalidate_summaries_for_marks(sender, instance, **kwargs):
+    # A new total can move the rank of everyone in the semester.
+    enrollment_no = instance.enrollment_number
+    invalidate_on_commit(students=[enrollment_no], semesters=student_semesters(enrollment_no))
+
+
+@receiver(post_save, sender=Notes)
+@receiver(post_delete, sender=Notes)
+@receiver(post_save, sender=ExamPaper)
+@receiver(post_delete, sender=ExamPaper)
+def invalidate_semester_summaries(sender, instance, **kwargs):
+    invalidate_on_commit(semesters=[instance.sem])
+
+
+@receiver(post_save, sender=SubjectDetails)
+@receiver(post_delete, sender=SubjectDetails)
+def invalidate_all_summaries(sender, instance, **kwargs):
+    invalidate_on_commit(everything=True)
+
+
+# A changed or deleted user must not keep authenticating with their old row.
+@receiver(post_save, sender=StudentData)
+@receiver(post_delete, sender=StudentData)
+def invalidate_student_principal(sender, instance, **kwargs):
+    get_principal_cache().invalidate_user('student', instance.enrollment_no)
+
+
+@receiver(post_save, sender=Faculty)
+@receiver(post_delete, sender=Faculty)
+def invalidate_faculty_principal(sender, instance, **kwargs):
+    get_principal_cache().invalidate_user('faculty', instance.fac_id)
+
+
+# Class analytics are cached per data version; marks and students bump it.
+@receiver(post_save, sender=CurrentSemMarks)
+@receiver(post_delete, sender=CurrentSemMarks)
+def invalidate_semester_analytics(sender, instance, **kwargs):
+    semesters = student_semesters(instance.enrollment_number)
+
+    def bump():
+        for semester in semesters:
+            get_class_analytics().invalidate_semester(semester)
+
+    transaction.on_commit(bump)
+
+
+@receiver(post_save, sender=ExamResult)
+@receiver(post_delete, sender=ExamResult)
+@receiver(post_save, sender=PastMarks)
+@receiver(post_delete, sender=PastMarks)
+@receiver(post_save, sender=PracticalMarks)
+@receiver(post_delete, sender=PracticalMarks)
+@receiver(post_save, sender=StudentData)
+@receiver(post_delete, sender=StudentData)
+def invalidate_all_analytics(sender, instance, **kwargs):
+    transaction.on_commit(lambda: get_class_analytics().invalidate_all())
@@ -0,0 +1,151 @@
+# api/summary_cache.py
+"""
+A cache of the per-student payloads of the portal (dashboard summary,
+results, attendance and notes list).
+
+These pages were rebuilt from the database on every load, but their data
+only changes when faculty mark attendance, upload or delete notes, marks are
+entered, or the student submits an exam. So the payloads are cached, and
+those writes invalidate them.
+
+Invalidation works with version numbers instead of deleting keys. Every
+entry key contains the current version of its student, of the student's
+semester and a global version:
+
+    summary:<name>:<enrollment_no>:<student version>.<semester version>.<global version>
+
+Bumping a version makes every key built with the old one unreachable, and
+they simply expire. Writes bump versions from signals.py (and from
+MarkAttendanceView, which writes in bulk), after the transaction commits.
+
+The entries and versions live in the cache named by
+SUMMARY_CACHE['BACKEND'] in settings.CACHES. The default local-memory cache
+is per process, so with several server processes use a shared one (the
+'shared' file-based cache, a database cache on SQLite, ...), or each
+process may serve its own copy until it expires.
+"""
+import collections
+import threading
+import time
+
+from django.db import transaction
+
+
+class SummaryCache:
+    """Versioned per-student entries in a Django cache, with hit and staleness counters."""
+
+    def __init__(self, cache, timeout=600):
+        self.cache = cache
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+        self.invalidations = 0
+        self.served_age_total = 0.0
+        self.served_age_max = 0.0
+
+    @staticmethod
+    def _version_keys(enrollment_no, semester):
+        return [f"summary:v:student:{enrollment_no}", f"summary:v:sem:{semester}", "summary:v:all"]
+
+    def _versions(self, enrollment_no, semester):
+        keys = self._version_keys(enrollment_no, semester)
+        versions = self.cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # Start from the clock rather than 0, so a version that was evicted
+                # can never come back with a number an old entry was stored under.
+                self.cache.add(key, time.time_ns(), None)
+                versions[key] = self.cache.get(key)
+        return '.'.join(str(versions[key]) for key in keys)
+
+    def get_or_build(self, name, enrollment_no, semester, build):
+        """Returns the cached payload `name` of a student, calling `build()` to make it on a miss."""
+        key = f"summary:{name}:{enrollment_no}:{self._versions(enrollment_no, semester)}"
+        entry = self.cache.get(key)
+        if entry is not None:
+            age = time.time() - entry['built']
+            with self._lock:
+                self.hits[name] += 1
+                self.served_age_total += age
+                self.served_age_max = max(self.served_age_max, age)
+            return entry['data']
+
+        with self._lock:
+            self.misses[name] += 1
+        data = build()
+        self.cache.set(key, {'built': time.time(), 'data': data}, self.timeout)
+        return data
+
+    def _bump(self, key):
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # Not there yet: the next lookup starts it from the clock anyway.
+            pass
+        with self._lock:
+            self.invalidations += 1
+
+    def invalidate_student(self, enrollment_no):
+        self._bump(f"summary:v:student:{enrollment_no}")
+
+    def invalidate_semester(self, semester):
+        self._bump(f"summary:v:sem:{semester}")
+
+    def invalidate_all(self):
+        self._bump("summary:v:all")
+
+    def stats(self):
+        with self._lock:
+            hits = sum(self.hits.values())
+            lookups = hits + sum(self.misses.values())
+            return {
+                'hits': hits,
+                'misses': lookups - hits,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                # How old the served entries were, i.e. how stale a hit can be.
+                'mean_served_age': round(self.served_age_total / hits, 2) if hits else 0.0,
+                'max_served_age': round(self.served_age_max, 2),
+                'timeout': self.timeout,
+                'views': {
+                    name: {'hits': self.hits[name], 'misses': self.misses[name]}
+                    for name in sorted(set(self.hits) | set(self.misses))
+                },
+            }
+
+
+def invalidate_on_commit(students=(), semesters=(), everything=False):
+    """Bumps the given versions once the current transaction commits (right away outside of one)."""
+    students, semesters = list(students), list(semesters)
+
+    def bump():
+        cache = get_summary_cache()
+        for enrollment_no in students:
+            cache.invalidate_student(enrollment_no)
+        for semester in semesters:
+            cache.invalidate_semester(semester)
+        if everything:
+            cache.invalidate_all()
+
+    transaction.on_commit(bump)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_summary_cache():
+    """Returns the process-wide summary cache, creating it from settings on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from django.conf import settings
+                from django.core.cache import caches
+                config = getattr(settings, 'SUMMARY_CACHE', {})
+                _cache = SummaryCache(
+                    caches[config.get('BACKEND', 'default')],
+                    timeout=config.get('TIMEOUT', 600),
+                )
+    return _cache
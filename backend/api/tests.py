@@ -1,3 +1,739 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import gzip
+import hashlib
+import hmac
+import io
+import json
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import exports, note_storage, serializers
+from .code_runner import CRASH, FAIL, PASS, TIMEOUT, RunnerPool, verdict
+from .judge_queue import PRIORITY_FINAL, PRIORITY_PRACTICE, get_judge_queue
+from .verdict_cache import VerdictCache
+from .leaderboard import get_leaderboards
+from .principal_cache import get_principal_cache
+from .summary_cache import get_summary_cache
+from .models import (
+    Attendance, AttendanceEvent, CurrentSemMarks, ExamPaper, ExamResult, Faculty, NoteBlob, Notes, PastMarks, ProctoringIncident, StudentData, SubjectDetails,
+)
+
+STUDENT_LOGIN = ('1@example.com', '1234', 'student')
+FACULTY_LOGIN = ('f@example.com', '1111', 'faculty')
+
+
+def create_student(enrollment_no, semester=5):
+    return StudentData.objects.create(
+        enrollment_no=enrollment_no, name=f'Student {enrollment_no}', gender='M', branch='CE',
+        semester=semester, contact_no=1, email_id=f'{enrollment_no}@example.com', parents_contact=1, pin=1234,
+    )
+
+
+def create_faculty():
+    return Faculty.objects.create(fac_id=7, fac_name='Faculty', fac_mail='f@example.com', sem=5, pin=1111)
+
+
+def logged_in_client(email, pin, role):
+    """An APIClient holding the token of the given user; the login response is kept on it as `profile`."""
+    client = APIClient()
+    response = client.post('/api/login/', {'email': email, 'pin': pin, 'role': role}, format='json')
+    client.credentials(HTTP_AUTHORIZATION='Bearer ' + response.data['token'])
+    client.profile = response.data['user']
+    return client
+
+
+class LoggedInTestCase(TestCase):
+    """Tests whose `self.client` is logged in as `login` (email, pin, role)."""
+    login = STUDENT_LOGIN
+
+    def setUp(self):
+        self.client = logged_in_client(*self.login)
+
+
+class CodeRunnerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.pool = RunnerPool(size=1, timeout=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+        super().tearDownClass()
+
+    def test_timeout_and_exit_codes(self):
+        results = self.pool.run_batch('import sys\nn = int(input())\nwhile n == 0: pass\nsys.exit(n - 1 or None)', ['0', '1', '4'])
+        self.assertEqual([r['timed_out'] for r in results], [True, False, False])
+        self.assertEqual([r['returncode'] for r in results], [None, 0, 3])
+
+        result = self.pool.run('import sys\nsys.exit("bye")')
+        self.assertEqual((result['returncode'], result['stderr'].strip()), (1, 'bye'))
+
+    def test_batch_runs_each_case_on_its_own(self):
+        reported = []
+        results = self.pool.run_batch(
+            'import os, signal\nn = int(input())\nif n == 2: os.kill(os.getpid(), signal.SIGKILL)\nprint(n * 10)',
+            ['1', '2', '3'], on_result=lambda i, result: reported.append(i),
+        )
+        self.assertEqual([r['stdout'] for r in results], ['10\n', '', '30\n'])
+        self.assertEqual(reported, [0, 1, 2])
+        self.assertEqual(
+            [verdict(r, out) for r, out in zip(results, ['10', '20', '31'])], [PASS, CRASH, FAIL],
+        )
+        self.assertEqual(verdict(self.pool.run('while True: pass'), ''), TIMEOUT)
+
+        results = self.pool.run_batch('print(', ['1', '2'])
+        self.assertEqual([r['returncode'] for r in results], [1, 1])
+        self.assertIn('SyntaxError', results[1]['stderr'])
+
+    def test_stdio_like_a_standalone_program(self):
+        programs = [
+            'import sys\nsys.stdout.buffer.write(sys.stdin.buffer.read().upper())',
+            'print(open(0).read().upper(), end="")',
+            'import os\nos.write(1, os.read(0, 100).upper())',
+            'import sys\nprint(sys.stdin.readline().strip().upper())\nsys.stdout.flush()',
+        ]
+        for code in programs:
+            result = self.pool.run(code, 'abc\n')
+            self.assertEqual((result['stdout'], result['returncode']), ('ABC\n', 0), code)
+        self.assertEqual(self.pool.run('print("é" * 2)')['stdout'], 'éé\n')
+
+    def test_state_does_not_leak_between_jobs(self):
+        leaks = [
+            'import math\nmath.sqrt = lambda x: 0',
+            'import collections\ncollections.OrderedDict.x = 1',
+            'import sys\nsys.setrecursionlimit(50)',
+            'import builtins\nbuiltins.print = lambda *args, **kwargs: None',
+            'import threading, time\n'
+            'def chatter():\n    while True:\n        print("leak")\n        time.sleep(0.001)\n'
+            'threading.Thread(target=chatter, daemon=True).start()',
+        ]
+        check = 'import collections, math, sys\nprint(math.sqrt(4), sys.getrecursionlimit() > 50, hasattr(collections.OrderedDict, "x"))'
+        for code in leaks:
+            self.pool.run(code)
+            self.assertEqual(self.pool.run(check)['stdout'], '2.0 True False\n', code)
+
+
+class RunCodePriorityTests(LoggedInTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_student(1)
+        cls.paper = ExamPaper.objects.create(
+            subject_id=1, sem=5, mcq_ques={}, code_question='Echo', test_output_2=[{'Input': '1', 'Output': '1'}],
+        )
+
+    def setUp(self):
+        caches['default'].clear()
+        super().setUp()
+
+    def priority(self, code, final=True):
+        response = self.client.post(
+            '/api/run-code/', {'code': code, 'exam_paper_id': self.paper.id, 'final': final}, format='json'
+        )
+        return get_judge_queue().get(response.data['job_id']).priority
+
+    def test_one_final_run_per_paper(self):
+        self.assertEqual(self.priority('print(input())'), PRIORITY_FINAL)
+        self.assertEqual(self.priority('print(input().strip())'), PRIORITY_PRACTICE)
+
+    def test_no_final_run_after_submission(self):
+        ExamResult.objects.create(enrollment_no=1, subject_id=1, code_marks=0, mcq_marks=0, test_name='T1')
+        self.assertEqual(self.priority('print(input())'), PRIORITY_PRACTICE)
+
+
+class VerdictCacheTests(SimpleTestCase):
+    def case(self, error=''):
+        return [{'case': 0, 'verdict': 'crash' if error else 'pass', 'output': '', 'error': error, 'elapsed': 0.01}]
+
+    def test_formatting_shares_clean_verdicts_only(self):
+        cache = VerdictCache()
+        test_cases = [{'Input': '', 'Output': '1'}]
+        code, reformatted = 'print(1)\n', '# mine\n\nprint(1)\n'
+        key = cache.make_key(1, test_cases, code)
+        self.assertEqual(key, cache.make_key(1, test_cases, reformatted))
+
+        cache.set(key, self.case(), code)
+        self.assertEqual(cache.get(key, reformatted), self.case())
+
+        key = cache.make_key(1, test_cases, 'x\n')
+        cache.set(key, self.case('NameError on line 1'), 'x\n')
+        self.assertIsNone(cache.get(key, '\nx\n'))
+        self.assertEqual(cache.get(key, 'x\n'), self.case('NameError on line 1'))
+
+
+def use_temporary_note_storage(test):
+    """Points the note storage at a directory removed after the test; returns the store."""
+    root = tempfile.TemporaryDirectory()
+    test.addCleanup(root.cleanup)
+    patcher = override_settings(NOTES_STORAGE={
+        'BACKEND': 'api.note_storage.LocalContentStore', 'OPTIONS': {'root': root.name},
+    })
+    patcher.enable()
+    test.addCleanup(patcher.disable)
+    note_storage._storage = None
+    test.addCleanup(setattr, note_storage, '_storage', None)
+    return note_storage.LocalContentStore(root.name)
+
+
+class NoteBlobTests(TestCase):
+    def setUp(self):
+        self.storage = use_temporary_note_storage(self)
+
+    def upload(self, content=b'lecture notes' * 100):
+        file_obj = io.BytesIO(content)
+        stored = self.storage.save(file_obj)
+        with self.captureOnCommitCallbacks(execute=True):
+            note_storage.acquire_blob(stored, file_obj)
+        return stored.digest
+
+    def release(self, digest):
+        with self.captureOnCommitCallbacks() as callbacks:
+            note_storage.release_blob(digest)
+        return callbacks
+
+    def test_removed_with_the_last_note(self):
+        digest = self.upload()
+        self.assertEqual(self.upload(), digest)
+        self.assertEqual(NoteBlob.objects.get().ref_count, 2)
+
+        for callback in self.release(digest):
+            callback()
+        self.assertTrue(self.storage.exists(digest))
+        for callback in self.release(digest):
+            callback()
+        self.assertFalse(NoteBlob.objects.exists())
+        self.assertFalse(self.storage.exists(digest))
+
+    def test_upload_between_release_and_delete_keeps_the_file(self):
+        digest = self.upload()
+        callbacks = self.release(digest)
+        # The same document is uploaded again before the release's delete runs.
+        self.upload()
+        for callback in callbacks:
+            callback()
+        self.assertTrue(self.storage.exists(digest))
+        self.assertEqual(NoteBlob.objects.get().ref_count, 1)
+
+    def test_stored_once_and_compressed_when_worthwhile(self):
+        text, noise = b'lecture notes' * 10000, os.urandom(100000)
+        first, again = self.storage.save(io.BytesIO(text)), self.storage.save(io.BytesIO(text))
+        self.assertEqual(again.digest, first.digest)
+        self.assertTrue(first.compressed)
+        self.assertLess(first.stored_size, len(text) / 10)
+        self.assertFalse(self.storage.save(io.BytesIO(noise)).compressed)
+        for content in (text, noise):
+            with self.storage.open(hashlib.sha256(content).hexdigest()) as f:
+                self.assertEqual(f.read(), content)
+
+    def test_range_download(self):
+        content = b'0123456789' * 10000
+        stored = self.storage.save(io.BytesIO(content))
+
+        def download(**headers):
+            request = RequestFactory().get('/', headers=headers)
+            response = note_storage.document_response(request, stored.digest, stored.size, 'n.pdf', self.storage)
+            return response.status_code, b''.join(getattr(response, 'streaming_content', []))
+
+        self.assertEqual(download(), (200, content))
+        self.assertEqual(download(Range='bytes=5-14'), (206, b'5678901234'))
+        self.assertEqual(download(Range='bytes=-3'), (206, b'789'))
+        self.assertEqual(download(Range='bytes=99998-'), (206, b'89'))
+        self.assertEqual(download(Range='bytes=200000-')[0], 416)
+        self.assertEqual(download(Range='bytes=0-1', If_Range='"other"'), (200, content))
+        self.assertEqual(download(If_None_Match=f'"{stored.digest}"')[0], 304)
+
+
+class NotesUploadTests(LoggedInTestCase):
+    login = FACULTY_LOGIN
+
+    @classmethod
+    def setUpTestData(cls):
+        create_faculty()
+
+    def setUp(self):
+        self.storage = use_temporary_note_storage(self)
+        super().setUp()
+
+    def upload(self, content):
+        return self.client.post('/api/notes/', {
+            'doc': SimpleUploadedFile('notes.pdf', content), 'subject_name': 'Maths', 'desc': 'Unit 1',
+        })
+
+    def test_failed_note_leaves_no_document_behind(self):
+        self.assertEqual(self.upload(b'shared notes').status_code, 201)
+
+        with mock.patch.object(serializers.NotesUploadSerializer, 'save', side_effect=DatabaseError('disk full')):
+            for content in (b'new notes', b'shared notes'):
+                with self.assertRaises(DatabaseError):
+                    self.upload(content)
+
+        self.assertFalse(self.storage.exists(hashlib.sha256(b'new notes').hexdigest()))
+        # The document of the note that was created stays, still used once.
+        self.assertTrue(self.storage.exists(hashlib.sha256(b'shared notes').hexdigest()))
+        self.assertEqual(list(NoteBlob.objects.values_list('ref_count', flat=True)), [1])
+        self.assertEqual(Notes.objects.count(), 1)
+
+
+class MarkAttendanceTests(LoggedInTestCase):
+    login = FACULTY_LOGIN
+
+    @classmethod
+    def setUpTestData(cls):
+        create_faculty()
+        SubjectDetails.objects.create(subject_id=1, subject_name='Maths', sem=5)
+        for enrollment_no in range(1, 4):
+            create_student(enrollment_no)
+
+    def mark(self, attendance, subject_id=1):
+        return self.client.post(
+            '/api/mark-attendance/', {'subject_id': subject_id, 'attendance': attendance}, format='json'
+        )
+
+    def test_enrollment_numbers_as_strings(self):
+        response = self.mark([
+            {'enrollment_no': '1', 'status': 'present'}, {'enrollment_no': 2, 'status': 'absent'},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            sorted(Attendance.objects.values_list('enrollment_no', 'total_lectures', 'total_attended')),
+            [(1, 1, 1), (2, 1, 0)],
+        )
+        # Once per day per subject.
+        self.assertEqual(self.mark([{'enrollment_no': 1, 'status': 'present'}]).status_code, 400)
+
+    def test_invalid_entries(self):
+        self.assertEqual(self.mark([{'enrollment_no': 'one', 'status': 'present'}]).status_code, 400)
+        self.assertEqual(self.mark([{'status': 'present'}]).status_code, 400)
+        self.assertEqual(self.mark([{'enrollment_no': 1, 'status': 'present'}], subject_id='maths').status_code, 400)
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_report(self):
+        self.mark([{'enrollment_no': 1, 'status': 'present'}, {'enrollment_no': 2, 'status': 'absent'}])
+        data = self.client.get('/api/attendance-report/?subject_id=1&missed_only=1').data
+        self.assertEqual([(row['enrollment_no'], row['missed']) for row in data['students']], [(2, 1)])
+        self.assertEqual(self.client.get('/api/attendance-report/?subject_id=x').status_code, 400)
+
+    def test_rebuild_keeps_the_last_marked_date(self):
+        AttendanceEvent.objects.create(
+            enrollment_no=3, subject_id=1, semester=5, date=datetime.date(2026, 1, 5), present=True,
+        )
+        call_command('rebuild_attendance_rollups', stdout=io.StringIO())
+        record = Attendance.objects.get(enrollment_no=3)
+        self.assertEqual((record.total_lectures, record.total_attended), (1, 1))
+        self.assertEqual(record.attd_date, datetime.date(2026, 1, 5))
+
+    def test_rebuild_invalidates_the_cached_dashboard(self):
+        self.mark([{'enrollment_no': 1, 'status': 'present'}])
+        self.assertEqual(self.client.get('/api/student-dashboard-summary/1/').data['overall_attendance'], 100)
+
+        AttendanceEvent.objects.create(
+            enrollment_no=1, subject_id=1, semester=5, date=datetime.date(2026, 1, 5), present=False,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_attendance_rollups', stdout=io.StringIO())
+        self.assertEqual(self.client.get('/api/student-dashboard-summary/1/').data['overall_attendance'], 50)
+
+
+class StudentDashboardSummaryTests(LoggedInTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for enrollment_no in range(1, 21):
+            create_student(enrollment_no)
+            CurrentSemMarks.objects.create(
+                enrollment_number=enrollment_no, subject_id=1, current_sem=5,
+                t1_marks=enrollment_no % 5, t2_marks=10, t3_marks=0,
+            )
+        for subject_id in range(1, 6):
+            SubjectDetails.objects.create(subject_id=subject_id, subject_name=f'Subject {subject_id}', sem=5)
+            Attendance.objects.create(
+                enrollment_no=1, semester=5, subject_id=subject_id, subject_name=f'Subject {subject_id}',
+                total_lectures=10, total_attended=5 + subject_id,
+            )
+            ExamPaper.objects.create(
+                subject_id=subject_id, sem=5, mcq_ques=[],
+                code_question='print(1)' if subject_id % 2 else '',
+            )
+        ExamResult.objects.create(enrollment_no=1, subject_id=1, code_marks=5, mcq_marks=5, test_name='T1')
+
+    def setUp(self):
+        get_leaderboards().invalidate()
+        get_summary_cache().cache.clear()
+        get_principal_cache().clear()
+        super().setUp()
+
+    def test_summary(self):
+        data = self.client.get('/api/student-dashboard-summary/1/').data
+
+        # Totals are 11, 12, 13, 14, 10, 11, ...: twelve students score above 11.
+        self.assertEqual(data['department_rank'], 13)
+        self.assertEqual(data['overall_attendance'], 80)
+        self.assertEqual(
+            data['low_attendance_subjects'],
+            [{'name': 'Subject 1', 'percentage': 60}, {'name': 'Subject 2', 'percentage': 70}],
+        )
+        self.assertEqual(len(data['current_subjects']), 5)
+        self.assertEqual(data['upcoming_exams'], 4)
+        self.assertEqual(data['pending_assignments'], 2)
+
+    def test_summary_query_count(self):
+        # Attendance, subjects and exam counts (plus building the semester
+        # leaderboard, the first time); the login left the user in the principal cache.
+        get_leaderboards().rank(5, 1)
+        with self.assertNumQueries(3):
+            self.client.get('/api/student-dashboard-summary/1/')
+
+        # Served from the summary cache, by a user the authentication has already seen.
+        with self.assertNumQueries(0):
+            self.client.get('/api/student-dashboard-summary/1/')
+
+    def test_summary_invalidated_by_writes(self):
+        self.assertEqual(self.client.get('/api/student-dashboard-summary/1/').data['upcoming_exams'], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ExamResult.objects.create(enrollment_no=1, subject_id=2, code_marks=5, mcq_marks=5, test_name='T1')
+        self.assertEqual(self.client.get('/api/student-dashboard-summary/1/').data['upcoming_exams'], 3)
+
+    def test_explain_queries_replays_the_view_queries(self):
+        out = io.StringIO()
+        call_command('explain_queries', '--verbose-plans', stdout=out)
+        self.assertIn('dashboard.attendance', out.getvalue())
+        self.assertIn('dashboard.exam_counts', out.getvalue())
+
+
+class PrincipalCacheTests(LoggedInTestCase):
+    login = FACULTY_LOGIN
+
+    @classmethod
+    def setUpTestData(cls):
+        create_faculty()
+
+    def setUp(self):
+        get_principal_cache().clear()
+        super().setUp()
+
+    def test_known_user_costs_no_query(self):
+        self.client.get('/api/cache-stats/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/cache-stats/').status_code, 200)
+
+    def test_deleted_user_is_rejected(self):
+        self.client.get('/api/cache-stats/')
+        Faculty.objects.filter(fac_id=7).get().delete()
+        self.assertEqual(self.client.get('/api/cache-stats/').status_code, 403)
+
+
+class VerifyTokenTests(LoggedInTestCase):
+    login = FACULTY_LOGIN
+
+    @classmethod
+    def setUpTestData(cls):
+        create_faculty()
+
+    def setUp(self):
+        get_principal_cache().clear()
+        super().setUp()
+
+    def test_answers_from_the_principal_cache(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/verify-token/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, self.client.profile)
+
+        get_principal_cache().clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/verify-token/').data, self.client.profile)
+
+    def test_token_holds_no_contact_details(self):
+        create_student(1)
+        student = logged_in_client(*STUDENT_LOGIN)
+        token = student._credentials['HTTP_AUTHORIZATION'].split()[1]
+        payload = json.loads(base64.urlsafe_b64decode(token.split('.')[1] + '=='))
+        self.assertEqual(set(payload), {'id', 'role', 'name', 'semester', 'exp', 'iat'})
+        self.assertEqual((payload['name'], payload['semester']), ('Student 1', 5))
+
+    def test_full_profile_etag(self):
+        response = self.client.get('/api/verify-token/?full=1')
+        self.assertEqual(response.data, self.client.profile)
+        etag = response['ETag']
+
+        response = self.client.get('/api/verify-token/?full=1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Faculty.objects.filter(fac_id=7).update(fac_name='Renamed')
+        response = self.client.get('/api/verify-token/?full=1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['fac_name'], 'Renamed')
+
+    def test_bad_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertEqual(self.client.get('/api/verify-token/').status_code, 401)
+
+
+class ExamListTests(LoggedInTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_student(1)
+        for subject_id in range(1, 8):
+            ExamPaper.objects.create(
+                subject_id=subject_id, sem=5 if subject_id < 7 else 3, mcq_ques={},
+                code_question='print(1)', test_output_2=[{'Input': '', 'Output': '1'}],
+            )
+            ExamResult.objects.create(enrollment_no=1 + subject_id % 2, subject_id=subject_id, code_marks=1, mcq_marks=1, test_name='T1')
+
+    def test_papers_are_paginated_without_hidden_test_cases(self):
+        data = self.client.get('/api/exam-papers/?page_size=4').data
+        self.assertEqual(len(data['results']), 4)
+        self.assertNotIn('test_output_2', data['results'][0])
+
+        data = self.client.get(data['next']).data
+        self.assertEqual([paper['subject_id'] for paper in data['results']], [5, 6])
+        self.assertIsNone(data['next'])
+
+    def test_sparse_fields_and_filters(self):
+        data = self.client.get('/api/exam-papers/?fields=id,subject_id&subject_id=2').data
+        self.assertEqual(data['results'], [{'id': ExamPaper.objects.get(subject_id=2).id, 'subject_id': 2}])
+
+    def test_students_only_see_their_results(self):
+        data = self.client.get('/api/exam-results/?fields=subject_id').data
+        self.assertEqual([result['subject_id'] for result in data['results']], [2, 4, 6])
+
+
+class FacultyResultsTests(LoggedInTestCase):
+    login = FACULTY_LOGIN
+
+    @classmethod
+    def setUpTestData(cls):
+        create_faculty()
+        SubjectDetails.objects.create(subject_id=1, subject_name='Maths', sem=5)
+        for enrollment_no in range(1, 6):
+            create_student(enrollment_no)
+            ExamResult.objects.create(
+                enrollment_no=enrollment_no, subject_id=1, code_marks=enrollment_no, mcq_marks=2, test_name='T1'
+            )
+        # A student of another semester is left out.
+        ExamResult.objects.create(enrollment_no=99, subject_id=1, code_marks=9, mcq_marks=9, test_name='T9')
+
+    def test_exam_names(self):
+        self.assertEqual(self.client.get('/api/faculty-results/').data, ['T1'])
+
+    def test_sorted_page_with_joined_names(self):
+        data = self.client.get('/api/faculty-results/?exam_name=T1&ordering=-total_marks&page_size=2').data
+        self.assertEqual(
+            [(row['student_name'], row['subject_name'], row['total_marks']) for row in data['results']],
+            [('Student 5', 'Maths', 7), ('Student 4', 'Maths', 6)],
+        )
+        totals = [row['total_marks'] for row in data['results']]
+        while data['next']:
+            data = self.client.get(data['next']).data
+            totals += [row['total_marks'] for row in data['results']]
+        self.assertEqual(totals, [7, 6, 5, 4, 3])
+
+    def test_aggregate(self):
+        data = self.client.get('/api/faculty-results/?aggregate=1').data
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['test_name'], 'T1')
+        self.assertEqual(data[0]['code_marks']['median'], 3)
+        self.assertEqual(data[0]['code_marks']['p90'], 4.6)  # Interpolated like np.percentile.
+        self.assertEqual(data[0]['total_marks']['mean'], 5)
+
+
+class ClassAnalyticsTests(LoggedInTestCase):
+    login = FACULTY_LOGIN
+
+    @classmethod
+    def setUpTestData(cls):
+        create_faculty()
+        for enrollment_no in range(1, 11):
+            create_student(enrollment_no)
+            # Student 1 starts well and then falls behind everyone else.
+            t1, t2, t3 = (20, 10, 2) if enrollment_no == 1 else (10, 12, 14 + enrollment_no % 3)
+            CurrentSemMarks.objects.create(
+                enrollment_number=enrollment_no, subject_id=1, current_sem=5, t1_marks=t1, t2_marks=t2, t3_marks=t3,
+            )
+
+    def setUp(self):
+        get_summary_cache().cache.clear()
+        super().setUp()
+
+    def test_statistics_and_at_risk(self):
+        data = self.client.get('/api/class-analytics/').data
+        self.assertEqual(data['students'], 10)
+        self.assertEqual(data['current_marks']['t1']['percentiles']['p50'], 10)
+        self.assertEqual(data['progression']['declining_rows'], 1)
+        self.assertEqual([student['enrollment_no'] for student in data['at_risk']], [1])
+        self.assertEqual(data['at_risk'][0]['reasons'], ['low_current_marks', 'declining'])
+
+    def test_cached_until_marks_change(self):
+        self.assertFalse(self.client.get('/api/class-analytics/').data['cached'])
+        self.assertTrue(self.client.get('/api/class-analytics/').data['cached'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CurrentSemMarks.objects.filter(enrollment_number=2).get().delete()
+        data = self.client.get('/api/class-analytics/').data
+        self.assertFalse(data['cached'])
+        self.assertEqual(data['current_marks']['t1']['count'], 9)
+
+    def test_marks_invalidate_the_semester_of_the_student(self):
+        self.client.get('/api/class-analytics/')
+        # A row left over from last semester still counts towards the student's semester now.
+        with self.captureOnCommitCallbacks(execute=True):
+            CurrentSemMarks.objects.create(
+                enrollment_number=2, subject_id=2, current_sem=4, t1_marks=5, t2_marks=5, t3_marks=5,
+            )
+        data = self.client.get('/api/class-analytics/').data
+        self.assertFalse(data['cached'])
+        self.assertEqual(data['current_marks']['t1']['count'], 11)
+
+
+class ExportTests(LoggedInTestCase):
+    login = FACULTY_LOGIN
+
+    @classmethod
+    def setUpTestData(cls):
+        create_faculty()
+        SubjectDetails.objects.create(subject_id=1, subject_name='Maths', sem=5)
+        for enrollment_no, semester in [(1, 5), (2, 5), (3, 5), (4, 6)]:
+            create_student(enrollment_no, semester)
+            ExamResult.objects.create(
+                enrollment_no=enrollment_no, subject_id=1, code_marks=enrollment_no, mcq_marks=10, test_name='T1',
+            )
+
+    def test_rows_are_read_in_batches(self):
+        chunks = list(exports.iter_chunks(exports._exam_results(5), ['enrollment_no'], chunk_size=2))
+        self.assertEqual(chunks, [[(1,), (2,)], [(3,)]])
+
+    def test_csv_of_the_semester(self):
+        response = self.client.get('/api/export/exam-results/')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:2], ['Enrollment No', 'Student'])
+        self.assertEqual(rows[1], ['1', 'Student 1', '1', 'Maths', 'T1', '1', '10', '11'])
+        self.assertEqual([row[0] for row in rows[1:]], ['1', '2', '3'])
+
+        response = self.client.get('/api/export/exam-results/?semester=6&gzip=1')
+        text = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertEqual(text.splitlines()[1:], ['4,Student 4,1,Maths,T1,4,10,14'])
+
+    def test_xlsx_and_bad_requests(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get('/api/export/exam-results/?filetype=xlsx')
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual(sheet.max_row, 4)
+        self.assertEqual(self.client.get('/api/export/grades/').status_code, 404)
+        self.assertEqual(self.client.get('/api/export/attendance/?semester=five').status_code, 400)
+        self.assertEqual(self.client.get('/api/export/attendance/?filetype=pdf').status_code, 400)
+
+
+class MarksImportTests(LoggedInTestCase):
+    login = FACULTY_LOGIN
+
+    @classmethod
+    def setUpTestData(cls):
+        create_faculty()
+        SubjectDetails.objects.create(subject_id=1, subject_name='Maths', sem=5)
+        for enrollment_no in range(1, 4):
+            create_student(enrollment_no)
+        CurrentSemMarks.objects.create(
+            enrollment_number=1, subject_id=1, current_sem=5, t1_marks=1, t2_marks=1, t3_marks=1,
+        )
+
+    def test_upsert_with_row_errors(self):
+        rows = [
+            {'enrollment_no': 1, 'subject_id': 1, 'current_sem': 5, 't1_marks': 20, 't2_marks': 18, 't3_marks': 19},
+            {'enrollment_no': 2, 'subject_id': 1, 'current_sem': 5, 't1_marks': 10, 't2_marks': 11, 't3_marks': 12},
+            {'enrollment_no': 99, 'subject_id': 1, 'current_sem': 5, 't1_marks': 1, 't2_marks': 1, 't3_marks': 1},
+            {'enrollment_no': 3, 'subject_id': 1, 'current_sem': 5, 't1_marks': 'x', 't2_marks': 1, 't3_marks': 1},
+        ]
+        data = self.client.post('/api/marks-import/current/', rows, format='json').data
+        self.assertEqual((data['imported'], data['failed']), (2, 2))
+        self.assertEqual([error['row'] for error in data['errors']], [3, 4])
+        self.assertEqual(CurrentSemMarks.objects.count(), 2)
+        self.assertEqual(CurrentSemMarks.objects.get(enrollment_number=1).t1_marks, 20)
+
+    def test_marks_out_of_range(self):
+        rows = [
+            {'enrollment_no': 2, 'subject_id': 1, 'current_sem': 5, 't1_marks': t1, 't2_marks': 1, 't3_marks': 1}
+            for t1 in ('nan', 'inf', '1e999', -1, 26, 25)
+        ]
+        data = self.client.post('/api/marks-import/current/', rows, format='json').data
+        self.assertEqual((data['imported'], data['failed']), (1, 5))
+        self.assertEqual([error['row'] for error in data['errors']], [1, 2, 3, 4, 5])
+        self.assertIn('between 0 and 25', data['errors'][0]['errors'][0])
+        self.assertEqual(CurrentSemMarks.objects.get(enrollment_number=2).t1_marks, 25)
+
+    def test_csv_dry_run(self):
+        upload = SimpleUploadedFile('marks.csv', b'enrollment_no,semester,subject_id,marks\n2,4,1,55\n2,4,1,60\n')
+        data = self.client.post('/api/marks-import/past/?dry_run=1', {'file': upload}).data
+        self.assertEqual((data['imported'], data['duplicates_replaced']), (1, 1))
+        self.assertFalse(PastMarks.objects.exists())
+
+        self.assertEqual(self.client.post('/api/marks-import/nope/', [], format='json').status_code, 404)
+
+
+@override_settings(PROCTORING={'INGEST_KEY': 'secret'})
+class ProctoringIncidentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_faculty()
+        create_student(1)
+        cls.paper = ExamPaper.objects.create(subject_id=3, sem=5, mcq_ques=[])
+
+    def incident(self, **kwargs):
+        return dict({
+            'session': f'1-{self.paper.id}', 'enrollment_no': 1, 'exam_paper_id': self.paper.id,
+            'type': 'Looking Down', 'label': None, 'started_at': '2026-01-01T10:00:00+00:00',
+            'ended_at': '2026-01-01T10:01:00+00:00', 'frames': 12, 'peak_confidence': 0.8, 'details': 'Head pitch around 70°.',
+        }, **kwargs)
+
+    def ingest(self, incidents, key='secret'):
+        return APIClient().post(
+            '/api/proctoring-incidents/ingest/', {'incidents': incidents}, format='json', HTTP_X_PROCTORING_KEY=key
+        )
+
+    def test_ingest_needs_the_key(self):
+        self.assertEqual(self.ingest([self.incident()], key='wrong').status_code, 403)
+        self.assertFalse(ProctoringIncident.objects.exists())
+
+    def test_linked_on_submit_or_on_ingest(self):
+        response = self.ingest([self.incident(), self.incident(frames='many')])
+        self.assertEqual(response.data['stored'], 1)
+        self.assertEqual([r['index'] for r in response.data['rejected']], [1])
+        self.assertIsNone(ProctoringIncident.objects.get().exam_result)
+
+        client = logged_in_client(*STUDENT_LOGIN)
+        client.post('/api/submit-exam/', {
+            'enrollment_no': 1, 'subject_id': 3, 'code_marks': 5, 'mcq_marks': 5, 'test_name': 'T1',
+        }, format='json')
+        result = ExamResult.objects.get()
+        self.assertEqual(ProctoringIncident.objects.get().exam_result, result)
+
+        # Incidents flushed after the submission are linked straight away.
+        self.ingest([self.incident(type='Object Detected', label='cell phone')])
+        self.assertEqual(result.proctoring_incidents.count(), 2)
+
+        faculty = logged_in_client(*FACULTY_LOGIN)
+        data = faculty.get(f'/api/proctoring-incidents/?exam_result={result.id}').data
+        self.assertEqual([row['label'] for row in data['results']], ['', 'cell phone'])
+        self.assertEqual(client.get('/api/proctoring-incidents/').status_code, 403)
+
+    def test_signed_session(self):
+        client = logged_in_client(*STUDENT_LOGIN)
+        session = client.post('/api/proctoring-session/', {'exam_paper_id': self.paper.id}, format='json').data['session']
+        name, expires, signature = session.split('.')
+        self.assertEqual(name, f'1-{self.paper.id}')
+        expected = hmac.new(b'secret', f'proctoring-session:{name}.{expires}'.encode(), hashlib.sha256).hexdigest()[:32]
+        self.assertEqual(signature, expected)
+
+        self.assertEqual(client.post('/api/proctoring-session/', {'exam_paper_id': 999}, format='json').status_code, 404)
+        faculty = logged_in_client(*FACULTY_LOGIN)
+        self.assertEqual(faculty.post('/api/proctoring-session/', {'exam_paper_id': self.paper.id}, format='json').status_code, 403)
@@ -1,7 +1,7 @@
 from django.urls import path
-from .views import( ExamResultListView, UserDetail, CustomLoginView, VerifyTokenView,ExamPaperListView,RunCodeView,SubmitExamView,AttendanceView,
-                StudentDashboardSummaryView,StudentResultsView,NotesView,NoteDownloadView,SubjectListView,
-                ExamPaperCreateView, BranchListView,StudentByBranchView,MarkAttendanceView,NoteDeleteView,FacultyResultsView,FacultyStudentListView  )
+from .views import( ExamResultListView, UserDetail, CustomLoginView, VerifyTokenView,ExamPaperListView,RunCodeView,RunCodeJobView,RunCodeStreamView,SubmitExamView,AttendanceView,
+                StudentDashboardSummaryView,StudentResultsView,NotesView,NoteDownloadView,NoteStorageStatsView,CacheStatsView,SubjectListView,
+                ExamPaperCreateView, BranchListView,StudentByBranchView,MarkAttendanceView,AttendanceReportView,NoteDeleteView,FacultyResultsView,ClassAnalyticsView,ExportView,MarksImportView,ProctoringIncidentIngestView,ProctoringIncidentListView,ProctoringSessionView,FacultyStudentListView  )
 
 urlpatterns = [
     path('login/', CustomLoginView.as_view(), name='custom_login'),
@@ -9,6 +9,8 @@ urlpatterns = [
     path('user/<int:pk>/', UserDetail.as_view(), name='user_detail'),
     path('exam-papers/', ExamPaperListView.as_view(), name='exam_paper_list'),
     path('run-code/', RunCodeView.as_view(), name='run_code'),
+    path('run-code/<str:job_id>/', RunCodeJobView.as_view(), name='run_code_job'),
+    path('run-code/<str:job_id>/stream/', RunCodeStreamView.as_view(), name='run_code_stream'),
     path('submit-exam/', SubmitExamView.as_view(), name='submit_exam'),
     path('exam-results/', ExamResultListView.as_view(), name='exam_result_list'),
     path('attendance/', AttendanceView.as_view(), name='attendance_list'),
@@ -16,12 +18,21 @@ urlpatterns = [
     path('student-results/', StudentResultsView.as_view(), name='student_results'),
     path('notes/', NotesView.as_view(), name='notes_list_upload'),
     path('notes/<int:pk>/download/', NoteDownloadView.as_view(), name='note_download'),
+    path('notes/storage-stats/', NoteStorageStatsView.as_view(), name='note_storage_stats'),
+    path('cache-stats/', CacheStatsView.as_view(), name='cache_stats'),
     path('subjects/', SubjectListView.as_view(), name='subject-list'),
     path('create-exam/', ExamPaperCreateView.as_view(), name='create-exam'),
     path('students-by-branch/<str:branch>/', StudentByBranchView.as_view(), name='students-by-branch'),
     path('mark-attendance/', MarkAttendanceView.as_view(), name='mark-attendance'),
+    path('attendance-report/', AttendanceReportView.as_view(), name='attendance-report'),
     path('branches/', BranchListView.as_view(), name='branch-list'),
     path('notes/<int:pk>/delete/', NoteDeleteView.as_view(), name='note_delete'),
     path('faculty-results/', FacultyResultsView.as_view(), name='faculty-results'),
+    path('class-analytics/', ClassAnalyticsView.as_view(), name='class-analytics'),
+    path('export/<str:dataset>/', ExportView.as_view(), name='export'),
+    path('marks-import/<str:kind>/', MarksImportView.as_view(), name='marks-import'),
+    path('proctoring-incidents/', ProctoringIncidentListView.as_view(), name='proctoring-incidents'),
+    path('proctoring-incidents/ingest/', ProctoringIncidentIngestView.as_view(), name='proctoring-incidents-ingest'),
+    path('proctoring-session/', ProctoringSessionView.as_view(), name='proctoring-session'),
     path('faculty-students/', FacultyStudentListView.as_view(), name='faculty-student-list'),
 ]
@@ -0,0 +1,176 @@
+# api/verdict_cache.py
+"""
+A cache of judge verdicts, so unchanged code is not run again.
+
+Students press "Run" many times on the same code, and many submit the same
+reference solution. A verdict only depends on the code and on the test cases
+of the paper, so we key the cache on:
+
+    (exam paper id, version of its test cases, hash of the normalized code)
+
+Runs where a case wrote to stderr are the exception: a traceback quotes line
+numbers and source lines, which comments and blank lines do change, so those
+verdicts are keyed on the exact code instead (see exact_key).
+
+The version is a hash of the test cases themselves, so an edited paper can
+never be served an old verdict. When a paper is saved or deleted (create view,
+admin, ...) its entries are also dropped from memory through a signal.
+
+Entries live in a bounded in-process LRU. If VERDICT_CACHE['SHARED_BACKEND']
+names one of settings.CACHES (e.g. a file-based cache), entries are also
+written there so all server processes can share them.
+"""
+import collections
+import hashlib
+import io
+import json
+import threading
+import tokenize
+
+from .code_runner import TIMEOUT
+
+
+def normalize_code(code):
+    """
+    Returns `code` without comments, blank lines or insignificant whitespace,
+    so two submissions that only differ in formatting get the same hash.
+    Falls back to stripping trailing whitespace if the code does not tokenize.
+    """
+    parts = []
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(code).readline):
+            if token.type in (tokenize.COMMENT, tokenize.NL):
+                continue
+            if token.type in (tokenize.INDENT, tokenize.DEDENT):
+                # The width of an indent does not matter, only where it is.
+                parts.append(tokenize.tok_name[token.type])
+            else:
+                parts.append(token.string)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        lines = [line.rstrip() for line in code.splitlines()]
+        return '\n'.join(line for line in lines if line)
+    return ' '.join(parts)
+
+
+def code_hash(code):
+    return hashlib.sha256(normalize_code(code).encode('utf-8')).hexdigest()
+
+
+def test_cases_version(test_cases):
+    """A short hash of the test cases; changes whenever any input or output changes."""
+    dump = json.dumps(test_cases, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(dump.encode('utf-8')).hexdigest()[:16]
+
+
+def has_errors(cases):
+    """True if any case wrote to stderr, whose text depends on the exact code."""
+    return any(case['error'] for case in cases)
+
+
+def is_cacheable(cases):
+    """A timeout depends on server load as much as on the code, so runs with one are not cached."""
+    return not any(case['verdict'] == TIMEOUT for case in cases)
+
+
+class VerdictCache:
+    """A bounded LRU of case verdicts with hit/miss counters."""
+
+    def __init__(self, max_entries=5000, shared_cache=None, shared_timeout=3600):
+        self.max_entries = max_entries
+        self.shared_cache = shared_cache
+        self.shared_timeout = shared_timeout
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(exam_paper_id, test_cases, code):
+        return f"verdict:{exam_paper_id}:{test_cases_version(test_cases)}:{code_hash(code)}"
+
+    @staticmethod
+    def exact_key(key, code):
+        """The key of a run with errors: `key` narrowed down to this exact code."""
+        return f"{key}:{hashlib.sha256(code.encode('utf-8')).hexdigest()}"
+
+    def _lookup(self, key):
+        with self._lock:
+            cases = self._entries.get(key)
+            if cases is not None:
+                self._entries.move_to_end(key)
+                return cases
+
+        if self.shared_cache is not None:
+            cases = self.shared_cache.get(key)
+            if cases is not None:
+                self._store(key, cases)
+                return cases
+        return None
+
+    def get(self, key, code):
+        """The cached cases of `code` (whose make_key() is `key`), or None."""
+        cases = self._lookup(key)
+        if cases is None:
+            cases = self._lookup(self.exact_key(key, code))
+        with self._lock:
+            if cases is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return cases
+
+    def set(self, key, cases, code):
+        if not is_cacheable(cases):
+            return
+        if has_errors(cases):
+            key = self.exact_key(key, code)
+        self._store(key, cases)
+        if self.shared_cache is not None:
+            self.shared_cache.set(key, cases, self.shared_timeout)
+
+    def _store(self, key, cases):
+        with self._lock:
+            self._entries[key] = cases
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_paper(self, exam_paper_id):
+        """Drops every in-process entry of one exam paper."""
+        prefix = f"verdict:{exam_paper_id}:"
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_verdict_cache():
+    """Returns the process-wide verdict cache, creating it from settings on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from django.conf import settings
+                from django.core.cache import caches
+                config = getattr(settings, 'VERDICT_CACHE', {})
+                backend = config.get('SHARED_BACKEND')
+                _cache = VerdictCache(
+                    max_entries=config.get('MAX_ENTRIES', 5000),
+                    shared_cache=caches[backend] if backend else None,
+                    shared_timeout=config.get('SHARED_TIMEOUT', 3600),
+                )
+    return _cache
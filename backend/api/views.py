@@ -3,24 +3,39 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.pagination import CursorPagination
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from django.contrib.auth.models import User
 from django.conf import settings
 from rest_framework import status
 import jwt
+import json
+import hashlib
 import datetime
 from rest_framework.permissions import AllowAny
-import subprocess
-import tempfile
-import sys
-import os
 from datetime import date
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 # --- ADDED IMPORTS FOR THE NEW VIEW ---
-from django.db.models import Sum, F, Window,Value
+from django.db import transaction
+from django.db.models import Sum, F, Window,Value, Case, When, Count, Q
 from django.db.models.functions import Rank, Coalesce
-from .models import( StudentData, Faculty ,ExamPaper,ExamResult,Attendance, 
-                    CurrentSemMarks,SubjectDetails, PastMarks, PracticalMarks, SubjectDetails, Notes)
+from .models import( StudentData, Faculty ,ExamPaper,ExamResult,Attendance, AttendanceEvent,
+                    CurrentSemMarks,SubjectDetails, PastMarks, PracticalMarks, SubjectDetails, Notes, ProctoringIncident)
 # ------------------------------------
+from .judge_queue import claim_final_run, get_judge_queue, iter_events, summarize, TooManyJobs
+from .verdict_cache import get_verdict_cache
+from .note_storage import (
+    get_note_storage, document_response, acquire_blob, release_blob, delete_if_unused, storage_savings, etag_matches,
+)
+from .leaderboard import get_leaderboards
+from . import exports, results_query
+from .marks_import import SPECS, ImportFormatError, import_marks, parse_rows
+from .class_analytics import get_class_analytics
+from .proctoring import ingest_key_matches, link_incidents, sign_session, store_incidents
+from .authentication import decode_token, load_principal
+from .summary_cache import get_summary_cache, invalidate_on_commit
+from .principal_cache import get_principal_cache
 from .serializers import (
     CustomLoginSerializer,
     ExamPaperCreateSerializer,
@@ -37,7 +52,8 @@ from .serializers import (
     SubjectDetailsSerializer,
     NotesListSerializer,
     NotesUploadSerializer,
-    StudentForAttendanceSerializer,NotesUploadSerializer
+    StudentForAttendanceSerializer,NotesUploadSerializer,
+    ProctoringIncidentSerializer,
 )
 
 # This is the new, improved view for your custom login logic.
@@ -94,13 +110,20 @@ class CustomLoginView(APIView):
         if user_data:
             user_data['role'] = role
 
+        # The token is signed, not encrypted: only claims that are fine to be
+        # read by whoever holds it. The rest of the profile is never put in it.
+        issued_at = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
         payload = {
             'id': user_id,
             'role': role,
-            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24),
-            'iat': datetime.datetime.utcnow()
+            'name': user.name if role == 'student' else user.fac_name,
+            'semester': user.semester if role == 'student' else user.sem,
+            'exp': issued_at + 24 * 60 * 60,
+            'iat': issued_at,
         }
         token = jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+        # The user's first requests, starting with VerifyTokenView, need no query.
+        get_principal_cache().set_user(role, user_id, issued_at, user)
 
         return Response({
             'token': token,
@@ -113,10 +136,18 @@ class UserDetail(generics.RetrieveAPIView):
     serializer_class = UserSerializer
 
 class VerifyTokenView(APIView):
-    # This ensures that only requests with a valid token can access this view.
-    # We will need to create a custom permission for this.
-    # For now, let's build the logic.
-    
+    """
+    Tells the frontend whether its token is still valid, and whose it is.
+    - By default the profile is built from the user's row in the principal
+      cache (see principal_cache.py), so a recently seen user costs no
+      database query.
+    - With ?full=1 the profile is read from the database and sent with an
+      ETag; a matching If-None-Match gets 304 Not Modified.
+    """
+    # The token is checked here, so skip the default authentication (and its user lookup).
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
     def get(self, request, *args, **kwargs):
         # The token is sent in the Authorization header. We need to decode it.
         auth_header = request.headers.get('Authorization')
@@ -124,50 +155,124 @@ class VerifyTokenView(APIView):
             return Response({'detail': 'Invalid token header.'}, status=status.HTTP_401_UNAUTHORIZED)
 
         token = auth_header.split(' ')[1]
-        
+
         try:
-            # Decode the token using your SECRET_KEY
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            
-            user_id = payload.get('id')
-            role = payload.get('role')
-
-            user_data = None
-            if role == 'student':
-                student = StudentData.objects.get(enrollment_no=user_id)
-                user_data = StudentDataSerializer(student).data
-            elif role == 'faculty':
-                faculty = Faculty.objects.get(fac_id=user_id)
-                user_data = FacultySerializer(faculty).data
-            
-            if user_data:
-                user_data['role'] = role # Ensure role is in the response
-                return Response(user_data)
-            else:
-                raise Exception("User not found")
+            payload = decode_token(token)
+        except jwt.InvalidTokenError:
+            # Expired or tampered with.
+            return Response({'detail': 'Token is invalid or expired.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        role = payload.get('role')
+        serializer_class = {'student': StudentDataSerializer, 'faculty': FacultySerializer}.get(role)
+        if serializer_class is not None and request.query_params.get('full') not in ('1', 'true'):
+            try:
+                user = load_principal(role, payload.get('id'), payload.get('iat'))
+            except (StudentData.DoesNotExist, Faculty.DoesNotExist):
+                return Response({'detail': 'Token is invalid or expired.'}, status=status.HTTP_401_UNAUTHORIZED)
+            return Response({**serializer_class(user).data, 'role': role})
 
-        except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, Exception) as e:
-            # If the token is expired, invalid, or the user doesn't exist, return an error.
+        user_data = None
+        if role == 'student':
+            student = StudentData.objects.filter(enrollment_no=payload.get('id')).first()
+            user_data = StudentDataSerializer(student).data if student else None
+        elif role == 'faculty':
+            faculty = Faculty.objects.filter(fac_id=payload.get('id')).first()
+            user_data = FacultySerializer(faculty).data if faculty else None
+
+        if not user_data:
             return Response({'detail': 'Token is invalid or expired.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        user_data['role'] = role # Ensure role is in the response
+        dump = json.dumps(user_data, sort_keys=True, default=str).encode('utf-8')
+        etag = f'"{hashlib.sha256(dump).hexdigest()[:32]}"'
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(user_data)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
         
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the primary key: each page is an indexed range scan
+    ("id > last seen id"), however deep the client goes. The response is
+    {"next": url, "previous": url, "results": [...]}; ?page_size= goes up to 200.
+    """
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+class ResultsCursorPagination(IdCursorPagination):
+    """Cursor pages of the faculty results, in the order the client asked for (see FacultyResultsView)."""
+    max_page_size = 500
+
+def _filter_params(request, queryset, fields):
+    """Applies ?<field>=value filters for the given fields; returns None if a value is malformed."""
+    for field, cast in fields.items():
+        value = request.query_params.get(field)
+        if value not in (None, ''):
+            try:
+                queryset = queryset.filter(**{field: cast(value)})
+            except ValueError:
+                return None
+    return queryset
+
 class ExamPaperListView(generics.ListAPIView):
     """
-    This view provides a list of all exam papers from the database.
+    This view provides a paginated list of exam papers.
+    - Filters: ?subject_id=, ?sem= (students only ever see their own semester).
+    - ?fields=id,subject_id,sem to leave out the question bodies.
+    The hidden test cases are not part of the response.
     """
-    queryset = ExamPaper.objects.all()
     serializer_class = ExamPaperSerializer
+    pagination_class = IdCursorPagination
     permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = ExamPaper.objects.all()
+        user = self.request.user
+        if isinstance(user, StudentData):
+            queryset = queryset.filter(sem=user.semester)
+        queryset = _filter_params(self.request, queryset, {'subject_id': int, 'sem': int})
+        if queryset is None:
+            raise ValidationError({"error": "subject_id and sem must be numbers."})
+        # Don't read the big columns the client did not ask for.
+        fields = self.request.query_params.get('fields')
+        if fields:
+            wanted = {name.strip() for name in fields.split(',')}
+            queryset = queryset.defer(*[
+                name for name in ('code_question', 'test_output_1', 'test_output_2', 'mcq_ques') if name not in wanted
+            ])
+        else:
+            queryset = queryset.defer('test_output_2')
+        return queryset
     
+def _job_owner(user):
+    """The key used to cap how many judge jobs one user can have at once."""
+    if isinstance(user, StudentData):
+        return f"student:{user.enrollment_no}"
+    return f"faculty:{user.fac_id}"
+
 class RunCodeView(APIView):
     """
-    This view runs student code against a list of JSON test cases.
+    This view queues student code to be run against a list of JSON test cases.
     The code must pass all test cases to be considered correct.
+    It answers right away with a job id; the verdicts are fetched from
+    RunCodeJobView (polling) or RunCodeStreamView (server-sent events).
+    Code that was already judged for this paper is answered from the verdict
+    cache with status 'done' and no job.
+    Send 'final': true for the final submission of an exam so it runs before
+    practice runs. The server grants it once per student and paper, and only
+    while the exam has no submitted result; otherwise it is a practice run.
     """
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
         user_code = request.data.get('code')
         exam_paper_id = request.data.get('exam_paper_id')
+        wants_final = request.data.get('final') in (True, 'true', 'True', '1', 1)
 
         if not user_code or not exam_paper_id:
             return Response(
@@ -191,72 +296,104 @@ class RunCodeView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-        temp_file_path = ''
-        try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".py", mode='w', encoding='utf-8') as temp:
-                temp.write(user_code)
-                temp_file_path = temp.name
-            
-            all_passed = True
-            first_output = ""
-            first_error = ""
-
-            # --- FIX: Loop through each test case from the JSON array ---
-            for i, case in enumerate(test_cases):
-                if not isinstance(case, dict):
-                    all_passed = False
-                    first_error = f"Test case at index {i} is not a valid object."
-                    break
-
-                input_data = case.get("Input")
-                expected_output = case.get("Output", "").strip()
-
-                run = subprocess.run(
-                    [sys.executable, temp_file_path],
-                    input=input_data,
-                    capture_output=True,
-                    text=True,
-                    timeout=5
+        # --- FIX: Make sure every test case is a valid object before queueing ---
+        for i, case in enumerate(test_cases):
+            if not isinstance(case, dict):
+                return Response(
+                    {'error': f"Test case at index {i} is not a valid object."},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
 
-                output = run.stdout.strip()
-                error = run.stderr.strip()
+        # Unchanged code (or a common solution) gets its cached verdicts right away.
+        verdict_cache = get_verdict_cache()
+        cache_key = verdict_cache.make_key(exam_paper.id, test_cases, user_code)
+        cached_cases = verdict_cache.get(cache_key, user_code)
+        if cached_cases is not None:
+            return Response({'status': 'done', 'cached': True, **summarize(cached_cases)})
+
+        owner = _job_owner(request.user)
+        is_final = (
+            wants_final and isinstance(request.user, StudentData)
+            and not ExamResult.objects.filter(
+                enrollment_no=request.user.enrollment_no, subject_id=exam_paper.subject_id
+            ).exists()
+            and claim_final_run(owner, exam_paper.id)
+        )
+        try:
+            job = get_judge_queue().submit(
+                owner, user_code, test_cases, final=is_final,
+                on_finish=lambda job: verdict_cache.set(cache_key, job.cases, user_code)
+            )
+        except TooManyJobs:
+            return Response(
+                {'error': 'You already have code running. Please wait for it to finish.'},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
 
-                # Save the output and error of the first test case to show the user
-                if i == 0:
-                    first_output = output
-                    first_error = error
+        return Response({'job_id': job.id, 'status': job.status}, status=status.HTTP_202_ACCEPTED)
 
-                if run.returncode != 0: # Code crashed
-                    all_passed = False
-                    break # Exit the loop on the first failure
+class RunCodeJobView(APIView):
+    """
+    Returns the state of a judge job. Case verdicts appear under 'cases' as
+    they finish; once the status is 'done' the response also has the overall
+    output, error and passed fields.
+    """
+    permission_classes = [IsAuthenticated]
 
-                if output != expected_output: # Output did not match
-                    all_passed = False
-                    break # Exit the loop on the first failure
-            
-            # Return the overall result
-            return Response({
-                'output': first_output,
-                'error': first_error,
-                'passed': all_passed
-            })
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_judge_queue().get(job_id)
+        if job is None or job.owner != _job_owner(request.user):
+            return Response({'error': 'Job not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job.to_dict())
 
-        except Exception as e:
-            return Response(
-                {'error': f'An unexpected error occurred: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-        finally:
-            if temp_file_path and os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients ask for text/event-stream without DRF answering 406."""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return f"event: error\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+
+class RunCodeStreamView(APIView):
+    """
+    Streams the progress of a judge job as server-sent events: one 'case'
+    event per finished test case and a final 'done' event with the result.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_judge_queue().get(job_id)
+        if job is None or job.owner != _job_owner(request.user):
+            return Response({'error': 'Job not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        response = StreamingHttpResponse(iter_events(job), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no' # Stop nginx from buffering the stream
+        return response
 
 
 class ExamResultListView(generics.ListAPIView):
-    queryset = ExamResult.objects.all()
+    """
+    A paginated list of exam results.
+    - Students only get their own results.
+    - Filters: ?subject_id=, ?test_name=, ?enrollment_no= (faculty).
+    - ?fields= picks the fields to send.
+    """
     serializer_class = ExamResultSerializer
+    pagination_class = IdCursorPagination
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        queryset = ExamResult.objects.all()
+        user = self.request.user
+        if isinstance(user, StudentData):
+            queryset = queryset.filter(enrollment_no=user.enrollment_no)
+        queryset = _filter_params(self.request, queryset, {'subject_id': int, 'enrollment_no': int, 'test_name': str})
+        if queryset is None:
+            raise ValidationError({"error": "subject_id and enrollment_no must be numbers."})
+        return queryset
+
 class SubmitExamView(APIView):
     """
     This view receives the calculated exam scores and saves them to the ExamResult table.
@@ -266,12 +403,84 @@ class SubmitExamView(APIView):
     def post(self, request, *args, **kwargs):
         serializer = ExamResultSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            result = serializer.save()
+            # Proctoring incidents of this exam were stored before it had a result.
+            link_incidents(result)
             return Response({'status': 'success', 'message': 'Exam results saved successfully.'}, status=status.HTTP_201_CREATED)
         
         # If the data is invalid, return the errors
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+class ProctoringSessionView(APIView):
+    """
+    Gives a student the signed session name to send with their webcam frames
+    for an exam paper, {"exam_paper_id": ...}. The proctoring service only
+    stores the incidents of sessions signed here (see api/proctoring.py).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        if not isinstance(request.user, StudentData):
+            return Response({"error": "Only students take proctored exams."}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            exam_paper = ExamPaper.objects.only('id').get(id=int(request.data.get('exam_paper_id')))
+        except (TypeError, ValueError):
+            return Response({"error": "exam_paper_id must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+        except ExamPaper.DoesNotExist:
+            return Response({"error": "Exam paper not found."}, status=status.HTTP_404_NOT_FOUND)
+        session = sign_session(request.user.enrollment_no, exam_paper.id)
+        if session is None:
+            return Response({"error": "Proctoring is not configured."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({"session": session})
+
+class ProctoringIncidentIngestView(APIView):
+    """
+    Where the proctoring service posts its incidents, {"incidents": [...]}, in
+    batches (see api/proctoring.py). It authenticates with the shared key in
+    the X-Proctoring-Key header, not a user token. Invalid incidents are
+    reported and skipped, so one bad row doesn't make the service resend the
+    whole batch forever.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        if not ingest_key_matches(request.headers.get('X-Proctoring-Key')):
+            return Response({"error": "Invalid proctoring key."}, status=status.HTTP_403_FORBIDDEN)
+        incidents = request.data.get('incidents') if isinstance(request.data, dict) else None
+        if not isinstance(incidents, list):
+            return Response({"error": 'Expected {"incidents": [...]}.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows, rejected = [], []
+        for index, incident in enumerate(incidents):
+            serializer = ProctoringIncidentSerializer(data=incident)
+            if serializer.is_valid():
+                rows.append(serializer.validated_data)
+            else:
+                rejected.append({'index': index, 'errors': serializer.errors})
+        stored = store_incidents(rows) if rows else 0
+        return Response({'stored': stored, 'rejected': rejected}, status=status.HTTP_201_CREATED)
+
+class ProctoringIncidentListView(generics.ListAPIView):
+    """
+    Proctoring incidents for the faculty, paginated like the exam results.
+    - Filters: ?enrollment_no=, ?exam_paper_id=, ?exam_result=
+    """
+    serializer_class = ProctoringIncidentSerializer
+    pagination_class = IdCursorPagination
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        if not isinstance(self.request.user, Faculty):
+            raise PermissionDenied("Only faculty can review proctoring incidents.")
+        queryset = _filter_params(
+            self.request, ProctoringIncident.objects.all(),
+            {'enrollment_no': int, 'exam_paper_id': int, 'exam_result': int},
+        )
+        if queryset is None:
+            raise ValidationError({"error": "enrollment_no, exam_paper_id and exam_result must be numbers."})
+        return queryset
+
 class AttendanceView(generics.ListAPIView):
     serializer_class = AttendanceSerializer
     permission_classes = [IsAuthenticated]
@@ -288,92 +497,107 @@ class AttendanceView(generics.ListAPIView):
         # If the user is not a student (e.g., a faculty member), return an empty list.
         return Attendance.objects.none()
 
+    def list(self, request, *args, **kwargs):
+        user = self.request.user
+        if not isinstance(user, StudentData):
+            return super().list(request, *args, **kwargs)
+        data = get_summary_cache().get_or_build(
+            'attendance', user.enrollment_no, user.semester,
+            lambda: self.get_serializer(self.get_queryset(), many=True).data,
+        )
+        return Response(data)
+
 # --- ADDED THIS NEW VIEW AT THE BOTTOM OF THE FILE ---
 class StudentDashboardSummaryView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, enrollment_no, *args, **kwargs):
-        try:
-            student = StudentData.objects.get(enrollment_no=enrollment_no)
-        except StudentData.DoesNotExist:
-            return Response({"error": "Student not found"}, status=status.HTTP_404_NOT_FOUND)
+        # A student opening their own dashboard is already loaded by the authentication.
+        student = request.user
+        if not isinstance(student, StudentData) or student.enrollment_no != enrollment_no:
+            try:
+                student = StudentData.objects.get(enrollment_no=enrollment_no)
+            except StudentData.DoesNotExist:
+                return Response({"error": "Student not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        data = get_summary_cache().get_or_build(
+            'dashboard', student.enrollment_no, student.semester, lambda: self.build_summary(student)
+        )
+        return Response(data)
 
+    def build_summary(self, student):
+        enrollment_no = student.enrollment_no
         department_rank = None
         
         # --- FINAL RANK CALCULATION (Ranks against all students in the semester) ---
+        # The ranking is precomputed per semester (see leaderboard.py), so this is a lookup.
         try:
-            # 1. Get all students in the same SEMESTER (ignoring branch)
-            students_in_semester = StudentData.objects.filter(
-                semester=student.semester
-            )
-
-            # 2. Get all marks for those students
-            marks_data = CurrentSemMarks.objects.filter(
-                enrollment_number__in=students_in_semester.values_list('enrollment_no', flat=True)
-            )
-
-            # 3. Calculate total marks for each student, initializing all with 0
-            student_totals = {s.enrollment_no: 0 for s in students_in_semester}
-            for mark in marks_data:
-                total = mark.t1_marks + mark.t2_marks + mark.t3_marks
-                student_totals[mark.enrollment_number] = student_totals.get(mark.enrollment_number, 0) + total
-
-            # 4. Create a sorted list of all students in the semester by their total marks
-            sorted_students = sorted(student_totals.items(), key=lambda item: item[1], reverse=True)
-
-            # 5. Determine the rank, handling ties correctly
-            rank_map = {}
-            current_rank = 0
-            last_score = -1
-            for i, (enroll_no, total) in enumerate(sorted_students):
-                if total != last_score:
-                    current_rank = i + 1
-                rank_map[enroll_no] = current_rank
-                last_score = total
-            
-            department_rank = rank_map.get(student.enrollment_no)
-
+            department_rank = get_leaderboards().rank(student.semester, student.enrollment_no)
         except Exception as e:
             print(f"Could not calculate rank for student {enrollment_no}: {e}")
 
-        # --- Calculate Overall Attendance (no changes here) ---
-        attendance_agg = Attendance.objects.filter(
-            enrollment_no=student.enrollment_no
-        ).aggregate(
-            total_attended=Sum('total_attended'),
-            total_lectures=Sum('total_lectures')
-        )
-        
+        # --- Attendance: per-subject rows plus the overall totals in one query ---
+        attendance_rows = self.attendance_rows(enrollment_no)
+
         overall_attendance = 0
-        if attendance_agg.get('total_lectures') and attendance_agg['total_lectures'] > 0:
-            overall_attendance = round((attendance_agg['total_attended'] / attendance_agg['total_lectures']) * 100)
+        low_attendance_subjects = []
+        for row in attendance_rows:
+            if row['overall_lectures']:
+                overall_attendance = round((row['overall_attended'] / row['overall_lectures']) * 100)
+            if row['is_low']:
+                low_attendance_subjects.append({
+                    "name": row['subject_name'],
+                    "percentage": round((row['total_attended'] / row['total_lectures']) * 100)
+                })
 
-        # --- Get Current Semester Subjects (no changes here) ---
-        current_subjects = SubjectDetails.objects.filter(sem=student.semester).values('subject_name', 'subject_id')
+        # --- Get Current Semester Subjects ---
+        current_subjects = self.current_subjects(student.semester)
 
-        # --- Get Subjects with Low Attendance (no changes here) ---
-        student_attendance_records = Attendance.objects.filter(enrollment_no=student.enrollment_no)
-        low_attendance_subjects = []
-        for record in student_attendance_records:
-            if record.total_lectures > 0:
-                percentage = (record.total_attended / record.total_lectures) * 100
-                if percentage < 75:
-                    low_attendance_subjects.append({
-                        "name": record.subject_name,
-                        "percentage": round(percentage)
-                    })
+        # --- Exams: papers of the semester the student has not submitted yet ---
+        # "Pending assignments" are the ones among them with a coding question.
+        exam_counts = self.unsubmitted_papers(student.semester, enrollment_no).aggregate(**self.EXAM_COUNTS)
 
         # --- Prepare the final data payload ---
         data = {
             "department_rank": department_rank,
             "overall_attendance": overall_attendance,
-            "current_subjects": list(current_subjects), 
+            "current_subjects": list(current_subjects),
             "low_attendance_subjects": low_attendance_subjects,
-            "pending_assignments": 3, # Static for now
-            "upcoming_exams": 2, # Static for now
+            "pending_assignments": exam_counts['pending'],
+            "upcoming_exams": exam_counts['upcoming'],
         }
-        
-        return Response(data)
+        return data
+
+    # The queries of build_summary, also replayed by the explain_queries command.
+    EXAM_COUNTS = {
+        'upcoming': Count('id'),
+        'pending': Count('id', filter=Q(code_question__isnull=False) & ~Q(code_question='')),
+    }
+
+    @staticmethod
+    def attendance_rows(enrollment_no):
+        # The window sums give every row the student's overall totals, and the
+        # conditional flag marks subjects under 75% without a second pass.
+        return Attendance.objects.filter(
+            enrollment_no=enrollment_no
+        ).annotate(
+            overall_attended=Window(Sum('total_attended')),
+            overall_lectures=Window(Sum('total_lectures')),
+            is_low=Case(
+                When(Q(total_lectures__gt=0) & Q(total_attended__lt=F('total_lectures') * 0.75), then=Value(True)),
+                default=Value(False),
+            ),
+        ).values('subject_name', 'total_attended', 'total_lectures', 'overall_attended', 'overall_lectures', 'is_low')
+
+    @staticmethod
+    def current_subjects(semester):
+        return SubjectDetails.objects.filter(sem=semester).values('subject_name', 'subject_id')
+
+    @staticmethod
+    def unsubmitted_papers(semester, enrollment_no):
+        return ExamPaper.objects.filter(sem=semester).exclude(
+            subject_id__in=ExamResult.objects.filter(enrollment_no=enrollment_no).values('subject_id')
+        )
 
 class StudentResultsView(APIView):
     """
@@ -388,6 +612,12 @@ class StudentResultsView(APIView):
         if not isinstance(user, StudentData):
             return Response({"error": "User is not a student."}, status=status.HTTP_403_FORBIDDEN)
 
+        data = get_summary_cache().get_or_build(
+            'results', user.enrollment_no, user.semester, lambda: self.build_results(user)
+        )
+        return Response(data)
+
+    def build_results(self, user):
         # Fetch all three types of marks
         current_marks = CurrentSemMarks.objects.filter(enrollment_number=user.enrollment_no)
         past_marks = PastMarks.objects.filter(enrollment_no=user.enrollment_no)
@@ -409,8 +639,7 @@ class StudentResultsView(APIView):
             "practical_marks": practical_marks_data,
             "subjects": subjects_data # <-- Add the subjects list to the response
         }
-
-        return Response(data)
+        return data
 
 class NotesView(APIView):
     """
@@ -470,14 +699,33 @@ class NoteDownloadView(APIView):
 
     def get(self, request, pk, *args, **kwargs):
         try:
-            note = Notes.objects.get(pk=pk)
-            # Create an HTTP response with the binary data and appropriate headers.
-            response = HttpResponse(note.doc, content_type='application/octet-stream')
-            response['Content-Disposition'] = f'attachment; filename="{note.subject_name}_notes.pdf"' # Assuming PDF, can be made dynamic
-            return response
+            # Don't pull a legacy blob from the database unless we need it.
+            note = Notes.objects.defer('doc').get(pk=pk)
         except Notes.DoesNotExist:
             return Response({"error": "Note not found."}, status=status.HTTP_404_NOT_FOUND)
 
+        filename = f"{note.subject_name}_notes.pdf" # Assuming PDF, can be made dynamic
+
+        # Documents in the note storage are streamed from disk, with Range and ETag support.
+        if note.doc_hash:
+            return document_response(request, note.doc_hash, note.doc_size, filename)
+
+        # Legacy note whose document is still in the database (see migrate_note_blobs).
+        response = HttpResponse(note.doc, content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+class NoteStorageStatsView(APIView):
+    """
+    Reports how much space deduplication and compression save in the note storage.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        if not isinstance(request.user, Faculty):
+            return Response({"error": "User is not a faculty member."}, status=status.HTTP_403_FORBIDDEN)
+        return Response(storage_savings())
+
 class SubjectListView(APIView):
     """
     Provides a list of subjects filtered by the logged-in faculty's semester.
@@ -552,9 +800,26 @@ class StudentByBranchView(APIView):
         serializer = StudentForAttendanceSerializer(students, many=True)
         return Response(serializer.data)
 
+class CacheStatsView(APIView):
+    """
+    Hit rates of the per-student page cache and of the judge verdict cache,
+    and how old the cached pages were when served. Faculty only.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        if not isinstance(request.user, Faculty):
+            return Response({"error": "Only faculty can view cache statistics."}, status=status.HTTP_403_FORBIDDEN)
+        return Response({
+            "summaries": get_summary_cache().stats(),
+            "verdicts": get_verdict_cache().stats(),
+        })
+
 class MarkAttendanceView(APIView):
     """
     Receives and saves attendance data. Enforces the "once per day per subject" rule.
+    Every lecture is logged as an AttendanceEvent, and the running totals in
+    Attendance are updated in the same transaction.
     """
     permission_classes = [IsAuthenticated]
     def post(self, request, *args, **kwargs):
@@ -566,48 +831,147 @@ class MarkAttendanceView(APIView):
             return Response({"error": "Subject and attendance data are required."}, status=status.HTTP_400_BAD_REQUEST)
 
         today = date.today()
-        
-        # --- FIX: Check for existing attendance for the submitted students ---
-        enrollment_numbers = [item['enrollment_no'] for item in attendance_data]
-        if Attendance.objects.filter(subject_id=subject_id, enrollment_no__in=enrollment_numbers, attd_date=today).exists():
-            return Response({"error": "Attendance has already been marked for this subject and branch today."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # --- REFACTORED LOGIC ---
-        for item in attendance_data:
-            enrollment_no = item['enrollment_no']
-            statusi = item['status']
-            
+
+        # One entry per student; if a student appears twice, the last entry wins.
+        # Enrollment numbers may arrive as strings; in_bulk() below gives int keys.
+        try:
+            subject_id = int(subject_id)
+            statuses = {int(item['enrollment_no']): item['status'] for item in attendance_data}
+        except (KeyError, TypeError, ValueError):
+            return Response(
+                {"error": "Each attendance entry needs a numeric enrollment_no and a status."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        enrollment_numbers = list(statuses)
+
+        # Everything below runs in one transaction with a constant number of
+        # queries, however many students are in the class.
+        with transaction.atomic():
+            # Locking the subject row makes concurrent submissions for the same
+            # subject wait for each other, so the "already marked today" check
+            # and the new rows below can't race.
             try:
-                student = StudentData.objects.get(enrollment_no=enrollment_no)
-                subject = SubjectDetails.objects.get(subject_id=subject_id)
-            except (StudentData.DoesNotExist, SubjectDetails.DoesNotExist):
-                # Log this event or handle it, for now we skip.
-                continue
-
-            # Use get_or_create for cleaner logic. It finds an existing record
-            # or creates a new one if it doesn't exist.
-            att_record, created = Attendance.objects.get_or_create(
-                enrollment_no=enrollment_no,
-                subject_id=subject_id,
-                # Defaults are only used when creating a NEW record.
-                defaults={
-                    'semester': student.semester,
-                    'subject_name': subject.subject_name,
-                    'total_lectures': 0,
-                    'total_attended': 0,
-                }
+                subject = SubjectDetails.objects.select_for_update().get(subject_id=subject_id)
+            except SubjectDetails.DoesNotExist:
+                return Response({"error": "Subject not found."}, status=status.HTTP_404_NOT_FOUND)
+
+            # --- FIX: Check for existing attendance for the submitted students ---
+            # The event log has one row per student per lecture day, so this
+            # looks at every student's record for today, not only the latest date.
+            if AttendanceEvent.objects.filter(subject_id=subject_id, date=today, enrollment_no__in=enrollment_numbers).exists():
+                return Response({"error": "Attendance has already been marked for this subject and branch today."}, status=status.HTTP_400_BAD_REQUEST)
+
+            students = StudentData.objects.only('enrollment_no', 'semester').in_bulk(enrollment_numbers)
+            existing = set(Attendance.objects.filter(
+                subject_id=subject_id, enrollment_no__in=list(students)
+            ).values_list('enrollment_no', flat=True))
+
+            # Students seen in this subject for the first time get a new, empty record.
+            Attendance.objects.bulk_create([
+                Attendance(
+                    enrollment_no=enrollment_no,
+                    subject_id=subject_id,
+                    semester=student.semester,
+                    subject_name=subject.subject_name,
+                    total_lectures=0,
+                    total_attended=0,
+                )
+                for enrollment_no, student in students.items() if enrollment_no not in existing
+            ])
+
+            # Log the lecture for every student...
+            present = [e for e in students if statuses[e] == 'present']
+            AttendanceEvent.objects.bulk_create([
+                AttendanceEvent(
+                    enrollment_no=enrollment_no,
+                    subject_id=subject_id,
+                    semester=student.semester,
+                    date=today,
+                    present=statuses[enrollment_no] == 'present',
+                    marked_by=getattr(user, 'fac_id', None),
+                )
+                for enrollment_no, student in students.items()
+            ])
+
+            # ...and keep the rollup in Attendance in step: a single UPDATE counts
+            # the lecture for everyone and the attendance for those present,
+            # computed in the database with F() expressions.
+            Attendance.objects.filter(subject_id=subject_id, enrollment_no__in=list(students)).update(
+                total_lectures=F('total_lectures') + 1,
+                total_attended=F('total_attended') + Case(
+                    When(enrollment_no__in=present, then=Value(1)), default=Value(0)
+                ),
+                attd_date=today,
             )
 
-            # This logic will now correctly update the record.
-            att_record.total_lectures += 1
-            if statusi == 'present':
-                att_record.total_attended += 1
-            
-            # Always update the date to today for this submission.
-            att_record.attd_date = today
-            att_record.save()
-            
-        return Response({"status": "success"}, status=status.HTTP_201_CREATED)
+            # Cached dashboards and attendance lists of these students are now out of date.
+            invalidate_on_commit(semesters={student.semester for student in students.values()})
+
+        # Report what happened to every submitted student.
+        results = []
+        for enrollment_no, statusi in statuses.items():
+            if enrollment_no not in students:
+                results.append({"enrollment_no": enrollment_no, "status": statusi, "result": "skipped", "reason": "Student not found."})
+            else:
+                result = "updated" if enrollment_no in existing else "created"
+                results.append({"enrollment_no": enrollment_no, "status": statusi, "result": result})
+
+        return Response({"status": "success", "marked": len(students), "results": results}, status=status.HTTP_201_CREATED)
+
+class AttendanceReportView(APIView):
+    """
+    Attendance of the students in a subject over a date range, read from the
+    attendance event log. Query parameters:
+    - subject_id (required)
+    - from / to: dates as YYYY-MM-DD (default: the last 7 days)
+    - missed_only: set to 1 to list only students who missed a lecture
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        if not isinstance(request.user, Faculty):
+            return Response({"error": "User is not a faculty member."}, status=status.HTTP_403_FORBIDDEN)
+
+        subject_id = request.query_params.get('subject_id')
+        if not subject_id:
+            return Response({"error": "subject_id is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            subject_id = int(subject_id)
+            date_to = date.fromisoformat(request.query_params['to']) if 'to' in request.query_params else date.today()
+            date_from = date.fromisoformat(request.query_params['from']) if 'from' in request.query_params else date_to - datetime.timedelta(days=6)
+        except ValueError:
+            return Response({"error": "subject_id must be a number and dates in YYYY-MM-DD format."}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = self.totals(subject_id, date_from, date_to)
+
+        if request.query_params.get('missed_only') in ('1', 'true', 'True'):
+            rows = rows.filter(attended__lt=F('lectures'))
+
+        rows = list(rows)
+        names = dict(StudentData.objects.filter(
+            enrollment_no__in=[row['enrollment_no'] for row in rows]
+        ).values_list('enrollment_no', 'name'))
+        for row in rows:
+            row['name'] = names.get(row['enrollment_no'], "Unknown")
+            row['missed'] = row['lectures'] - row['attended']
+
+        return Response({
+            "subject_id": subject_id,
+            "from": date_from,
+            "to": date_to,
+            "students": rows,
+        })
+
+    @staticmethod
+    def totals(subject_id, date_from, date_to):
+        """Lectures and attendance per student; uses the (subject_id, date) index of the event log."""
+        return AttendanceEvent.objects.filter(
+            subject_id=subject_id, date__range=(date_from, date_to)
+        ).values('enrollment_no').annotate(
+            lectures=Count('id'),
+            attended=Count('id', filter=Q(present=True)),
+        ).order_by('enrollment_no')
 
 class NotesView(APIView):
     """
@@ -623,11 +987,16 @@ class NotesView(APIView):
         if isinstance(user, StudentData):
             # Student logic: Filter notes by their current semester
             student_semester = user.semester
-            notes = Notes.objects.filter(sem=student_semester)
+            notes = Notes.objects.filter(sem=student_semester).defer('doc')
+            data = get_summary_cache().get_or_build(
+                'notes', user.enrollment_no, student_semester,
+                lambda: NotesListSerializer(notes, many=True).data,
+            )
+            return Response(data)
         
         elif isinstance(user, Faculty):
             # --- FIX: Faculty now only see their own uploads ---
-            notes = Notes.objects.filter(uploader_id=user.fac_id)
+            notes = Notes.objects.filter(uploader_id=user.fac_id).defer('doc')
             
         else:
             # If the user is neither, return an empty list
@@ -652,12 +1021,25 @@ class NotesView(APIView):
             "subject_name": request.data.get('subject_name'),
             "desc": request.data.get('desc'),
             "sem": user.sem,
-            "doc": file_obj.read()
         }
         
         serializer = NotesUploadSerializer(data=data)
         if serializer.is_valid():
-            serializer.save()
+            # The document is written to the note storage in chunks while being
+            # hashed; the note itself only keeps the hash and the size. If the
+            # same document is already stored, it is shared instead of copied.
+            stored = None
+            try:
+                with transaction.atomic():
+                    stored = get_note_storage().save(file_obj)
+                    acquire_blob(stored, file_obj)
+                    serializer.save(doc_hash=stored.digest, doc_size=stored.size)
+            except Exception:
+                # The rollback undid the reference; the file must not stay
+                # behind on disk unless another note uses it.
+                if stored is not None:
+                    delete_if_unused(stored.digest)
+                raise
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -677,7 +1059,7 @@ class NoteDeleteView(APIView):
             return Response({"error": "Only faculty can delete notes."}, status=status.HTTP_403_FORBIDDEN)
 
         try:
-            note = Notes.objects.get(pk=pk)
+            note = Notes.objects.defer('doc').get(pk=pk)
         except Notes.DoesNotExist:
             return Response({"error": "Note not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -685,91 +1067,215 @@ class NoteDeleteView(APIView):
         if note.uploader_id != user.fac_id:
             return Response({"error": "You do not have permission to delete this note."}, status=status.HTTP_403_FORBIDDEN)
 
-        note.delete()
+        with transaction.atomic():
+            note.delete()
+            # The stored document may be shared with other notes; it is only
+            # removed when this was the last one using it.
+            if note.doc_hash:
+                release_blob(note.doc_hash)
         # A 204 No Content response is standard for a successful deletion.
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 class FacultyResultsView(APIView):
     """
     A multi-purpose view for the faculty results page.
+    Names are joined and rows projected in the database (see results_query.py).
+    - no parameters: the test names taken in the faculty's semester
+    - ?exam_name=: the results of one test
+    - ?current_sem_marks=true: the T1/T2/T3 marks of the semester
+    - ?search_query=: past and practical marks of one student
+    The two result lists also take:
+    - ?subject_id= to keep one subject
+    - ?ordering= e.g. -total_marks, code_marks, student_name (default: id)
+    - ?page_size= (and then ?cursor=) to get {"next", "previous", "results"}
+      pages instead of the whole list, paged on the sort order like the other listings
+    - ?aggregate=1 for count/mean/median/percentiles per subject (and test)
     """
     permission_classes = [IsAuthenticated]
 
+    EXAM_ORDERINGS = {'id', 'enrollment_no', 'student_name', 'subject_name', 'code_marks', 'mcq_marks', 'total_marks'}
+    MARKS_ORDERINGS = {'id', 'enrollment_number', 'student_name', 'subject_name', 't1_marks', 't2_marks', 't3_marks', 'total_marks'}
     def get(self, request, *args, **kwargs):
         user = self.request.user
         if not isinstance(user, Faculty):
             return Response({"error": "User is not a faculty member."}, status=status.HTTP_403_FORBIDDEN)
 
         faculty_semester = user.sem
-        
-        # --- FIX: Create a complete map of ALL subjects ---
-        all_subjects = SubjectDetails.objects.all()
-        subject_map = {s.subject_id: s.subject_name for s in all_subjects}
+        params = request.query_params
+        exam_name_param = params.get('exam_name')
+        subject_id = params.get('subject_id')
+        if subject_id is not None:
+            if not subject_id.isdigit():
+                return Response({"error": "subject_id must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+            subject_id = int(subject_id)
+        aggregate = params.get('aggregate') in ('1', 'true')
 
-        # Create a map of students in the faculty's semester for name lookups
-        students_in_sem = StudentData.objects.filter(semester=faculty_semester)
-        student_map = {s.enrollment_no: s.name for s in students_in_sem}
-        
         # Action 1: Get list of unique exam names
-        exam_name_param = request.query_params.get('exam_name')
-        if exam_name_param is None and 'search_query' not in request.query_params and 'current_sem_marks' not in request.query_params:
-            exam_names = ExamResult.objects.filter(
-                enrollment_no__in=students_in_sem.values_list('enrollment_no', flat=True)
-            ).values_list('test_name', flat=True).distinct()
-            return Response(list(exam_names))
-
-        # Action 2: Get results for a specific exam
-        if exam_name_param:
-            results = ExamResult.objects.filter(test_name=exam_name_param, enrollment_no__in=students_in_sem)
-            response_data = []
-            for result in results:
-                response_data.append({
-                    "id": result.id,
-                    "enrollment_no": result.enrollment_no,
-                    "student_name": student_map.get(result.enrollment_no, "Unknown"),
-                    "subject_name": subject_map.get(result.subject_id, "Unknown"),
-                    "code_marks": result.code_marks,
-                    "mcq_marks": result.mcq_marks,
-                })
-            return Response(response_data)
+        if exam_name_param is None and not aggregate and 'search_query' not in params and 'current_sem_marks' not in params:
+            return Response(list(results_query.exam_names(faculty_semester)))
+
+        # Action 4: Get current semester T1, T2, T3 marks
+        if 'current_sem_marks' in params:
+            marks = results_query.current_marks(faculty_semester, subject_id)
+            if aggregate:
+                return Response(results_query.aggregate(
+                    marks, ('subject_id',), ('t1_marks', 't2_marks', 't3_marks', 'total_marks')
+                ))
+            return self.list_rows(request, marks, results_query.CURRENT_MARKS_FIELDS, self.MARKS_ORDERINGS)
+
+        # Action 2: Get results for a specific exam (or of every exam, when aggregating)
+        if exam_name_param or aggregate:
+            results = results_query.exam_results(faculty_semester, exam_name_param, subject_id)
+            if aggregate:
+                return Response(results_query.aggregate(
+                    results, ('subject_id', 'test_name'), ('code_marks', 'mcq_marks', 'total_marks')
+                ))
+            return self.list_rows(request, results, results_query.EXAM_RESULT_FIELDS, self.EXAM_ORDERINGS)
 
         # Action 3: Search for a student and get their past marks
-        search_query = request.query_params.get('search_query')
+        search_query = params.get('search_query')
         if search_query:
-            try:
-                if search_query.isdigit():
-                    student = StudentData.objects.get(enrollment_no=search_query)
-                else:
-                    student = StudentData.objects.get(name__iexact=search_query)
-            except (StudentData.DoesNotExist, ValueError):
+            student = StudentData.objects.filter(
+                **({'enrollment_no': search_query} if search_query.isdigit() else {'name__iexact': search_query})
+            ).values_list('enrollment_no', flat=True).first()
+            if student is None:
                 return Response({"past": [], "practical": []})
 
-            past_marks = PastMarks.objects.filter(enrollment_no=student.enrollment_no)
-            practical_marks = PracticalMarks.objects.filter(enrollment_no=student.enrollment_no)
-            
-            past_data = [{**item, 'subject_name': subject_map.get(item['subject_id'], 'Unknown')} for item in PastMarksSerializer(past_marks, many=True).data]
-            practical_data = [{**item, 'subject_name': subject_map.get(item['subject_id'], 'Unknown')} for item in PracticalMarksSerializer(practical_marks, many=True).data]
-            
-            return Response({"past": past_data, "practical": practical_data})
-            
-        # Action 4: Get current semester T1, T2, T3 marks
-        if 'current_sem_marks' in request.query_params:
-            marks = CurrentSemMarks.objects.filter(enrollment_number__in=students_in_sem)
-            response_data = []
-            for mark in marks:
-                response_data.append({
-                    "id": mark.id,
-                    "enrollment_number": mark.enrollment_number,
-                    "student_name": student_map.get(mark.enrollment_number, "Unknown"),
-                    "subject_name": subject_map.get(mark.subject_id, "Unknown"),
-                    "t1_marks": mark.t1_marks,
-                    "t2_marks": mark.t2_marks,
-                    "t3_marks": mark.t3_marks,
-                })
-            return Response(response_data)
+            return Response({
+                "past": list(results_query.past_marks(student)),
+                "practical": list(results_query.practical_marks(student)),
+            })
 
         return Response({"error": "Invalid request"}, status=status.HTTP_400_BAD_REQUEST)
 
+    def list_rows(self, request, queryset, fields, orderings):
+        """Sorts, and optionally pages, a results queryset and returns its values() rows."""
+        ordering = request.query_params.get('ordering', 'id')
+        if ordering.lstrip('-') not in orderings:
+            return Response({"error": f"ordering must be one of: {', '.join(sorted(orderings))} (prefix - for descending)."}, status=status.HTTP_400_BAD_REQUEST)
+        # The id keeps the order stable between pages when marks are equal.
+        ordering = (ordering,) if ordering.lstrip('-') == 'id' else (ordering, 'id')
+        rows = queryset.values(*fields)
+
+        if 'cursor' not in request.query_params and 'page_size' not in request.query_params:
+            return Response(list(rows.order_by(*ordering)))
+
+        paginator = ResultsCursorPagination()
+        paginator.ordering = ordering
+        page = paginator.paginate_queryset(rows, request, view=self)
+        return paginator.get_paginated_response(page)
+
+
+class ClassAnalyticsView(APIView):
+    """
+    Statistics of a semester for the faculty: distributions and percentiles of
+    the T1/T2/T3, online exam, past and practical marks, the T1 -> T2 -> T3
+    progression, and the students at risk (see class_analytics.py).
+    Query parameters (all optional):
+    - semester (default: the faculty's semester)
+    - subject_id: only one subject
+    - test_name: only one online test
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        user = self.request.user
+        if not isinstance(user, Faculty):
+            return Response({"error": "User is not a faculty member."}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            semester = int(request.query_params.get('semester', user.sem))
+            subject_id = request.query_params.get('subject_id')
+            subject_id = int(subject_id) if subject_id else None
+        except ValueError:
+            return Response({"error": "semester and subject_id must be numbers."}, status=status.HTTP_400_BAD_REQUEST)
+        test_name = request.query_params.get('test_name') or None
+
+        return Response(get_class_analytics().get(semester, subject_id, test_name))
+
+class ExportView(APIView):
+    """
+    Downloads a whole semester (or one branch of it) as a file, streamed in
+    batches so memory use does not grow with the number of rows (see exports.py).
+    - dataset (in the URL): exam-results, current-marks or attendance
+    - semester (default: the faculty's semester), branch, subject_id, test_name
+    - filetype: csv (default) or xlsx
+    - gzip=1: gzip the CSV
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, dataset, *args, **kwargs):
+        user = self.request.user
+        if not isinstance(user, Faculty):
+            return Response({"error": "User is not a faculty member."}, status=status.HTTP_403_FORBIDDEN)
+        if dataset not in exports.DATASETS:
+            return Response({"error": f"Unknown export. Use one of: {', '.join(exports.DATASETS)}."}, status=status.HTTP_404_NOT_FOUND)
+
+        params = request.query_params
+        try:
+            semester = int(params.get('semester', user.sem))
+            subject_id = int(params['subject_id']) if params.get('subject_id') else None
+        except ValueError:
+            return Response({"error": "semester and subject_id must be numbers."}, status=status.HTTP_400_BAD_REQUEST)
+        branch = params.get('branch') or None
+        filetype = params.get('filetype', 'csv')
+        if filetype not in ('csv', 'xlsx'):
+            return Response({"error": "filetype must be csv or xlsx."}, status=status.HTTP_400_BAD_REQUEST)
+
+        export = exports.DATASETS[dataset]
+        queryset = export.build(semester, branch, subject_id, params.get('test_name') or None)
+        chunks = exports.iter_chunks(queryset, [field for field, _ in export.columns])
+        filename = f"{dataset}_sem{semester}" + (f"_{branch}" if branch else "")
+
+        if filetype == 'xlsx':
+            try:
+                output = exports.xlsx_file(export.columns, chunks, dataset)
+            except ImportError:
+                return Response({"error": "XLSX export needs openpyxl installed on the server."}, status=status.HTTP_501_NOT_IMPLEMENTED)
+            return FileResponse(
+                output, as_attachment=True, filename=f"{filename}.xlsx",
+                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            )
+
+        stream = exports.csv_stream(export.columns, chunks)
+        if params.get('gzip') in ('1', 'true'):
+            response = StreamingHttpResponse(exports.gzip_stream(stream), content_type='application/gzip')
+            filename += '.csv.gz'
+        else:
+            response = StreamingHttpResponse(stream, content_type='text/csv; charset=utf-8')
+            filename += '.csv'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+class MarksImportView(APIView):
+    """
+    Bulk import of marks by faculty (see marks_import.py).
+    - kind (in the URL): current, past or practical
+    - body: a CSV or JSON file in 'file' (the extension tells which), or a
+      JSON list of rows (or {"rows": [...]})
+    - ?dry_run=1 only validates
+    Bad rows are reported one by one and skipped; the others are imported.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, kind, *args, **kwargs):
+        if not isinstance(request.user, Faculty):
+            return Response({"error": "Only faculty can import marks."}, status=status.HTTP_403_FORBIDDEN)
+        if kind not in SPECS:
+            return Response({"error": f"Unknown kind. Use one of: {', '.join(SPECS)}."}, status=status.HTTP_404_NOT_FOUND)
+
+        upload = request.FILES.get('file')
+        try:
+            if upload is not None:
+                fmt = 'json' if upload.name.lower().endswith('.json') else 'csv'
+                rows = parse_rows(upload.read(), fmt)
+            else:
+                rows = parse_rows(request.data, 'json')
+        except ImportFormatError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = import_marks(kind, rows, dry_run=request.query_params.get('dry_run') in ('1', 'true'))
+        return Response(report, status=status.HTTP_200_OK)
 
 class FacultyStudentListView(APIView):
     """
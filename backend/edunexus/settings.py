@@ -56,6 +56,85 @@ REST_FRAMEWORK = {
     ]
 }
 
+# Settings for the caches of decoded tokens and logged-in users used by
+# api.authentication.CustomJWTAuthentication (see api/principal_cache.py).
+AUTH_CACHE = {
+    'MAX_ENTRIES': 10000,  # Tokens, and users, kept in each server process.
+    'TTL': 60,             # Seconds before a user row is read from the database again.
+}
+
+# Settings for the pool of warm Python interpreters that runs student code
+# (see api/code_runner.py).
+CODE_RUNNER = {
+    'POOL_SIZE': 4,               # Number of runner processes kept alive.
+    'TIMEOUT': 5,                 # Seconds allowed per test case.
+    'MAX_JOBS_PER_RUNNER': 200,   # Recycle a runner after this many jobs.
+    'MAX_RUNNER_RSS_MB': 256,     # Recycle a runner once its memory grows past this.
+    'START_METHOD': 'spawn',
+}
+
+# Settings for the background queue that judges student code
+# (see api/judge_queue.py).
+JUDGE_QUEUE = {
+    'WORKERS': 4,                  # Threads feeding jobs to the runner pool.
+    'MAX_RUNNING_PER_STUDENT': 1,  # Jobs of one student that may run at once.
+    'MAX_PENDING_PER_STUDENT': 3,  # Queued plus running jobs allowed per student.
+    'RESULT_TTL': 600,             # Seconds a finished job can still be fetched.
+    'FINAL_RUNS_BACKEND': 'default',  # Entry in CACHES remembering who had their final run; 'shared' with several processes.
+    'FINAL_RUN_TTL': 86400,           # Seconds before a student can get another final run of the same paper.
+}
+
+# Settings for the cache of judge verdicts (see api/verdict_cache.py).
+VERDICT_CACHE = {
+    'MAX_ENTRIES': 5000,       # Entries kept in each server process.
+    'SHARED_BACKEND': None,    # Name of an entry in CACHES shared by all processes.
+    'SHARED_TIMEOUT': 3600,    # Seconds an entry stays in the shared backend.
+}
+
+# Where note documents are stored (see api/note_storage.py).
+NOTES_STORAGE = {
+    'BACKEND': 'api.note_storage.LocalContentStore',
+    'OPTIONS': {
+        'root': BASE_DIR / 'note_files',
+        'compress': True,  # Gzip documents that compress well (text, uncompressed PDFs, ...).
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Shared by all server processes on this machine; name it in
+    # SUMMARY_CACHE['BACKEND'] or VERDICT_CACHE['SHARED_BACKEND'] to use it.
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    },
+}
+
+# Settings for the cache of per-student pages (see api/summary_cache.py).
+SUMMARY_CACHE = {
+    'BACKEND': 'default',  # Name of an entry in CACHES; use 'shared' with several processes.
+    'TIMEOUT': 600,        # Seconds an entry is kept, and so the longest another process can lag.
+}
+
+# Settings for the cache of class analytics (see api/class_analytics.py).
+CLASS_ANALYTICS = {
+    'BACKEND': 'default',  # Name of an entry in CACHES.
+    'TIMEOUT': 3600,       # Seconds a computed result is kept.
+}
+
+# Settings for the precomputed semester rankings (see api/leaderboard.py).
+LEADERBOARD = {
+    'MAX_AGE': 300,  # Seconds before a board is rebuilt from the database.
+}
+
+# Settings for the incidents sent by the proctoring service (see api/proctoring.py).
+PROCTORING = {
+    'INGEST_KEY': '',  # Same as the service's PROCTOR_INCIDENTS_KEY; while empty, nothing is accepted.
+    'SESSION_TTL': 6 * 3600,  # Seconds a signed proctoring session name stays valid.
+}
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
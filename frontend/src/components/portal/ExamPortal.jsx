@@ -71,16 +71,23 @@ export function ExamPortal({ setSidebarLocked }) {
             return;
         }
 
-        // If attendance is fine, fetch exam papers and results
-        const [paperResponse, resultsResponse] = await Promise.all([
-          axios.get('/api/exam-papers/'),
-          axios.get('/api/exam-results/'),
+        // If attendance is fine, fetch exam papers and results.
+        // Both lists are paginated: follow the "next" links to the end.
+        const fetchAll = async (url) => {
+          const items = [];
+          while (url) {
+            const response = await axios.get(url);
+            items.push(...response.data.results);
+            url = response.data.next;
+          }
+          return items;
+        };
+        const studentSemester = user.semester;
+        const [papers, results] = await Promise.all([
+          fetchAll(`/api/exam-papers/?sem=${studentSemester}&page_size=200`),
+          fetchAll('/api/exam-results/?fields=enrollment_no,subject_id&page_size=200'),
         ]);
 
-        const papers = paperResponse.data;
-        const results = resultsResponse.data;
-        const studentSemester = user.semester;
-        
         const relevantPapers = papers.filter(p => p.sem === studentSemester);
 
         if (relevantPapers.length > 0) {
@@ -139,8 +146,7 @@ export function ExamPortal({ setSidebarLocked }) {
       title: `Exam for Subject ID: ${paper.subject_id}`,
       duration: 120,
       questions: formattedQuestions,
-      test_output_1: paper.test_output_1,
-      test_output_2: paper.test_output_2
+      test_output_1: paper.test_output_1
     });
     setTimeLeft(5 * 60);
     setExamState('details');
@@ -153,11 +159,20 @@ export function ExamPortal({ setSidebarLocked }) {
     setCodePassed(null); // Reset pass status
 
     try {
-      const response = await axios.post('/api/run-code/', {
+      // The backend queues the code and answers with a job id right away.
+      const queued = await axios.post('/api/run-code/', {
         code: currentAnswer,
         exam_paper_id: selectedExam.id,
       });
 
+      // Poll the job until all test cases have been judged. Code that was
+      // already judged comes back finished, straight from the cache.
+      let response = queued;
+      while (response.data.status === 'queued' || response.data.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, 500));
+        response = await axios.get(`/api/run-code/${queued.data.job_id}/`);
+      }
+
       if (response.data.error) {
         setCodeError(response.data.error);
         setCodePassed(false);
@@ -273,6 +288,13 @@ export function ExamPortal({ setSidebarLocked }) {
       return;
     }
 
+    // The backend signs the session name; the proctoring service only stores
+    // the incidents of signed sessions.
+    let session = `${user.enrollment_no}-${selectedExam.id}`;
+    axios.post('/api/proctoring-session/', { exam_paper_id: selectedExam.id })
+      .then(response => { session = response.data.session; })
+      .catch(error => console.error('Could not get a signed proctoring session; incidents will not be stored.', error));
+
     const proctoringInterval = setInterval(async () => {
       const video = videoRef.current;
       if (video && video.srcObject && video.readyState >= 3) { // 3: HAVE_FUTURE_DATA, 4: HAVE_ENOUGH_DATA
@@ -283,12 +305,13 @@ export function ExamPortal({ setSidebarLocked }) {
         const context = canvas.getContext('2d');
         context.drawImage(video, 0, 0, canvas.width, canvas.height);
         
-        const image_base64 = canvas.toDataURL('image/jpeg');
+        // Sent as the JPEG itself: a third smaller than base64 in JSON.
+        const image = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg'));
         
         console.log("Attempting to send proctoring image...");
         try {
-          const response = await axios.post(NGROK_LINK+"/analyze", {
-            image_base64: image_base64
+          const response = await axios.post(`${NGROK_LINK}/analyze?session=${encodeURIComponent(session)}`, image, {
+            headers: { 'Content-Type': 'image/jpeg' }
           });
 
           console.log("Proctoring response received:", response.data);